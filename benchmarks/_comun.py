@@ -0,0 +1,67 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Cada microservicio se ejecuta con su carpeta como raíz (`from logica import ...`),
+igual que en su contenedor; aquí se reproduce ese PYTHONPATH para poder
+importarlos en proceso.
+"""
+import logging
+import math
+import os
+import sys
+import time
+from statistics import median
+from typing import Callable, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("NORMATIVA_CONFIG_PATH", os.path.join(RAIZ, "config", "normativa_config.json"))
+
+
+def preparar_servicio(nombre: str) -> str:
+    """Pone `servicios/<nombre>` y la raíz del repo en sys.path (como en Docker)."""
+    carpeta = os.path.join(RAIZ, "servicios", nombre)
+    for ruta in (RAIZ, carpeta):
+        if ruta in sys.path:
+            sys.path.remove(ruta)
+        sys.path.insert(0, ruta)
+
+    # En la imagen, servicios/<x>/core se fusiona con /app/core
+    import core
+    extra = os.path.join(carpeta, "core")
+    if os.path.isdir(extra) and extra not in core.__path__:
+        core.__path__.append(extra)
+    return carpeta
+
+
+def silenciar_logs() -> None:
+    """Los servicios configuran logging en INFO al importarse; en benchmarks estorba."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def cronometrar(funcion: Callable[[], object], repeticiones: int = 5) -> Dict[str, float]:
+    """Ejecuta `funcion` varias veces y devuelve mediana y mínimo en segundos."""
+    tiempos: List[float] = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {"mediana_s": median(tiempos), "min_s": min(tiempos)}
+
+
+def percentil(ordenadas: List[float], p: float) -> float:
+    """Percentil p (0-100) por rango más cercano sobre una lista ya ordenada."""
+    if not ordenadas:
+        return float("nan")
+    indice = max(0, math.ceil(p / 100 * len(ordenadas)) - 1)
+    return ordenadas[min(indice, len(ordenadas) - 1)]
+
+
+def imprimir_tabla(titulo: str, filas: List[Dict[str, object]]) -> None:
+    print(f"\n{titulo}")
+    if not filas:
+        return
+    columnas = list(filas[0].keys())
+    anchos = [max(len(str(c)), *(len(str(f[c])) for f in filas)) for c in columnas]
+    print("  ".join(str(c).ljust(a) for c, a in zip(columnas, anchos)))
+    for f in filas:
+        print("  ".join(str(f[c]).ljust(a) for c, a in zip(columnas, anchos)))
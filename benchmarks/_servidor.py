@@ -0,0 +1,13 @@
+"""Arranca un microservicio en proceso: python _servidor.py <servicio> <puerto>."""
+import sys
+
+import uvicorn
+
+from _comun import preparar_servicio
+
+if __name__ == "__main__":
+    servicio, puerto = sys.argv[1], int(sys.argv[2])
+    preparar_servicio(servicio)
+    import main  # noqa: E402
+
+    uvicorn.run(main.app, host="127.0.0.1", port=puerto, log_level="warning")
@@ -0,0 +1,136 @@
+"""
+Benchmark: app FastAPI como se armaba antes en cada main.py (FastAPI() +
+métricas + X-Request-ID, JSON por jsonable_encoder + json.dumps) frente a
+core.aplicacion.crear_app (JSON rápido sin jsonable_encoder, gzip,
+Server-Timing y sobre de error).
+
+Cuerpos de respuesta (todos con respuesta_estandar):
+- "componente": resultado de un motor (≈10 campos), el caso del fan-out.
+- "columnas": /tarifa/calcular/lote con N consumos (tres listas de floats).
+- "filas": N objetos de 6 campos (como el catálogo de métricas XM).
+
+Se mide el CPU de serialización por respuesta y req/s extremo a extremo en
+proceso (httpx.ASGITransport, sin red; el cliente acepta gzip).
+
+    python benchmarks/bench_app.py --n 10000 --segundos 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from _comun import cronometrar, imprimir_tabla, preparar_servicio, silenciar_logs
+
+preparar_servicio("comercializacion")
+from fastapi import FastAPI  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from core.aplicacion import crear_app, orjson, serializar_json  # noqa: E402
+from core.metricas import instrumentar  # noqa: E402
+from core.registro import MiddlewareIdPeticion  # noqa: E402
+from core.utils import respuesta_estandar  # noqa: E402
+
+silenciar_logs()
+
+
+def cuerpos(n: int) -> dict:
+    rnd = random.Random(3)
+    consumos = [round(rnd.uniform(50, 900), 2) for _ in range(n)]
+    return {
+        "componente": lambda: respuesta_estandar(True, "Cálculo exitoso", {
+            "metodo": "promedio_ponderado", "energia_total_kWh": 10000.0, "costo_total": 3205000.0,
+            "G_promedio": 320.5, "fuente": "XM", "filas_descartadas": 0, "lineas": 3,
+            "version_config": 4, "vigencia": None, "degradado": False,
+        }),
+        "columnas": lambda: respuesta_estandar(True, "Lote calculado", {
+            "consumos_kWh": consumos,
+            "tarifas_$por_kWh": [410.1234] * n,
+            "costos_total_$": [round(c * 410.1234, 2) for c in consumos],
+        }),
+        "filas": lambda: respuesta_estandar(True, "Catálogo", {"metricas": [
+            {"MetricId": f"M{i}", "MetricName": "Precio de bolsa", "Entity": "Sistema",
+             "Type": "HourlyEntities", "MetricUnits": "COP/kWh", "valor": consumos[i]}
+            for i in range(n)
+        ]}),
+    }
+
+
+def registrar(app: FastAPI, generadores: dict) -> None:
+    for nombre, generar in generadores.items():
+        app.add_api_route(f"/{nombre}", (lambda g: lambda: g())(generar), methods=["GET"])
+
+
+def app_anterior(generadores: dict) -> FastAPI:
+    app = FastAPI(title="antes")
+    instrumentar(app, "bench")
+    app.add_middleware(MiddlewareIdPeticion)
+    registrar(app, generadores)
+    return app
+
+
+def app_fabrica(generadores: dict) -> FastAPI:
+    app = crear_app("bench", title="después")
+    silenciar_logs()
+    registrar(app, generadores)
+    return app
+
+
+async def req_por_segundo(app: FastAPI, ruta: str, segundos: float) -> tuple:
+    """Peticiones secuenciales durante `segundos`: (req/s, KB transferidos por respuesta)."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as cliente:
+        n, t0 = 0, time.perf_counter()
+        while True:
+            r = await cliente.get(ruta)
+            n += 1
+            transcurrido = time.perf_counter() - t0
+            if transcurrido >= segundos:
+                r.raise_for_status()
+                return n / transcurrido, len(r.content if "content-encoding" not in r.headers else await _comprimido(cliente, ruta)) / 1024
+
+
+async def _comprimido(cliente: httpx.AsyncClient, ruta: str) -> bytes:
+    """Bytes en el cable (sin descomprimir)."""
+    async with cliente.stream("GET", ruta) as r:
+        return b"".join([trozo async for trozo in r.aiter_raw()])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=10_000, help="elementos de los cuerpos 'columnas' y 'filas'")
+    parser.add_argument("--segundos", type=float, default=3.0)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    generadores = cuerpos(args.n)
+    antes, despues = app_anterior(generadores), app_fabrica(generadores)
+    filas = []
+    for nombre, generar in generadores.items():
+        contenido = generar()
+        t_antes = cronometrar(
+            lambda: json.dumps(jsonable_encoder(contenido), ensure_ascii=False, allow_nan=False,
+                               separators=(",", ":")).encode("utf-8"),
+            args.repeticiones,
+        )["mediana_s"]
+        t_despues = cronometrar(lambda: serializar_json(contenido), args.repeticiones)["mediana_s"]
+        rps_antes, kb_antes = asyncio.run(req_por_segundo(antes, f"/{nombre}", args.segundos))
+        rps_despues, kb_despues = asyncio.run(req_por_segundo(despues, f"/{nombre}", args.segundos))
+        filas.append({
+            "cuerpo": nombre,
+            "serializar antes µs": round(t_antes * 1e6, 1),
+            "después µs": round(t_despues * 1e6, 1),
+            "x": round(t_antes / t_despues, 1),
+            "req/s antes": round(rps_antes, 1),
+            "req/s después": round(rps_despues, 1),
+            "x req/s": round(rps_despues / rps_antes, 2),
+            "KB antes": round(kb_antes, 1),
+            "KB después": round(kb_despues, 1),
+        })
+    codificador = "orjson" if orjson is not None else "json (sin orjson)"
+    imprimir_tabla(f"App anterior vs crear_app ({codificador}, n={args.n})", filas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Prueba de carga reproducible de POST /tarifa/calcular/auto sin depender de XM.
+
+Levanta un XM falso (xm_falso.py) y los siete servicios en subprocesos sobre
+127.0.0.1 (o solo tarifa_total con TARIFA_MODO=local), genera carga en bucle
+cerrado con cada nivel de concurrencia y escribe un JSON con p50/p95/p99,
+throughput y tasas de error y de respuestas degradadas.
+
+    python benchmarks/bench_carga.py --concurrencia 1 8 32 --segundos 10
+    python benchmarks/bench_carga.py --xm-latencia-ms 200 --xm-tasa-error 0.1 --xm-huecos 0.2
+    python benchmarks/bench_carga.py --modo local --comparar resultados/base.json
+
+Contra un despliegue ya levantado (p. ej. docker compose con
+XM_BASE_URL apuntando al XM falso) no se arranca nada:
+
+    python benchmarks/xm_falso.py --host 0.0.0.0 --puerto 18900 &
+    XM_BASE_URL=http://host.docker.internal:18900 docker compose up -d
+    python benchmarks/bench_carga.py --objetivo http://127.0.0.1:8007
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from _comun import RAIZ, imprimir_tabla, percentil
+
+RUTA_AUTO = "/tarifa/calcular/auto"
+PUERTO_XM = 18900
+PUERTOS = {
+    "generacion": 18001, "transmision": 18002, "distribucion": 18003,
+    "perdidas_reconocidas": 18004, "restricciones": 18005, "comercializacion": 18006,
+    "tarifa_total": 18007,
+}
+RUTAS = {
+    "G": ("generacion", "/generacion/calcular"),
+    "T": ("transmision", "/transmision/calcular"),
+    "D": ("distribucion", "/distribucion/calcular"),
+    "PR": ("perdidas_reconocidas", "/perdidas/calcular"),
+    "R": ("restricciones", "/restricciones/calcular"),
+    "C": ("comercializacion", "/comercializacion/calcular"),
+}
+
+
+# ==========================================================
+# 🔹 Entorno: XM falso + servicios
+# ==========================================================
+def entorno_servicios(args: argparse.Namespace) -> Dict[str, str]:
+    entorno = dict(os.environ)
+    tmp = tempfile.mkdtemp(prefix="carga_tarifa_")
+    entorno.update({
+        "PBND_DB_PATH": os.path.join(tmp, "pbnd.sqlite3"),
+        # Cada corrida arranca en frío: sin valores compartidos de una corrida anterior
+        "CACHE_COMPARTIDA_DIR": os.path.join(tmp, "cache"),
+        "PBND_BACKFILL_DIAS": str(args.backfill_dias),
+        "XM_BASE_URL": f"http://127.0.0.1:{PUERTO_XM}",
+        "TARIFA_URL_PRECIO_XM": f"http://127.0.0.1:{PUERTOS['generacion']}/generacion/precio-xm",
+        "TARIFA_MODO": args.modo,
+        "TARIFA_SERVICIOS_DIR": os.path.join(RAIZ, "servicios"),
+        "NORMATIVA_CONFIG_PATH": os.path.join(RAIZ, "config", "normativa_config.json"),
+        "LOG_LEVEL": "WARNING",
+    })
+    for nombre, (carpeta, ruta) in RUTAS.items():
+        entorno[f"TARIFA_URL_{nombre}"] = f"http://127.0.0.1:{PUERTOS[carpeta]}{ruta}"
+        if args.sin_cache:
+            entorno[f"TARIFA_CACHE_TTL_{nombre}"] = "0"
+    return entorno
+
+
+def lanzar(argumentos: List[str], entorno: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *argumentos],
+        cwd=os.path.join(RAIZ, "benchmarks"),
+        env=entorno,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def esperar(url: str, limite_s: float = 60.0) -> None:
+    limite = time.time() + limite_s
+    while True:
+        try:
+            httpx.get(url, timeout=0.5)
+            return
+        except httpx.HTTPError:
+            if time.time() > limite:
+                raise RuntimeError(f"{url} no respondió en {limite_s}s")
+            time.sleep(0.2)
+
+
+def levantar(args: argparse.Namespace) -> List[subprocess.Popen]:
+    entorno = entorno_servicios(args)
+    procesos = [lanzar([
+        "xm_falso.py", "--puerto", str(PUERTO_XM),
+        "--latencia-ms", str(args.xm_latencia_ms), "--jitter-ms", str(args.xm_jitter_ms),
+        "--tasa-error", str(args.xm_tasa_error), "--huecos", str(args.xm_huecos),
+        "--semilla", str(args.semilla),
+    ], entorno)]
+    esperar(f"http://127.0.0.1:{PUERTO_XM}/_estado")
+
+    # En modo local tarifa_total llama a los motores en proceso: solo hace falta él
+    servicios = ["tarifa_total"] if args.modo == "local" else list(PUERTOS)
+    for servicio in servicios:
+        procesos.append(lanzar(["_servidor.py", servicio, str(PUERTOS[servicio])], entorno))
+    for servicio in servicios:
+        esperar(f"http://127.0.0.1:{PUERTOS[servicio]}/")
+    return procesos
+
+
+# ==========================================================
+# 🔹 Generador de carga (bucle cerrado)
+# ==========================================================
+async def nivel(cliente: httpx.AsyncClient, concurrencia: int, segundos: float, azar: random.Random) -> Dict[str, Any]:
+    latencias: List[float] = []
+    codigos: Dict[str, int] = {}
+    errores = degradadas = 0
+    fin = time.perf_counter() + segundos
+
+    async def trabajador() -> None:
+        nonlocal errores, degradadas
+        while time.perf_counter() < fin:
+            cuerpo = {"consumo_kWh": round(azar.uniform(50, 5000), 2)}
+            t0 = time.perf_counter()
+            try:
+                r = await cliente.post(RUTA_AUTO, json=cuerpo)
+                codigo = str(r.status_code)
+                if r.status_code >= 400:
+                    errores += 1
+                elif (r.json().get("datos") or {}).get("componentes_degradados"):
+                    degradadas += 1
+            except httpx.HTTPError as e:
+                codigo = type(e).__name__
+                errores += 1
+            latencias.append(time.perf_counter() - t0)
+            codigos[codigo] = codigos.get(codigo, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - t0
+
+    latencias.sort()
+    total = len(latencias)
+    return {
+        "concurrencia": concurrencia,
+        "peticiones": total,
+        "duracion_s": round(duracion, 3),
+        "throughput_rps": round(total / duracion, 2),
+        "errores": errores,
+        "tasa_error": round(errores / total, 5) if total else 0.0,
+        "degradadas": degradadas,
+        "tasa_degradadas": round(degradadas / total, 5) if total else 0.0,
+        "codigos": codigos,
+        "latencia_ms": {
+            "p50": round(percentil(latencias, 50) * 1000, 3),
+            "p95": round(percentil(latencias, 95) * 1000, 3),
+            "p99": round(percentil(latencias, 99) * 1000, 3),
+            "max": round(latencias[-1] * 1000, 3) if latencias else None,
+            "media": round(sum(latencias) / total * 1000, 3) if total else None,
+        },
+    }
+
+
+async def ejecutar(args: argparse.Namespace, objetivo: str) -> Dict[str, Any]:
+    azar = random.Random(args.semilla)
+    limites = httpx.Limits(max_connections=max(args.concurrencia) * 2, max_keepalive_connections=max(args.concurrencia))
+    async with httpx.AsyncClient(base_url=objetivo, timeout=args.timeout_s, limits=limites) as cliente:
+        # Calentamiento: conexiones abiertas, PBND sincronizado y cachés pobladas
+        calentamiento = await nivel(cliente, min(4, max(args.concurrencia)), args.calentamiento_s, azar)
+        resultados = [await nivel(cliente, c, args.segundos, azar) for c in args.concurrencia]
+    return {"calentamiento": calentamiento, "niveles": resultados}
+
+
+# ==========================================================
+# 🔹 Informe
+# ==========================================================
+def commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def estado_xm_falso() -> Optional[Dict[str, Any]]:
+    try:
+        return httpx.get(f"http://127.0.0.1:{PUERTO_XM}/_estado", timeout=2).json()
+    except httpx.HTTPError:
+        return None
+
+
+def comparar(actual: List[Dict[str, Any]], base: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    por_concurrencia = {n["concurrencia"]: n for n in base}
+    filas = []
+    for n in actual:
+        b = por_concurrencia.get(n["concurrencia"])
+        if b is None:
+            continue
+        fila = {"concurrencia": n["concurrencia"]}
+        for p in ("p50", "p95", "p99"):
+            fila[f"{p} Δ%"] = f"{(n['latencia_ms'][p] / b['latencia_ms'][p] - 1) * 100:+.1f}"
+        fila["rps Δ%"] = f"{(n['throughput_rps'] / b['throughput_rps'] - 1) * 100:+.1f}"
+        fila["error Δ"] = f"{n['tasa_error'] - b['tasa_error']:+.4f}"
+        filas.append(fila)
+    return filas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=["http", "local"], default="http",
+                        help="http: siete servicios; local: tarifa_total con los motores en proceso")
+    parser.add_argument("--objetivo", help="URL de un tarifa_total ya levantado (no arranca servicios)")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--segundos", type=float, default=10.0, help="duración de cada nivel")
+    parser.add_argument("--calentamiento-s", type=float, default=3.0)
+    parser.add_argument("--timeout-s", type=float, default=30.0)
+    parser.add_argument("--sin-cache", action="store_true", help="TTL 0 en la caché de componentes")
+    parser.add_argument("--backfill-dias", type=int, default=60)
+    parser.add_argument("--xm-latencia-ms", type=float, default=50.0)
+    parser.add_argument("--xm-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--xm-tasa-error", type=float, default=0.0)
+    parser.add_argument("--xm-huecos", type=float, default=0.0)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", help="archivo JSON (por defecto benchmarks/resultados/carga-<fecha>.json)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para mostrar diferencias")
+    args = parser.parse_args()
+
+    procesos: List[subprocess.Popen] = []
+    if args.objetivo:
+        objetivo = args.objetivo.rstrip("/")
+    else:
+        procesos = levantar(args)
+        objetivo = f"http://127.0.0.1:{PUERTOS['tarifa_total']}"
+    try:
+        medicion = asyncio.run(ejecutar(args, objetivo))
+        xm = None if args.objetivo else estado_xm_falso()
+    finally:
+        for p in procesos:
+            p.terminate()
+        for p in procesos:
+            p.wait(timeout=10)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "objetivo": objetivo if args.objetivo else f"{args.modo} (subprocesos locales)",
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+        "xm_falso": xm,
+        **medicion,
+    }
+    salida = args.salida or os.path.join(
+        RAIZ, "benchmarks", "resultados", f"carga-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+
+    imprimir_tabla(f"{RUTA_AUTO} — {informe['objetivo']}", [
+        {
+            "concurrencia": n["concurrencia"],
+            "peticiones": n["peticiones"],
+            "req/s": n["throughput_rps"],
+            "p50_ms": n["latencia_ms"]["p50"],
+            "p95_ms": n["latencia_ms"]["p95"],
+            "p99_ms": n["latencia_ms"]["p99"],
+            "errores": f"{n['tasa_error']:.2%}",
+            "degradadas": f"{n['tasa_degradadas']:.2%}",
+        }
+        for n in informe["niveles"]
+    ])
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        imprimir_tabla(f"Diferencia frente a {args.comparar} (commit {base.get('commit')})",
+                       comparar(informe["niveles"], base["niveles"]))
+    print(f"\nInforme: {salida}")
+
+
+if __name__ == "__main__":
+    main()
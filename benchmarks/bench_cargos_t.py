@@ -0,0 +1,65 @@
+"""
+Benchmark: cargo de transmisión por línea (nivel × región × franja).
+
+- "dicts": bucle Python con tres búsquedas en los dicts de componente_T y
+  dos multiplicaciones por línea (el flujo descrito en README_T).
+- "tabla": TablaCargosT.cargo() por línea (tres índices y un acceso).
+- "lote": TablaCargosT.cargos_lote() sobre el lote completo (codificar las
+  columnas de texto + un gather).
+- "gather": solo el gather, con las columnas ya codificadas (índices que se
+  reutilizan entre corridas mientras la configuración no cambie).
+
+    python benchmarks/bench_cargos_t.py --lineas 1000 100000 1000000
+"""
+import argparse
+import random
+
+from _comun import cronometrar, imprimir_tabla, preparar_servicio
+
+preparar_servicio("transmision")
+from core.calculadora import obtener_configuracion  # noqa: E402
+from tabla_cargos import obtener_tabla  # noqa: E402
+
+
+def por_dicts(seccion, niveles, regiones, franjas) -> list:
+    cu, fg, fh = seccion["cargos_por_nivel"], seccion["factor_geografico"], seccion["recargo_horario"]
+    return [cu[str(n)] * fg[r] * fh[f] for n, r, f in zip(niveles, regiones, franjas)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lineas", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    cfg = obtener_configuracion()
+    seccion = cfg.seccion("componente_T")
+    tabla = obtener_tabla(cfg)
+    rng = random.Random(7)
+    filas = []
+    for n in args.lineas:
+        niveles = [rng.choice(tabla.niveles) for _ in range(n)]
+        regiones = [rng.choice(tabla.regiones[1:]) for _ in range(n)]
+        franjas = [rng.choice(tabla.franjas[1:]) for _ in range(n)]
+        esperado = por_dicts(seccion, niveles, regiones, franjas)
+        assert tabla.cargos_lote(niveles, regiones, franjas).tolist() == esperado
+
+        t_dicts = cronometrar(lambda: por_dicts(seccion, niveles, regiones, franjas), args.repeticiones)["mediana_s"]
+        t_tabla = cronometrar(lambda: [tabla.cargo(*t) for t in zip(niveles, regiones, franjas)], args.repeticiones)["mediana_s"]
+        t_lote = cronometrar(lambda: tabla.cargos_lote(niveles, regiones, franjas), args.repeticiones)["mediana_s"]
+        indices = tabla.codificar(niveles, regiones, franjas)
+        t_gather = cronometrar(lambda: tabla.cargos_codificados(*indices), args.repeticiones)["mediana_s"]
+        filas.append({
+            "lineas": n,
+            "dicts ms": round(t_dicts * 1000, 2),
+            "tabla ms": round(t_tabla * 1000, 2),
+            "lote ms": round(t_lote * 1000, 2),
+            "gather ms": round(t_gather * 1000, 3),
+            "lote x dicts": round(t_dicts / t_lote, 1),
+            "gather x dicts": round(t_dicts / t_gather, 1),
+        })
+    imprimir_tabla(f"Cargos T ({'×'.join(str(d) for d in tabla.cargos.shape)} celdas)", filas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: peticiones por segundo a /transmision/calcular con el cuerpo por
+filas ([{energia_kWh, costo_unitario_kWh}, ...]) frente al formato columnar
+({"energia_kWh": [...], "costo_unitario_kWh": [...]}).
+
+La app se ejecuta en proceso (httpx.ASGITransport): se mide parseo JSON,
+validación Pydantic y cálculo, sin red.
+
+    python benchmarks/bench_columnar.py --filas 100 10000 100000 --segundos 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from _comun import imprimir_tabla, preparar_servicio, silenciar_logs
+
+preparar_servicio("transmision")
+import main  # noqa: E402
+
+silenciar_logs()
+
+
+async def medir(cliente: httpx.AsyncClient, cuerpo: bytes, segundos: float) -> tuple:
+    """Peticiones secuenciales durante `segundos`; devuelve (req/s, T_promedio)."""
+    cabeceras = {"content-type": "application/json"}
+    n, t0 = 0, time.perf_counter()
+    while True:
+        r = await cliente.post("/transmision/calcular", content=cuerpo, headers=cabeceras)
+        n += 1
+        transcurrido = time.perf_counter() - t0
+        if transcurrido >= segundos:
+            return n / transcurrido, r.json()["datos"]["T_promedio"]
+
+
+async def ejecutar(tamanos, segundos: float) -> None:
+    rnd = random.Random(11)
+    transporte = httpx.ASGITransport(app=main.app)
+    filas_tabla = []
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        for n in tamanos:
+            energia = [round(rnd.uniform(100, 10000), 3) for _ in range(n)]
+            costo = [round(rnd.uniform(30, 40), 3) for _ in range(n)]
+            por_filas = json.dumps(
+                [{"energia_kWh": e, "costo_unitario_kWh": c} for e, c in zip(energia, costo)]
+            ).encode()
+            columnar = json.dumps({"energia_kWh": energia, "costo_unitario_kWh": costo}).encode()
+
+            rps_filas, t_filas = await medir(cliente, por_filas, segundos)
+            rps_columnas, t_columnas = await medir(cliente, columnar, segundos)
+            filas_tabla.append({
+                "filas": n,
+                "req/s filas": round(rps_filas, 1),
+                "req/s columnas": round(rps_columnas, 1),
+                "aceleracion": f"x{rps_columnas / rps_filas:.1f}",
+                "KB filas": len(por_filas) // 1024,
+                "KB columnas": len(columnar) // 1024,
+                "coincide": t_filas == t_columnas,
+            })
+    imprimir_tabla("/transmision/calcular: cuerpo por filas vs columnar", filas_tabla)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--segundos", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(ejecutar(args.filas, args.segundos))
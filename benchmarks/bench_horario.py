@@ -0,0 +1,81 @@
+"""
+Benchmark: valoración horaria de perfiles de carga (componente G hora a hora)
+en un solo núcleo, en clientes-hora por segundo.
+
+- "motor": valorar() sobre una matriz clientes × 8760 ya en memoria
+  (producto matriz·vector contra el precio de bolsa horario).
+- "flujo": IngestaPerfilBinaria alimentada con trozos de 64 KiB del cuerpo
+  float64, como llega a /generacion/calcular/horario/flujo.
+- "filas": referencia con un bucle Python hora a hora.
+
+    python benchmarks/bench_horario.py --clientes 1 100 1000 --horas 8760
+"""
+import os
+
+# Un solo núcleo: sin hilos de BLAS (antes de importar NumPy)
+for _variable in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_variable, "1")
+
+import argparse  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from _comun import cronometrar, imprimir_tabla, preparar_servicio  # noqa: E402
+
+preparar_servicio("generacion")
+from horario import IngestaPerfilBinaria, valorar  # noqa: E402
+
+TROZO = 64 * 1024
+
+
+def por_filas(energia: np.ndarray, precios: np.ndarray) -> float:
+    precios_l = precios.tolist()
+    costo = 0.0
+    for perfil in energia.tolist():
+        for e, p in zip(perfil, precios_l):
+            costo += e * p
+    return costo
+
+
+def en_flujo(cuerpo: bytes, precios: np.ndarray) -> float:
+    ingesta = IngestaPerfilBinaria(precios, guardar_detalle=False)
+    vista = memoryview(cuerpo)
+    for i in range(0, len(cuerpo), TROZO):
+        ingesta.alimentar(vista[i:i + TROZO])
+    ingesta.terminar()
+    return ingesta.costo_total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--horas", type=int, default=8760)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    precios = rng.uniform(250.0, 650.0, args.horas)
+    filas = []
+    for clientes in args.clientes:
+        energia = rng.uniform(0.0, 50.0, (clientes, args.horas))
+        cuerpo = energia.astype("<f8").tobytes()
+        clientes_hora = clientes * args.horas
+
+        t_motor = cronometrar(lambda: valorar(energia, precios), args.repeticiones)["mediana_s"]
+        t_flujo = cronometrar(lambda: en_flujo(cuerpo, precios), args.repeticiones)["mediana_s"]
+        # El bucle Python solo con pocos clientes (tarda segundos por millón de horas)
+        t_filas = cronometrar(lambda: por_filas(energia, precios), 1)["mediana_s"] if clientes_hora <= 1_000_000 else None
+
+        filas.append({
+            "clientes": clientes,
+            "clientes-hora": clientes_hora,
+            "motor Mch/s": round(clientes_hora / t_motor / 1e6, 1),
+            "flujo Mch/s": round(clientes_hora / t_flujo / 1e6, 1),
+            "filas Mch/s": round(clientes_hora / t_filas / 1e6, 2) if t_filas else "-",
+            "motor ms": round(t_motor * 1000, 3),
+        })
+    imprimir_tabla(f"Valoración horaria ({args.horas} horas, 1 núcleo)", filas)
+
+
+if __name__ == "__main__":
+    main()
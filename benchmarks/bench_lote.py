@@ -0,0 +1,86 @@
+"""
+Benchmark: N llamadas a /tarifa/calcular/auto frente a una llamada a
+/tarifa/calcular/lote con N consumos.
+
+Los microservicios se simulan con httpx.MockTransport (latencia configurable),
+así que el resultado mide el costo del fan-out y de la serialización, no la red.
+
+    python benchmarks/bench_lote.py --n 2000 --latencia-ms 2
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from _comun import preparar_servicio, imprimir_tabla, silenciar_logs
+
+preparar_servicio("tarifa_total")
+import clients  # noqa: E402
+import main  # noqa: E402
+
+silenciar_logs()
+
+RESPUESTAS = {
+    "G": 320.5, "T": 35.1, "D": 40.2, "PR": 10.8, "R": 5.7, "C": 7.53,
+}
+
+
+def transporte_simulado(latencia_s: float) -> httpx.MockTransport:
+    por_url = {url: nombre for nombre, url in clients.URLS.items()}
+
+    async def manejador(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latencia_s)
+        url = str(request.url)
+        if url == clients.URL_PRECIO_XM:
+            return httpx.Response(200, json={"valor_kWh": 412.5, "fuente": "XM"})
+        nombre = por_url[url]
+        return httpx.Response(200, json={"datos": {clients.CAMPOS[nombre]: RESPUESTAS[nombre]}})
+
+    return httpx.MockTransport(manejador)
+
+
+async def ejecutar(n: int, concurrencia: int, latencia_s: float):
+    clients.pool_http._kwargs_cliente["transport"] = transporte_simulado(latencia_s)
+    await clients.pool_http.abrir()
+    consumos = [100.0 + (i % 900) for i in range(n)]
+    asgi = httpx.ASGITransport(app=main.app)
+    filas = []
+
+    async with httpx.AsyncClient(transport=asgi, base_url="http://tarifa") as cliente:
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def una(consumo):
+            async with semaforo:
+                r = await cliente.post("/tarifa/calcular/auto", json={"consumo_kWh": consumo})
+                return r.json()["datos"]["costo_total_$"]
+
+        t0 = time.perf_counter()
+        individuales = await asyncio.gather(*(una(c) for c in consumos))
+        t_individual = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        r = await cliente.post("/tarifa/calcular/lote", json={"consumos_kWh": consumos})
+        t_lote = time.perf_counter() - t0
+        lote = r.json()["datos"]["costos_total_$"]
+
+    await clients.pool_http.cerrar()
+    iguales = all(abs(a - b) < 0.011 for a, b in zip(individuales, lote))
+    for nombre, t in (("N x /auto", t_individual), ("1 x /lote", t_lote)):
+        filas.append({
+            "modo": nombre,
+            "n": n,
+            "tiempo_s": round(t, 4),
+            "consumos/s": int(n / t),
+        })
+    imprimir_tabla(f"Lote vs individual (latencia simulada {latencia_s * 1000:.1f} ms)", filas)
+    print(f"aceleración: x{t_individual / t_lote:.1f} | resultados coinciden: {iguales}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(ejecutar(args.n, args.concurrencia, args.latencia_ms / 1000))
@@ -0,0 +1,136 @@
+"""
+Benchmark: tarifa_total en modo distribuido (HTTP a seis microservicios) frente
+a modo local (motores importados en proceso, TARIFA_MODO=local).
+
+Levanta los seis microservicios en subprocesos sobre 127.0.0.1, siembra la serie
+PBND local para no depender de XM y desactiva la caché de componentes para medir
+el camino completo en ambos modos. Verifica además que los resultados coinciden.
+
+    python benchmarks/bench_modo_local.py --n 500 --concurrencia 32
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from statistics import median
+
+import httpx
+
+from _comun import RAIZ, preparar_servicio, imprimir_tabla, silenciar_logs
+
+PUERTOS = {"G": 18001, "T": 18002, "D": 18003, "PR": 18004, "R": 18005, "C": 18006}
+CARPETAS = {
+    "G": "generacion", "T": "transmision", "D": "distribucion",
+    "PR": "perdidas_reconocidas", "R": "restricciones", "C": "comercializacion",
+}
+RUTAS = {
+    "G": "/generacion/calcular", "T": "/transmision/calcular", "D": "/distribucion/calcular",
+    "PR": "/perdidas/calcular", "R": "/restricciones/calcular", "C": "/comercializacion/calcular",
+}
+
+_tmp = tempfile.mkdtemp(prefix="bench_tarifa_")
+os.environ["PBND_DB_PATH"] = os.path.join(_tmp, "pbnd.sqlite3")
+os.environ["XM_BASE_URL"] = "http://127.0.0.1:9"  # nunca se llega a XM real
+for nombre, puerto in PUERTOS.items():
+    os.environ[f"TARIFA_URL_{nombre}"] = f"http://127.0.0.1:{puerto}{RUTAS[nombre]}"
+    os.environ[f"TARIFA_CACHE_TTL_{nombre}"] = "0"
+os.environ["TARIFA_URL_PRECIO_XM"] = f"http://127.0.0.1:{PUERTOS['G']}/generacion/precio-xm"
+
+preparar_servicio("tarifa_total")
+import clients  # noqa: E402
+import logica  # noqa: E402
+import motores_locales  # noqa: E402
+
+silenciar_logs()
+
+
+def sembrar_pbnd() -> None:
+    motores_locales.cargar_todos()
+    from core.almacen_pbnd import AlmacenPBND
+    almacen = AlmacenPBND(os.environ["PBND_DB_PATH"])
+    hoy = date.today()
+    almacen.guardar_diarios([(hoy - timedelta(days=d), 400.0 + d) for d in range(1, 10)], metrica="PPPrecBolsNaci")
+    almacen.cerrar()
+
+
+def levantar_servicios():
+    procesos = []
+    for nombre, puerto in PUERTOS.items():
+        procesos.append(subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, "benchmarks", "_servidor.py"), CARPETAS[nombre], str(puerto)],
+            cwd=os.path.join(RAIZ, "benchmarks"),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    limite = time.time() + 30
+    for puerto in PUERTOS.values():
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{puerto}/", timeout=0.5)
+                break
+            except httpx.HTTPError:
+                if time.time() > limite:
+                    raise RuntimeError(f"El servicio en el puerto {puerto} no arrancó")
+                time.sleep(0.2)
+    return procesos
+
+
+async def medir(modo: str, n: int, concurrencia: int):
+    clients.MODO = modo
+    # calentamiento
+    resultado = await logica.calcular_tarifa_total_automatica(1000.0)
+
+    latencias = []
+    for _ in range(min(n, 200)):
+        t0 = time.perf_counter()
+        await logica.calcular_tarifa_total_automatica(1000.0)
+        latencias.append(time.perf_counter() - t0)
+
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        async with semaforo:
+            await logica.calcular_tarifa_total_automatica(1000.0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(n)))
+    duracion = time.perf_counter() - t0
+    latencias.sort()
+    return resultado, {
+        "modo": modo,
+        "p50_ms": round(median(latencias) * 1000, 3),
+        "p95_ms": round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 3),
+        "req/s": int(n / duracion),
+    }
+
+
+async def ejecutar(n: int, concurrencia: int):
+    await clients.pool_http.abrir()
+    res_http, fila_http = await medir("http", n, concurrencia)
+    res_local, fila_local = await medir("local", n, concurrencia)
+    await clients.pool_http.cerrar()
+    await motores_locales.cerrar()
+
+    imprimir_tabla(f"tarifa_total: HTTP vs local (n={n}, concurrencia={concurrencia}, sin caché)", [fila_http, fila_local])
+    componentes_http = {k: v for k, v in res_http["datos"]["componentes"].items() if k in PUERTOS}
+    componentes_local = {k: v for k, v in res_local["datos"]["componentes"].items() if k in PUERTOS}
+    print(f"aceleración p50: x{fila_http['p50_ms'] / fila_local['p50_ms']:.1f} | "
+          f"throughput: x{fila_local['req/s'] / max(fila_http['req/s'], 1):.1f} | "
+          f"resultados idénticos: {componentes_http == componentes_local}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    args = parser.parse_args()
+    sembrar_pbnd()
+    procesos = levantar_servicios()
+    try:
+        asyncio.run(ejecutar(args.n, args.concurrencia))
+    finally:
+        for p in procesos:
+            p.terminate()
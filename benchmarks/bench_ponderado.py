@@ -0,0 +1,87 @@
+"""
+Benchmark: promedio ponderado Σ(E×P)/Σ(E) de T (transmisión) con la
+implementación anterior (dos `sum()` con isinstance por fila) frente a
+core.ponderado, para listas de dicts, modelos Pydantic y columnas array('d').
+
+    python benchmarks/bench_ponderado.py --filas 1000 100000 1000000
+"""
+import argparse
+import random
+import sys
+from array import array
+from typing import Dict, List, Union
+
+from pydantic import BaseModel
+
+from _comun import RAIZ, cronometrar, imprimir_tabla
+
+sys.path.insert(0, RAIZ)
+from core.ponderado import promedio_ponderado, promedio_ponderado_filas  # noqa: E402
+
+
+class LineaTransmision(BaseModel):
+    energia_kWh: float
+    costo_unitario_kWh: float
+
+
+def promedio_anterior(lineas: List[Union[Dict, object]]) -> float:
+    """Copia del cálculo que tenían calcular_componente_T/D/R/G."""
+    energia_total = sum(
+        l["energia_kWh"] if isinstance(l, dict) else l.energia_kWh
+        for l in lineas
+    )
+    costo_total = sum(
+        (l["energia_kWh"] * l["costo_unitario_kWh"]) if isinstance(l, dict)
+        else (l.energia_kWh * l.costo_unitario_kWh)
+        for l in lineas
+    )
+    return costo_total / energia_total
+
+
+def ejecutar(tamanos: List[int], repeticiones: int) -> None:
+    rnd = random.Random(7)
+    filas = []
+    for n in tamanos:
+        dicts = [
+            {"energia_kWh": rnd.uniform(100, 10000), "costo_unitario_kWh": rnd.uniform(30, 40)}
+            for _ in range(n)
+        ]
+        modelos = [LineaTransmision(**d) for d in dicts]
+        energia = array("d", (d["energia_kWh"] for d in dicts))
+        precio = array("d", (d["costo_unitario_kWh"] for d in dicts))
+
+        referencia = promedio_anterior(dicts)
+        casos = {
+            "dicts": (
+                lambda: promedio_anterior(dicts),
+                lambda: promedio_ponderado_filas(dicts, "energia_kWh", "costo_unitario_kWh").promedio,
+            ),
+            "modelos": (
+                lambda: promedio_anterior(modelos),
+                lambda: promedio_ponderado_filas(modelos, "energia_kWh", "costo_unitario_kWh").promedio,
+            ),
+            "array('d')": (
+                None,
+                lambda: promedio_ponderado(energia, precio).promedio,
+            ),
+        }
+        for entrada, (anterior, nuevo) in casos.items():
+            t_nuevo = cronometrar(nuevo, repeticiones)["mediana_s"]
+            t_anterior = cronometrar(anterior, repeticiones)["mediana_s"] if anterior else None
+            filas.append({
+                "filas": n,
+                "entrada": entrada,
+                "anterior_ms": round(t_anterior * 1000, 2) if t_anterior else "-",
+                "motor_ms": round(t_nuevo * 1000, 3),
+                "aceleracion": f"x{t_anterior / t_nuevo:.1f}" if t_anterior else "-",
+                "coincide": abs(nuevo() - referencia) < 1e-9 * abs(referencia),
+            })
+    imprimir_tabla("Promedio ponderado: implementación anterior vs core.ponderado", filas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+    ejecutar(args.filas, args.repeticiones)
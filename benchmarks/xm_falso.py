@@ -0,0 +1,172 @@
+"""
+Servidor falso de la API de XM para pruebas de carga sin red.
+
+Responde POST /lists (inventario con la métrica del PBND), POST /daily (un
+valor por día del rango pedido) y POST /hourly (24 precios por día, con el
+PBND del día como promedio) con latencia, tasa de errores y días sin datos
+configurables. Los valores y los huecos son deterministas para una
+misma semilla: dos corridas ven exactamente la misma serie.
+
+    python benchmarks/xm_falso.py --puerto 18900 --latencia-ms 80 --jitter-ms 40 \
+        --tasa-error 0.05 --huecos 0.1
+
+GET /_estado devuelve la configuración y las llamadas recibidas por ruta.
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+METRICA_PBND = "PPPrecBolsNaci"
+METRICA_HORARIA = "PrecBolsNaci"
+# Forma diaria del precio horario (madrugada barata, pico a las 19 h); promedio 1
+_FORMA_HORARIA = [0.8, 0.78, 0.76, 0.76, 0.8, 0.88, 0.96, 1.0, 1.02, 1.04, 1.05, 1.06,
+                  1.05, 1.04, 1.03, 1.02, 1.03, 1.08, 1.22, 1.25, 1.18, 1.06, 0.95, 0.86]
+_FORMA_HORARIA = [f * 24 / sum(_FORMA_HORARIA) for f in _FORMA_HORARIA]
+
+
+def crear_app(
+    latencia_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    tasa_error: float = 0.0,
+    huecos: float = 0.0,
+    semilla: int = 7,
+) -> FastAPI:
+    app = FastAPI(title="XM falso")
+    azar = random.Random(semilla)
+    llamadas: Counter = Counter()
+    errores: Counter = Counter()
+
+    async def simular(ruta: str) -> bool:
+        """Espera la latencia configurada; True si esta llamada debe fallar."""
+        llamadas[ruta] += 1
+        espera = max(0.0, latencia_ms + azar.uniform(-jitter_ms, jitter_ms)) / 1000
+        if espera:
+            await asyncio.sleep(espera)
+        if azar.random() < tasa_error:
+            errores[ruta] += 1
+            return True
+        return False
+
+    def valor_dia(dia: date) -> Any:
+        # Mismo día → mismo valor y mismo hueco, independiente del orden de las llamadas
+        local = random.Random(f"{semilla}-{dia.isoformat()}")
+        if local.random() < huecos:
+            return None
+        return round(local.uniform(250.0, 650.0), 5)
+
+    @app.post("/lists")
+    async def listas(request: Request):
+        if await simular("/lists"):
+            return JSONResponse({"Message": "XM falso: error simulado"}, status_code=503)
+        return {
+            "Data": [
+                {
+                    "MetricId": METRICA_PBND,
+                    "MetricName": "Precio Promedio Precio Bolsa Nacional",
+                    "Entity": "Sistema",
+                    "Type": "DailyEntities",
+                    "MetricUnits": "COP/kWh",
+                },
+                {
+                    "MetricId": METRICA_HORARIA,
+                    "MetricName": "Precio Bolsa Nacional",
+                    "Entity": "Sistema",
+                    "Type": "HourlyEntities",
+                    "MetricUnits": "COP/kWh",
+                },
+                {
+                    "MetricId": "DemaReal",
+                    "MetricName": "Demanda Real",
+                    "Entity": "Sistema",
+                    "Type": "HourlyEntities",
+                    "MetricUnits": "kWh",
+                },
+            ]
+        }
+
+    @app.post("/daily")
+    async def diarios(request: Request):
+        if await simular("/daily"):
+            return JSONResponse({"Message": "XM falso: error simulado"}, status_code=503)
+        cuerpo = await request.json()
+        try:
+            inicio = date.fromisoformat(cuerpo["StartDate"])
+            fin = date.fromisoformat(cuerpo["EndDate"])
+        except (KeyError, TypeError, ValueError):
+            return JSONResponse({"Message": "StartDate/EndDate inválidos"}, status_code=400)
+
+        items: List[Dict[str, Any]] = []
+        dia = inicio
+        while dia <= fin and dia <= date.today():
+            valor = valor_dia(dia)
+            items.append({
+                "Date": dia.isoformat(),
+                "DailyEntities": [] if valor is None else [{"Id": cuerpo.get("Entity", "Sistema"), "Value": str(valor)}],
+            })
+            dia += timedelta(days=1)
+        return {"Items": items}
+
+    @app.post("/hourly")
+    async def horarios(request: Request):
+        if await simular("/hourly"):
+            return JSONResponse({"Message": "XM falso: error simulado"}, status_code=503)
+        cuerpo = await request.json()
+        try:
+            inicio = date.fromisoformat(cuerpo["StartDate"])
+            fin = date.fromisoformat(cuerpo["EndDate"])
+        except (KeyError, TypeError, ValueError):
+            return JSONResponse({"Message": "StartDate/EndDate inválidos"}, status_code=400)
+
+        items: List[Dict[str, Any]] = []
+        dia = inicio
+        while dia <= fin and dia <= date.today():
+            valor = valor_dia(dia)
+            entidades = []
+            if valor is not None:
+                valores = {"code": cuerpo.get("Entity", "Sistema")}
+                valores.update({f"Hour{h + 1:02d}": str(round(valor * f, 5)) for h, f in enumerate(_FORMA_HORARIA)})
+                entidades.append({"Id": cuerpo.get("Entity", "Sistema"), "Values": valores})
+            items.append({"Date": dia.isoformat(), "HourlyEntities": entidades})
+            dia += timedelta(days=1)
+        return {"Items": items}
+
+    @app.get("/_estado")
+    async def estado():
+        return {
+            "configuracion": {
+                "latencia_ms": latencia_ms,
+                "jitter_ms": jitter_ms,
+                "tasa_error": tasa_error,
+                "huecos": huecos,
+                "semilla": semilla,
+            },
+            "llamadas": dict(llamadas),
+            "errores": dict(errores),
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 para que lo alcancen los contenedores")
+    parser.add_argument("--puerto", type=int, default=18900)
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="latencia media por llamada")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="variación uniforme ± sobre la latencia")
+    parser.add_argument("--tasa-error", type=float, default=0.0, help="fracción de llamadas que responden 503")
+    parser.add_argument("--huecos", type=float, default=0.0, help="fracción de días sin dato (DailyEntities vacío)")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+    uvicorn.run(
+        crear_app(args.latencia_ms, args.jitter_ms, args.tasa_error, args.huecos, args.semilla),
+        host=args.host,
+        port=args.puerto,
+        log_level="warning",
+    )
@@ -0,0 +1,194 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.middleware.gzip import GZipMiddleware
+
+from core.metricas import instrumentar
+from core.registro import MiddlewareIdPeticion, configurar_registro, id_peticion
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🏗️ Fábrica común de las apps FastAPI de los siete servicios
+#     - JSON rápido: orjson si está instalado (json compacto si
+#       no). Los endpoints sin response_model devuelven su dict
+#       ya serializado, sin pasar por jsonable_encoder (el mayor
+#       coste por respuesta en FastAPI).
+#     - gzip para respuestas grandes (HTTP_GZIP_MIN_BYTES).
+#     - X-Request-ID (core/registro.py), Server-Timing y métricas
+#       Prometheus (core/metricas.py).
+#     - Errores con el mismo sobre que respuesta_estandar:
+#       {"ok": false, "mensaje", "detail", "datos", "timestamp",
+#       "request_id"}; "detail" se conserva por compatibilidad.
+#
+#     HTTP_GZIP_MIN_BYTES (4096; 0 desactiva), HTTP_GZIP_NIVEL (5),
+#     HTTP_SERVER_TIMING (1).
+# ==========================================================
+GZIP_MIN_BYTES = int(os.environ.get("HTTP_GZIP_MIN_BYTES", 4096))
+GZIP_NIVEL = int(os.environ.get("HTTP_GZIP_NIVEL", 5))
+SERVER_TIMING = os.environ.get("HTTP_SERVER_TIMING", "1").strip().lower() not in ("0", "false", "no", "off")
+
+try:
+    import orjson
+except ImportError:   # opcional: sin orjson se usa json de la biblioteca estándar
+    orjson = None
+
+
+def _por_defecto(valor: Any) -> Any:
+    """Tipos que el codificador no conoce (modelos Pydantic, Decimal, set…)."""
+    return jsonable_encoder(valor)
+
+
+if orjson is not None:
+    _OPCIONES_ORJSON = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def serializar_json(contenido: Any) -> bytes:
+        return orjson.dumps(contenido, default=_por_defecto, option=_OPCIONES_ORJSON)
+else:
+    _codificador = json.JSONEncoder(
+        ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_por_defecto
+    )
+
+    def serializar_json(contenido: Any) -> bytes:
+        return _codificador.encode(contenido).encode("utf-8")
+
+
+class RespuestaJSON(JSONResponse):
+    """JSONResponse con serializar_json (orjson si está disponible)."""
+
+    def render(self, content: Any) -> bytes:
+        return serializar_json(content)
+
+
+# ==========================================================
+# 🔹 Rutas sin jsonable_encoder
+# ==========================================================
+def _sin_modelo(endpoint: Callable[..., Any], kwargs: Dict[str, Any]) -> bool:
+    """La ruta no declara response_model (ni como anotación de retorno)."""
+    modelo = kwargs.get("response_model", DefaultPlaceholder(None))
+    if not isinstance(modelo, DefaultPlaceholder) and modelo is not None:
+        return False
+    return inspect.signature(endpoint).return_annotation is inspect.Signature.empty
+
+
+def _envolver(endpoint: Callable[..., Any], codigo: Optional[int]) -> Callable[..., Any]:
+    """El endpoint devuelve la respuesta ya serializada (las Response pasan tal cual)."""
+    def responder(resultado: Any) -> Any:
+        if isinstance(resultado, Response):
+            return resultado
+        return RespuestaJSON(resultado, status_code=codigo or 200)
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def envuelto(*args: Any, **kwargs: Any) -> Any:
+            return responder(await endpoint(*args, **kwargs))
+    else:
+        # Sigue siendo síncrono: FastAPI lo ejecuta en el threadpool como antes
+        @functools.wraps(endpoint)
+        def envuelto(*args: Any, **kwargs: Any) -> Any:
+            return responder(endpoint(*args, **kwargs))
+    return envuelto
+
+
+class RutaRapida(APIRoute):
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if _sin_modelo(endpoint, kwargs):
+            endpoint = _envolver(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ==========================================================
+# 🔹 Server-Timing
+# ==========================================================
+class MiddlewareTiempo:
+    """Añade `Server-Timing: app;dur=<ms>` (tiempo hasta el inicio de la respuesta)."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje: Dict[str, Any]) -> None:
+            if mensaje["type"] == "http.response.start":
+                duracion = f"app;dur={(time.perf_counter() - inicio) * 1000:.1f}".encode("latin-1")
+                mensaje["headers"] = [*mensaje.get("headers", ()), (b"server-timing", duracion)]
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+
+# ==========================================================
+# 🔹 Sobre de error común
+# ==========================================================
+def _error(codigo: int, mensaje: str, detalle: Any, cabeceras: Optional[Dict[str, str]] = None) -> RespuestaJSON:
+    return RespuestaJSON(
+        {
+            "ok": False,
+            "mensaje": mensaje,
+            "detail": detalle,
+            "datos": {},
+            "timestamp": datetime.now().isoformat(),
+            "request_id": id_peticion.get(),
+        },
+        status_code=codigo,
+        headers=cabeceras,
+    )
+
+
+async def _error_http(request: Request, exc: StarletteHTTPException) -> Response:
+    if exc.status_code in (204, 304) or exc.status_code < 200:
+        return Response(status_code=exc.status_code, headers=exc.headers)
+    mensaje = exc.detail if isinstance(exc.detail, str) else "Error en la petición"
+    return _error(exc.status_code, mensaje, exc.detail, exc.headers)
+
+
+async def _error_validacion(request: Request, exc: RequestValidationError) -> Response:
+    return _error(422, "Entrada inválida", jsonable_encoder(exc.errors()))
+
+
+async def _error_interno(request: Request, exc: Exception) -> Response:
+    logger.exception("❌ Error no controlado en %s %s", request.method, request.url.path)
+    return _error(500, "Error interno", f"{type(exc).__name__}: {exc}")
+
+
+# ==========================================================
+# 🔹 Fábrica
+# ==========================================================
+def crear_app(servicio: str, lifespan: Optional[Callable[..., Any]] = None, **kwargs_fastapi: Any) -> FastAPI:
+    """
+    App FastAPI de `servicio` con registro, métricas, X-Request-ID,
+    Server-Timing, gzip, JSON rápido y sobre de error común. `kwargs_fastapi`
+    (title, description, version…) pasan a FastAPI.
+    """
+    configurar_registro(servicio)
+    app = FastAPI(lifespan=lifespan, default_response_class=RespuestaJSON, **kwargs_fastapi)
+    app.router.route_class = RutaRapida
+    app.add_exception_handler(StarletteHTTPException, _error_http)
+    app.add_exception_handler(RequestValidationError, _error_validacion)
+    app.add_exception_handler(Exception, _error_interno)
+
+    # add_middleware envuelve: el último añadido es el más externo
+    if GZIP_MIN_BYTES > 0:
+        app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_NIVEL)
+    if SERVER_TIMING:
+        app.add_middleware(MiddlewareTiempo)
+    instrumentar(app, servicio)
+    app.add_middleware(MiddlewareIdPeticion)
+    return app
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from core.cache_compartida import ESPERA_MAX_S, SONDEO_S, CacheCompartida
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entrada:
+    valor: Any
+    expira: float
+    guardada: float
+
+
+def _consumir_excepcion(tarea: "asyncio.Future[Any]") -> None:
+    # Si todos los que esperaban se cancelaron, evita el aviso "exception was never retrieved"
+    if not tarea.cancelled():
+        tarea.exception()
+
+
+# Cachés vivas del proceso (para exportar sus estadísticas sin registrarlas a mano)
+_instancias: "weakref.WeakSet[CacheTTL]" = weakref.WeakSet()
+
+
+def instancias() -> List["CacheTTL"]:
+    return list(_instancias)
+
+
+class CacheTTL:
+    """
+    Caché en memoria con TTL por entrada, tamaño acotado (LRU) y
+    coalescencia de peticiones (single-flight).
+
+    - Varias corrutinas que piden la misma clave expirada comparten una
+      sola llamada al cargador.
+    - Si el cargador falla y existe un valor anterior (aunque expirado),
+      se sirve ese último valor bueno (stale-while-error).
+    - Con `compartida`, un fallo local se busca primero en la caché
+      compartida entre workers y solo un worker ejecuta el cargador de
+      cada clave; los demás leen su resultado. Si la capa compartida falla
+      (OSError: sin descriptores, /dev/shm lleno…), la petición sigue solo
+      con la caché local.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_entradas: int = 1024,
+        servir_obsoleto: bool = True,
+        max_obsolescencia: Optional[float] = None,
+        nombre: str = "cache",
+        compartida: Optional[CacheCompartida] = None,
+    ):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.servir_obsoleto = servir_obsoleto
+        self.max_obsolescencia = max_obsolescencia
+        self.nombre = nombre
+        self.compartida = compartida
+        self._datos: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._en_vuelo: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidas = 0
+        self.obsoletas_servidas = 0
+        self.expulsiones = 0
+        self.aciertos_compartida = 0
+        self.esperas_compartida = 0
+        self.errores_compartida = 0
+        _instancias.add(self)
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    # ------------------------------------------------------
+    # Acceso directo
+    # ------------------------------------------------------
+    def obtener_vigente(self, clave: Hashable) -> Optional[Any]:
+        """Devuelve el valor si existe y no ha expirado; no cuenta estadísticas."""
+        entrada = self._datos.get(clave)
+        if entrada is not None and entrada.expira > time.monotonic():
+            return entrada.valor
+        return None
+
+    def obtener_obsoleto(self, clave: Hashable) -> Optional[Tuple[Any, float]]:
+        """Último valor guardado aunque haya expirado, con su edad en segundos."""
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return self._obsoleto_compartido(clave)
+        return entrada.valor, time.monotonic() - entrada.guardada
+
+    def _obsoleto_compartido(self, clave: Hashable) -> Optional[Tuple[Any, float]]:
+        if self.compartida is None:
+            return None
+        try:
+            leido = self.compartida.leer((self.nombre, clave))
+        except OSError as e:
+            self._error_compartida(clave, e)
+            return None
+        if leido is None:
+            return None
+        valor, _, guardada = leido
+        return valor, max(0.0, time.time() - guardada)
+
+    def guardar(self, clave: Hashable, valor: Any, ttl: Optional[float] = None) -> None:
+        ahora = time.monotonic()
+        ttl = self.ttl if ttl is None else ttl
+        self._datos[clave] = _Entrada(valor=valor, expira=ahora + ttl, guardada=ahora)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+            self.expulsiones += 1
+
+    def invalidar(self, clave: Optional[Hashable] = None, compartida: bool = False) -> None:
+        """
+        Marca como expirada una clave (o todas). El valor se conserva para
+        poder servirse como obsoleto si la recarga falla. Con `compartida`
+        también expira en la caché compartida (todos los workers recargan);
+        sin ella, este proceso relee la copia compartida.
+        """
+        claves = list(self._datos) if clave is None else [clave]
+        for c in claves:
+            entrada = self._datos.get(c)
+            if entrada is not None:
+                entrada.expira = 0.0
+            if compartida and self.compartida is not None:
+                try:
+                    self.compartida.invalidar((self.nombre, c))
+                except OSError as e:
+                    self._error_compartida(c, e)
+
+    def limpiar(self) -> None:
+        self._datos.clear()
+
+    # ------------------------------------------------------
+    # Lectura con carga coalescida
+    # ------------------------------------------------------
+    async def obtener(
+        self,
+        clave: Hashable,
+        cargador: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Devuelve el valor de `clave`; si no está vigente ejecuta `cargador()`
+        una sola vez aunque haya varias corrutinas esperando.
+        """
+        entrada = self._datos.get(clave)
+        if entrada is not None and entrada.expira > time.monotonic():
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada.valor
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            self.fallos += 1
+            tarea = asyncio.ensure_future(self._cargar(clave, cargador, ttl, entrada))
+            tarea.add_done_callback(_consumir_excepcion)
+            self._en_vuelo[clave] = tarea
+        else:
+            self.coalescidas += 1
+        # shield: si quien inició la carga se cancela, los demás siguen esperando
+        return await asyncio.shield(tarea)
+
+    async def _cargar(
+        self,
+        clave: Hashable,
+        cargador: Callable[[], Awaitable[Any]],
+        ttl: Optional[float],
+        anterior: Optional[_Entrada],
+    ) -> Any:
+        try:
+            if self.compartida is None:
+                valor = await cargador()
+            else:
+                valor, ttl = await self._cargar_compartida(clave, cargador, self.ttl if ttl is None else ttl)
+        except Exception as e:
+            if self._puede_servir_obsoleto(anterior):
+                self.obsoletas_servidas += 1
+                logger.warning("Caché '%s': error recargando %r (%s); se sirve el último valor válido", self.nombre, clave, e)
+                return anterior.valor
+            obsoleto = self._obsoleto_compartido(clave) if anterior is None and self.servir_obsoleto else None
+            if obsoleto is not None and (self.max_obsolescencia is None or obsoleto[1] <= self.max_obsolescencia):
+                self.obsoletas_servidas += 1
+                logger.warning("Caché '%s': error recargando %r (%s); se sirve el último valor compartido", self.nombre, clave, e)
+                return obsoleto[0]
+            raise
+        finally:
+            self._en_vuelo.pop(clave, None)
+        self.guardar(clave, valor, ttl)
+        return valor
+
+    async def _cargar_compartida(
+        self,
+        clave: Hashable,
+        cargador: Callable[[], Awaitable[Any]],
+        ttl: float,
+    ) -> Tuple[Any, float]:
+        """
+        (valor, ttl local). Usa la entrada compartida si sigue vigente; si no,
+        el worker que toma el candado de la clave ejecuta el cargador y la
+        publica, y el resto espera a leerla.
+        """
+        compartida = self.compartida
+        # Varias cachés pueden usar el mismo espacio compartido: la clave lleva el nombre
+        clave_global = (self.nombre, clave)
+        limite = time.monotonic() + ESPERA_MAX_S
+        esperando = False
+        while True:
+            try:
+                vigente = compartida.vigente(clave_global)
+                tomada = vigente is None and compartida.tomar(clave_global)
+            except OSError as e:
+                self._error_compartida(clave, e)
+                return await cargador(), ttl
+            if vigente is not None:
+                self.aciertos_compartida += 1
+                return vigente[0], min(ttl, vigente[1])
+            if tomada:
+                try:
+                    # Otro worker pudo publicarla entre la lectura y el candado
+                    try:
+                        vigente = compartida.vigente(clave_global)
+                    except OSError as e:
+                        self._error_compartida(clave, e)
+                    if vigente is not None:
+                        self.aciertos_compartida += 1
+                        return vigente[0], min(ttl, vigente[1])
+                    valor = await cargador()
+                    try:
+                        compartida.escribir(clave_global, valor, ttl)
+                    except OSError as e:
+                        self._error_compartida(clave, e)
+                    return valor, ttl
+                finally:
+                    compartida.soltar(clave_global)
+            if not esperando:
+                esperando = True
+                self.esperas_compartida += 1
+                compartida.esperas += 1
+            if time.monotonic() >= limite:
+                logger.warning("Caché '%s': %r sigue en carga en otro worker tras %.0fs; se carga aquí", self.nombre, clave, ESPERA_MAX_S)
+                return await cargador(), ttl
+            await asyncio.sleep(SONDEO_S)
+
+    def _error_compartida(self, clave: Hashable, error: OSError) -> None:
+        """La capa compartida es una optimización: su fallo no debe tumbar la petición."""
+        self.errores_compartida += 1
+        nivel = logging.WARNING if self.errores_compartida == 1 else logging.DEBUG
+        logger.log(nivel, "Caché '%s': caché compartida no disponible para %r (%s); se usa solo la local", self.nombre, clave, error)
+
+    def _puede_servir_obsoleto(self, anterior: Optional[_Entrada]) -> bool:
+        if anterior is None or not self.servir_obsoleto:
+            return False
+        if self.max_obsolescencia is None:
+            return True
+        return time.monotonic() - anterior.guardada <= self.max_obsolescencia
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos + self.coalescidas
+        return {
+            "nombre": self.nombre,
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "en_vuelo": len(self._en_vuelo),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "coalescidas": self.coalescidas,
+            "obsoletas_servidas": self.obsoletas_servidas,
+            "expulsiones": self.expulsiones,
+            "aciertos_compartida": self.aciertos_compartida,
+            "esperas_compartida": self.esperas_compartida,
+            "errores_compartida": self.errores_compartida,
+            "ratio_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
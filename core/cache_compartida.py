@@ -0,0 +1,329 @@
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Caché compartida entre workers del mismo host
+#     Con `uvicorn --workers N` cada proceso tiene su propia
+#     CacheTTL; esta capa, debajo de ella, guarda los valores en
+#     archivos mapeados en memoria (/dev/shm) para que un solo
+#     worker consulte XM / los microservicios y el resto lea el
+#     resultado.
+#     CACHE_COMPARTIDA=0 la desactiva; CACHE_COMPARTIDA_DIR
+#     cambia el directorio. Cada ranura abierta ocupa dos
+#     descriptores (archivo + mmap): por espacio se mantienen a lo
+#     sumo CACHE_COMPARTIDA_MAX_ABIERTAS y se cierran las menos
+#     usadas.
+# ==========================================================
+ACTIVA = os.environ.get("CACHE_COMPARTIDA", "1").strip().lower() not in ("0", "false", "no", "off")
+DIRECTORIO = os.environ.get(
+    "CACHE_COMPARTIDA_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "tarifa-cache"),
+)
+MAX_ABIERTAS = int(os.environ.get("CACHE_COMPARTIDA_MAX_ABIERTAS", 64))
+SONDEO_S = 0.02          # espera entre lecturas mientras otro worker carga
+ESPERA_MAX_S = 30.0      # después se carga sin coordinar (el otro worker pudo morir)
+_REINTENTOS_LECTURA = 64
+
+# Cabecera de cada ranura (64 bytes):
+#   secuencia u64 (impar = escritura en curso) · expira f64 · guardada f64
+#   (epoch, común a todos los procesos) · longitud u32 · tipo u8 · huella 16B
+_CABECERA = struct.Struct("<QddIB3x16s")
+_SECUENCIA = struct.Struct("<Q")
+_TAM_CABECERA = 64
+_PAGINA = mmap.PAGESIZE
+
+# Tipos de valor: un float viaja como 8 bytes; el resto como JSON (sin pickle)
+_FLOTANTE, _JSON = 1, 2
+_DOBLE = struct.Struct("<d")
+
+
+def _codificar(valor: Any) -> Tuple[int, bytes]:
+    if isinstance(valor, float):
+        return _FLOTANTE, _DOBLE.pack(valor)
+    return _JSON, json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _decodificar(tipo: int, datos: bytes) -> Any:
+    if tipo == _FLOTANTE:
+        return _DOBLE.unpack(datos)[0]
+    return json.loads(datos)
+
+
+def _huella(clave: Hashable) -> bytes:
+    return hashlib.blake2b(repr(clave).encode(), digest_size=16).digest()
+
+
+class _Ranura:
+    """Un archivo mapeado: cabecera con seqlock + valor serializado."""
+
+    def __init__(self, ruta: str):
+        self.fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(self.fd).st_size < _PAGINA:
+                os.ftruncate(self.fd, _PAGINA)
+            self.mapa = mmap.mmap(self.fd, 0)
+        except OSError:
+            os.close(self.fd)
+            raise
+        self.cargando = False
+
+    def remapear(self, minimo: int = 0) -> None:
+        tam = os.fstat(self.fd).st_size
+        if tam < minimo:
+            tam = -(-minimo // _PAGINA) * _PAGINA
+            os.ftruncate(self.fd, tam)
+        if tam != len(self.mapa):
+            self.mapa.close()
+            self.mapa = mmap.mmap(self.fd, 0)
+
+    def leer(self, huella: bytes) -> Optional[Tuple[float, float, int, bytes]]:
+        """
+        (expira, guardada, tipo, datos) sin bloquear: si la secuencia es impar
+        o cambia durante la copia, hubo una escritura y se reintenta.
+        """
+        for _ in range(_REINTENTOS_LECTURA):
+            mapa = self.mapa
+            secuencia, expira, guardada, longitud, tipo, propia = _CABECERA.unpack_from(mapa, 0)
+            if secuencia & 1:
+                continue
+            if propia != huella or tipo == 0:
+                return None
+            if _TAM_CABECERA + longitud > len(mapa):
+                self.remapear()
+                continue
+            datos = mapa[_TAM_CABECERA:_TAM_CABECERA + longitud]
+            if _SECUENCIA.unpack_from(mapa, 0)[0] == secuencia:
+                return expira, guardada, tipo, datos
+        return None
+
+    def escribir(self, huella: bytes, tipo: int, datos: bytes, expira: float, guardada: float) -> None:
+        """Solo con el candado de la ranura tomado (un escritor a la vez)."""
+        self.remapear(_TAM_CABECERA + len(datos))
+        mapa = self.mapa
+        secuencia = _SECUENCIA.unpack_from(mapa, 0)[0] | 1
+        _SECUENCIA.pack_into(mapa, 0, secuencia)
+        mapa[_TAM_CABECERA:_TAM_CABECERA + len(datos)] = datos
+        _CABECERA.pack_into(mapa, 0, secuencia, expira, guardada, len(datos), tipo, huella)
+        _SECUENCIA.pack_into(mapa, 0, secuencia + 1)
+
+    def expirar(self, huella: bytes) -> None:
+        secuencia, _, guardada, longitud, tipo, propia = _CABECERA.unpack_from(self.mapa, 0)
+        if propia != huella:
+            return
+        _SECUENCIA.pack_into(self.mapa, 0, secuencia | 1)
+        _CABECERA.pack_into(self.mapa, 0, secuencia | 1, 0.0, guardada, longitud, tipo, propia)
+        _SECUENCIA.pack_into(self.mapa, 0, (secuencia | 1) + 1)
+
+    def tomar(self) -> bool:
+        """Candado entre procesos (flock no bloqueante) para cargar y escribir."""
+        if self.cargando:
+            # Otra clave del mismo proceso cae en esta ranura y ya la tiene
+            return False
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.cargando = True
+        return True
+
+    def soltar(self) -> None:
+        self.cargando = False
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def cerrar(self) -> None:
+        self.mapa.close()
+        os.close(self.fd)
+
+
+class CacheCompartida:
+    """
+    Valores compartidos por los procesos de un host en `max_ranuras`
+    archivos mapeados (la clave se reparte por hash; una colisión reemplaza
+    la entrada, como en cualquier caché). Como mucho `max_abiertas` ranuras
+    quedan abiertas a la vez (LRU); cerrar una no borra su valor.
+
+    - Lectura sin candados: seqlock en la cabecera de cada ranura.
+    - Escritura y carga: flock de la ranura; el worker que lo toma consulta
+      el origen y los demás esperan a leer su resultado (single-flight entre
+      procesos).
+    - Los valores van como float crudo o JSON; nunca pickle.
+    """
+
+    def __init__(
+        self,
+        espacio: str,
+        max_ranuras: int = 256,
+        directorio: str = DIRECTORIO,
+        max_abiertas: int = MAX_ABIERTAS,
+    ):
+        self.espacio = espacio
+        self.max_ranuras = max_ranuras
+        self.max_abiertas = max(1, max_abiertas)
+        self.directorio = os.path.join(directorio, espacio)
+        os.makedirs(self.directorio, exist_ok=True)
+        self._ranuras: "OrderedDict[int, _Ranura]" = OrderedDict()
+        self.aciertos = 0
+        self.esperas = 0
+        self.escrituras = 0
+        self.cierres = 0
+
+    def _ranura(self, huella: bytes) -> _Ranura:
+        indice = int.from_bytes(huella[:8], "little") % self.max_ranuras
+        ranura = self._ranuras.get(indice)
+        if ranura is not None:
+            self._ranuras.move_to_end(indice)
+            return ranura
+        self._cerrar_sobrantes(self.max_abiertas - 1)
+        ranura = self._ranuras[indice] = _Ranura(os.path.join(self.directorio, f"{indice:04d}"))
+        return ranura
+
+    def _cerrar_sobrantes(self, limite: int) -> None:
+        """Cierra las ranuras menos usadas hasta dejar `limite` abiertas (no las que tienen el candado)."""
+        for indice in list(self._ranuras):
+            if len(self._ranuras) <= limite:
+                return
+            ranura = self._ranuras[indice]
+            if ranura.cargando:
+                # Cerrar su fd soltaría el flock de una carga en curso
+                continue
+            del self._ranuras[indice]
+            ranura.cerrar()
+            self.cierres += 1
+
+    def leer(self, clave: Hashable) -> Optional[Tuple[Any, float, float]]:
+        """(valor, expira, guardada) en epoch, aunque haya expirado; None si no está."""
+        huella = _huella(clave)
+        leido = self._ranura(huella).leer(huella)
+        if leido is None:
+            return None
+        expira, guardada, tipo, datos = leido
+        return _decodificar(tipo, datos), expira, guardada
+
+    def vigente(self, clave: Hashable) -> Optional[Tuple[Any, float]]:
+        """(valor, segundos de vida restantes) si la entrada no ha expirado."""
+        huella = _huella(clave)
+        leido = self._ranura(huella).leer(huella)
+        if leido is None:
+            return None
+        restante = leido[0] - time.time()
+        if restante <= 0:
+            return None
+        self.aciertos += 1
+        return _decodificar(leido[2], leido[3]), restante
+
+    def tomar(self, clave: Hashable) -> bool:
+        return self._ranura(_huella(clave)).tomar()
+
+    def soltar(self, clave: Hashable) -> None:
+        self._ranura(_huella(clave)).soltar()
+
+    def escribir(self, clave: Hashable, valor: Any, ttl: float) -> bool:
+        """Publica el valor (requiere haber tomado la clave). False si no es serializable."""
+        try:
+            tipo, datos = _codificar(valor)
+        except (TypeError, ValueError):
+            logger.debug("Caché compartida '%s': %r no es serializable; queda solo en el proceso", self.espacio, clave)
+            return False
+        huella = _huella(clave)
+        ahora = time.time()
+        self._ranura(huella).escribir(huella, tipo, datos, ahora + ttl, ahora)
+        self.escrituras += 1
+        return True
+
+    def invalidar(self, clave: Hashable) -> None:
+        """
+        Marca la entrada como expirada para todos los workers (conserva el
+        valor para servirlo como obsoleto). Si otro worker la está cargando
+        no hace falta: publicará un valor nuevo.
+        """
+        huella = _huella(clave)
+        ranura = self._ranura(huella)
+        if ranura.cargando:
+            ranura.expirar(huella)
+        elif ranura.tomar():
+            try:
+                ranura.expirar(huella)
+            finally:
+                ranura.soltar()
+
+    def cerrar(self) -> None:
+        for ranura in self._ranuras.values():
+            ranura.cerrar()
+        self._ranuras.clear()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "espacio": self.espacio,
+            "directorio": self.directorio,
+            "ranuras_abiertas": len(self._ranuras),
+            "max_abiertas": self.max_abiertas,
+            "cierres": self.cierres,
+            "aciertos": self.aciertos,
+            "esperas": self.esperas,
+            "escrituras": self.escrituras,
+        }
+
+
+def crear(prefijo: str, *partes: Any, max_ranuras: int = 256) -> Optional[CacheCompartida]:
+    """
+    Caché compartida para `prefijo`, o None si está desactivada o el
+    directorio no es utilizable. `partes` (URLs de origen, modo…) entran en
+    el nombre del espacio: servicios apuntados a orígenes distintos no
+    comparten valores.
+    """
+    if not ACTIVA:
+        return None
+    sufijo = hashlib.blake2b(repr(partes).encode(), digest_size=4).hexdigest()
+    try:
+        return CacheCompartida(f"{prefijo}-{sufijo}", max_ranuras=max_ranuras)
+    except OSError as e:
+        logger.warning("Caché compartida '%s' desactivada: %s", prefijo, e)
+        return None
+
+
+class Liderazgo:
+    """
+    Elige un worker por host para una tarea periódica (flock no bloqueante
+    sobre `<directorio>/<nombre>.lider`). El candado se libera solo si el
+    proceso muere y otro worker lo toma en su siguiente intento.
+    """
+
+    def __init__(self, nombre: str, directorio: str = DIRECTORIO):
+        self.ruta = os.path.join(directorio, f"{nombre}.lider")
+        self._fd: Optional[int] = None
+
+    @property
+    def tomado(self) -> bool:
+        return self._fd is not None
+
+    def es_lider(self) -> bool:
+        if not ACTIVA or self._fd is not None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def soltar(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -1,27 +1,400 @@
+import hashlib
 import json
 import os
 import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from bisect import bisect_right
+from datetime import date, datetime
 from functools import lru_cache
+from numbers import Real
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
 
+logger = logging.getLogger(__name__)
 
-@lru_cache(maxsize=1)
-def cargar_configuracion(path: str | None = None) -> dict:
+_VACIO: Mapping[str, Any] = MappingProxyType({})
+
+
+class ErrorConfiguracion(ValueError):
+    """El archivo normativo no supera la validación; se conserva la versión anterior."""
+
+
+# ==========================================================
+# 🔹 SNAPSHOT INMUTABLE DE LA CONFIGURACIÓN NORMATIVA
+# ==========================================================
+
+def _congelar(valor: Any) -> Any:
+    if isinstance(valor, dict):
+        return MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+def descongelar(valor: Any) -> Any:
+    """Copia mutable (dict/list) de una sección congelada, p. ej. para enviarla como JSON."""
+    if isinstance(valor, Mapping):
+        return {k: descongelar(v) for k, v in valor.items()}
+    if isinstance(valor, tuple):
+        return [descongelar(v) for v in valor]
+    return valor
+
+
+@dataclass(frozen=True)
+class ConfiguracionNormativa:
+    """
+    Versión inmutable de normativa_config.json.
+
+    Se reemplaza entera al recargar: quien tomó una referencia sigue viendo
+    la misma versión hasta terminar. `derivado()` memoriza cálculos sobre el
+    snapshot (payloads, tablas compiladas) para hacerlos una sola vez.
+
+    Si el archivo trae `vigencias`, `en_fecha()` devuelve el snapshot del
+    tramo vigente en una fecha (búsqueda binaria sobre los límites).
+    """
+    version: int
+    ruta: str
+    huella: str
+    cargada_en: str
+    datos: Mapping[str, Any]
+    tarifas_kWh: Mapping[str, float]
+    vigencia: Optional[Tuple[Optional[str], Optional[str]]] = None
+    limites_vigencia: Tuple[int, ...] = ()
+    tramos: Tuple[Optional["ConfiguracionNormativa"], ...] = field(default=(), repr=False)
+    _derivados: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    def get(self, clave: str, defecto: Any = None) -> Any:
+        return self.datos.get(clave, defecto)
+
+    def seccion(self, nombre: str) -> Mapping[str, Any]:
+        return self.datos.get(nombre) or _VACIO
+
+    def tarifa(self, componente: str, defecto: float = 0.0) -> float:
+        """tarifas.<componente>.valor_kWh precalculado."""
+        return self.tarifas_kWh.get(componente, defecto)
+
+    def derivado(self, nombre: str, calcular: Callable[["ConfiguracionNormativa"], Any]) -> Any:
+        if nombre not in self._derivados:
+            self._derivados[nombre] = calcular(self)
+        return self._derivados[nombre]
+
+    def tramo(self, indice: int) -> "ConfiguracionNormativa":
+        """
+        Snapshot del tramo `indice`, donde indice = bisect_right(limites_vigencia,
+        ordinal) - 1; -1 o un tramo sin vigencias activas es la configuración base.
+        """
+        if indice < 0:
+            return self
+        return self.tramos[indice] or self
+
+    def en_fecha(self, fecha: Optional[date]) -> "ConfiguracionNormativa":
+        """Parámetros vigentes en `fecha` (None: la configuración base)."""
+        if fecha is None or not self.limites_vigencia:
+            return self
+        return self.tramo(bisect_right(self.limites_vigencia, fecha.toordinal()) - 1)
+
+    def resumen(self) -> Dict[str, Any]:
+        resumen = {"version": self.version, "ruta": self.ruta, "huella": self.huella[:12], "cargada_en": self.cargada_en}
+        if self.vigencia is not None:
+            resumen["vigencia"] = {"desde": self.vigencia[0], "hasta": self.vigencia[1]}
+        if self.limites_vigencia:
+            resumen["vigencias"] = [
+                {"desde": t.vigencia[0], "hasta": t.vigencia[1]} for t in self.tramos if t is not None
+            ]
+        return resumen
+
+
+def _es_numero(valor: Any) -> bool:
+    return isinstance(valor, Real) and not isinstance(valor, bool)
+
+
+def validar_configuracion(datos: Any) -> None:
+    """Comprueba tipos y rangos de los campos que usan los servicios."""
+    errores = []
+    if not isinstance(datos, dict):
+        raise ErrorConfiguracion("La raíz de la configuración debe ser un objeto JSON")
+
+    for nombre, tarifa in (datos.get("tarifas") or {}).items():
+        v = tarifa.get("valor_kWh") if isinstance(tarifa, dict) else None
+        if not _es_numero(v) or v < 0:
+            errores.append(f"tarifas.{nombre}.valor_kWh debe ser un número >= 0")
+
+    filas_por_componente = {
+        "componente_G": ("compras", ("energia_kWh",)),
+        "componente_T": ("lineas", ("energia_kWh",)),
+        "componente_D": ("redes", ("energia_kWh", "costo_unitario_kWh")),
+        "componente_R": ("eventos", ("energia_afectada_kWh", "costo_unitario_kWh")),
+    }
+    for seccion, (lista, campos) in filas_por_componente.items():
+        filas = (datos.get(seccion) or {}).get(lista)
+        if filas is None:
+            continue
+        if not isinstance(filas, list):
+            errores.append(f"{seccion}.{lista} debe ser una lista")
+            continue
+        for i, fila in enumerate(filas):
+            if not isinstance(fila, dict) or not all(_es_numero(fila.get(c)) for c in campos):
+                errores.append(f"{seccion}.{lista}[{i}] requiere {', '.join(campos)} numéricos")
+            elif seccion == "componente_T" and not _es_numero(fila.get("costo_unitario_kWh")) and fila.get("nivel_tension") is None:
+                # Sin costo explícito, el cargo sale de la tabla por nivel de tensión
+                errores.append(f"componente_T.lineas[{i}] requiere costo_unitario_kWh numérico o nivel_tension")
+
+    for tabla in ("cargos_por_nivel", "factor_geografico", "recargo_horario"):
+        for clave, v in ((datos.get("componente_T") or {}).get(tabla) or {}).items():
+            if not _es_numero(v) or v < 0:
+                errores.append(f"componente_T.{tabla}.{clave} debe ser un número >= 0")
+
+    subsidios = datos.get("subsidios_contribuciones") or {}
+    for estrato, v in (subsidios.get("porcentaje_por_estrato") or {}).items():
+        if str(estrato) not in ("1", "2", "3", "4", "5", "6"):
+            errores.append(f"subsidios_contribuciones.porcentaje_por_estrato: estrato '{estrato}' fuera de 1–6")
+        elif not (_es_numero(v) and -1 <= v <= 1):
+            errores.append(f"subsidios_contribuciones.porcentaje_por_estrato.{estrato} debe estar entre -1 y 1")
+    for zona, v in (subsidios.get("consumo_subsistencia_kWh") or {}).items():
+        if not _es_numero(v) or v < 0:
+            errores.append(f"subsidios_contribuciones.consumo_subsistencia_kWh.{zona} debe ser un número >= 0")
+
+    pr = datos.get("componente_PR") or {}
+    if "porcentaje_perdidas" in pr and not (_es_numero(pr["porcentaje_perdidas"]) and 0 <= pr["porcentaje_perdidas"] <= 1):
+        errores.append("componente_PR.porcentaje_perdidas debe estar entre 0 y 1")
+
+    if errores:
+        raise ErrorConfiguracion("; ".join(errores))
+
+
+def _ruta_por_defecto() -> str:
+    return os.environ.get("NORMATIVA_CONFIG_PATH", "/app/config/normativa_config.json")
+
+
+def _fecha_vigencia(valor: Any, campo: str) -> date:
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError) as e:
+        raise ErrorConfiguracion(f"{campo} debe ser una fecha ISO (AAAA-MM-DD)") from e
+
+
+def _fusionar(base: Mapping[str, Any], cambios: Mapping[str, Any]) -> dict:
+    """Copia de `base` con `cambios` aplicados recursivamente (las listas se reemplazan)."""
+    resultado = dict(base)
+    for clave, valor in cambios.items():
+        if isinstance(valor, dict) and isinstance(resultado.get(clave), dict):
+            resultado[clave] = _fusionar(resultado[clave], valor)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+
+def _tramos_vigencia(datos: dict) -> Tuple[Tuple[int, ...], list]:
+    """
+    Parte la línea de tiempo en tramos donde el conjunto de vigencias activas
+    no cambia. Devuelve (ordinal de inicio de cada tramo, parámetros del tramo
+    o None si ninguna vigencia aplica, con su intervalo).
+    """
+    vigencias = datos.get("vigencias") or []
+    if not isinstance(vigencias, list):
+        raise ErrorConfiguracion("vigencias debe ser una lista")
+
+    intervalos = []
+    for i, v in enumerate(vigencias):
+        if not isinstance(v, dict):
+            raise ErrorConfiguracion(f"vigencias[{i}] debe ser un objeto")
+        desde = _fecha_vigencia(v.get("desde"), f"vigencias[{i}].desde")
+        hasta = None if v.get("hasta") is None else _fecha_vigencia(v["hasta"], f"vigencias[{i}].hasta")
+        if hasta is not None and hasta < desde:
+            raise ErrorConfiguracion(f"vigencias[{i}]: hasta es anterior a desde")
+        cambios = {k: val for k, val in v.items() if k not in ("desde", "hasta", "descripcion")}
+        intervalos.append((desde.toordinal(), hasta.toordinal() if hasta else None, i, cambios))
+    # Si dos vigencias se solapan, prevalece la que empieza después
+    intervalos.sort(key=lambda x: (x[0], x[2]))
+
+    limites = sorted({d for d, _, _, _ in intervalos} | {h + 1 for _, h, _, _ in intervalos if h is not None})
+    base = {k: v for k, v in datos.items() if k != "vigencias"}
+    tramos = []
+    for k, inicio in enumerate(limites):
+        fin = limites[k + 1] - 1 if k + 1 < len(limites) else None
+        activas = [c for d, h, _, c in intervalos if d <= inicio and (h is None or h >= inicio)]
+        if not activas:
+            tramos.append(None)
+            continue
+        fusion = base
+        for cambios in activas:
+            fusion = _fusionar(fusion, cambios)
+        tramos.append((fusion, date.fromordinal(inicio).isoformat(), date.fromordinal(fin).isoformat() if fin else None))
+    return tuple(limites), tramos
+
+
+def _snapshot(datos: dict, ruta: str, version: int, huella: str, cargada_en: str, **extra: Any) -> ConfiguracionNormativa:
+    validar_configuracion(datos)
+    tarifas = {
+        nombre: float(t["valor_kWh"])
+        for nombre, t in (datos.get("tarifas") or {}).items()
+        if isinstance(t, dict) and "valor_kWh" in t
+    }
+    return ConfiguracionNormativa(
+        version=version,
+        ruta=ruta,
+        huella=huella,
+        cargada_en=cargada_en,
+        datos=_congelar(datos),
+        tarifas_kWh=MappingProxyType(tarifas),
+        **extra,
+    )
+
+
+def compilar_configuracion(datos: dict, ruta: str, version: int, contenido: bytes = b"") -> ConfiguracionNormativa:
+    """
+    Valida el dict y construye el snapshot inmutable con sus campos
+    precalculados, incluido un snapshot por cada tramo de `vigencias`:
+    [{"desde": "AAAA-MM-DD", "hasta": "AAAA-MM-DD" | null, <secciones que cambian>}].
+    """
+    if not isinstance(datos, dict):
+        raise ErrorConfiguracion("La raíz de la configuración debe ser un objeto JSON")
+    huella = hashlib.sha256(contenido).hexdigest()
+    cargada_en = datetime.now().isoformat(timespec="seconds")
+    limites, tramos = _tramos_vigencia(datos)
+
+    compilados = []
+    for tramo in tramos:
+        if tramo is None:
+            compilados.append(None)
+            continue
+        fusion, desde, hasta = tramo
+        try:
+            compilados.append(_snapshot(fusion, ruta, version, huella, cargada_en, vigencia=(desde, hasta)))
+        except ErrorConfiguracion as e:
+            raise ErrorConfiguracion(f"vigencia {desde} – {hasta or '…'}: {e}") from e
+
+    return _snapshot(
+        datos, ruta, version, huella, cargada_en,
+        limites_vigencia=limites, tramos=tuple(compilados),
+    )
+
+
+def _leer(ruta: str, version: int) -> ConfiguracionNormativa:
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    try:
+        datos = json.loads(contenido.decode("utf-8"))
+    except ValueError as e:
+        raise ErrorConfiguracion(f"JSON inválido en {ruta}: {e}") from e
+    return compilar_configuracion(datos, ruta, version, contenido)
+
+
+# NORMATIVA_CONFIG_VIGILAR_S: cada cuántos segundos se mira si el archivo
+# cambió (mtime/tamaño) para recargarlo; 0 desactiva la recarga automática.
+VIGILAR_S = float(os.environ.get("NORMATIVA_CONFIG_VIGILAR_S", 10))
+
+_lock = threading.Lock()
+_actual: Optional[ConfiguracionNormativa] = None
+_firma_archivo: Optional[Tuple[float, int]] = None
+_proxima_revision = 0.0
+
+
+def _firma(ruta: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def obtener_configuracion() -> ConfiguracionNormativa:
+    """
+    Snapshot vigente. Tómelo una vez al inicio de cada petición y páselo a lo
+    que lo necesite: así una recarga no cambia valores a mitad de un cálculo.
+    Como mucho cada VIGILAR_S segundos comprueba si el archivo cambió.
+    """
+    actual = _actual
+    if actual is None or (VIGILAR_S > 0 and time.monotonic() >= _proxima_revision):
+        actual = _revisar()
+    return actual
+
+
+def _revisar() -> ConfiguracionNormativa:
+    global _proxima_revision
+    with _lock:
+        if _actual is not None and time.monotonic() < _proxima_revision:
+            return _actual
+        _proxima_revision = time.monotonic() + VIGILAR_S
+        if _actual is None:
+            _cargar_inicial()
+            return _actual
+        if _firma(_actual.ruta) == _firma_archivo:
+            return _actual
+    try:
+        return recargar_configuracion()
+    except ErrorConfiguracion as e:
+        logger.error("Configuración normativa inválida, se mantiene la versión %s: %s", _actual.version, e)
+        return _actual
+
+
+def _cargar_inicial() -> None:
+    global _actual, _firma_archivo
+    ruta = _ruta_por_defecto()
+    firma = _firma(ruta)
+    try:
+        _actual = _leer(ruta, 1)
+    except FileNotFoundError:
+        logger.warning("Archivo no encontrado: %s", ruta)
+        _actual = compilar_configuracion({}, ruta, 1)
+    except Exception:
+        logger.exception("Error leyendo configuración normativa")
+        _actual = compilar_configuracion({}, ruta, 1)
+    _firma_archivo = firma
+
+
+def recargar_configuracion() -> ConfiguracionNormativa:
+    """
+    Relee el archivo y, si es válido, publica un nuevo snapshot de forma
+    atómica. Si no lo es, lanza ErrorConfiguracion y deja el anterior.
+    """
+    global _actual, _firma_archivo
+    with _lock:
+        if _actual is None:
+            _cargar_inicial()
+            return _actual
+        ruta = _ruta_por_defecto()
+        firma = _firma(ruta)
+        try:
+            nueva = _leer(ruta, _actual.version + 1)
+        except FileNotFoundError as e:
+            raise ErrorConfiguracion(f"Archivo no encontrado: {ruta}") from e
+        finally:
+            # Un archivo inválido no se vuelve a intentar hasta que cambie
+            _firma_archivo = firma
+        if nueva.huella == _actual.huella:
+            return _actual
+        _actual = nueva
+    logger.info("Configuración normativa recargada: versión %s (%s)", nueva.version, nueva.huella[:12])
+    return nueva
+
+
+@lru_cache(maxsize=8)
+def _cargar_ruta(ruta: str, firma: Optional[Tuple[float, int]]) -> ConfiguracionNormativa:
+    return _leer(ruta, 0)
+
+
+def cargar_configuracion(path: str | None = None) -> Mapping[str, Any]:
     """
     Lee el archivo de configuración normativa (normativa_config.json).
     Prioriza la variable de entorno NORMATIVA_CONFIG_PATH,
     y si no existe, usa /app/config/normativa_config.json.
-    """
-    ruta = path or os.environ.get("NORMATIVA_CONFIG_PATH", "/app/config/normativa_config.json")
 
+    Devuelve los datos (de solo lectura) del snapshot vigente. Con `path`
+    se lee ese archivo aparte, sin reemplazar la configuración por defecto.
+    """
+    if path is None:
+        return obtener_configuracion().datos
     try:
-        with open(ruta, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return _cargar_ruta(path, _firma(path)).datos
     except FileNotFoundError:
-        logging.getLogger(__name__).warning(f"Archivo no encontrado: {ruta}")
-        return {}
-    except Exception as e:
-        logging.getLogger(__name__).exception("Error leyendo configuración normativa")
-        return {}
+        logger.warning("Archivo no encontrado: %s", path)
+        return _VACIO
+    except Exception:
+        logger.exception("Error leyendo configuración normativa")
+        return _VACIO
 
 
 # ==========================================================
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================================
+# 🔹 CONFIGURACIÓN DEL POOL (variables de entorno)
+# ==========================================================
+
+def _env_float(nombre: str, defecto: float) -> float:
+    valor = os.environ.get(nombre)
+    return float(valor) if valor not in (None, "") else defecto
+
+
+def _env_int(nombre: str, defecto: int) -> int:
+    valor = os.environ.get(nombre)
+    return int(valor) if valor not in (None, "") else defecto
+
+
+def _env_bool(nombre: str, defecto: bool) -> bool:
+    valor = os.environ.get(nombre)
+    if valor in (None, ""):
+        return defecto
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+
+@dataclass(frozen=True)
+class ConfigPoolHTTP:
+    """Parámetros del pool de conexiones keep-alive."""
+    timeout: float = 8.0
+    max_conexiones: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry: float = 30.0
+    max_por_host: int = 20
+    http2: bool = False
+
+    @classmethod
+    def desde_entorno(cls, prefijo: str = "HTTP_POOL", **defectos: Any) -> "ConfigPoolHTTP":
+        """
+        Construye la configuración leyendo <prefijo>_TIMEOUT, <prefijo>_MAX_CONEXIONES,
+        <prefijo>_MAX_KEEPALIVE, <prefijo>_KEEPALIVE_EXPIRY, <prefijo>_MAX_POR_HOST
+        y <prefijo>_HTTP2. Lo que no esté definido toma el valor de `defectos`.
+        """
+        base = cls(**defectos)
+        return cls(
+            timeout=_env_float(f"{prefijo}_TIMEOUT", base.timeout),
+            max_conexiones=_env_int(f"{prefijo}_MAX_CONEXIONES", base.max_conexiones),
+            max_keepalive=_env_int(f"{prefijo}_MAX_KEEPALIVE", base.max_keepalive),
+            keepalive_expiry=_env_float(f"{prefijo}_KEEPALIVE_EXPIRY", base.keepalive_expiry),
+            max_por_host=_env_int(f"{prefijo}_MAX_POR_HOST", base.max_por_host),
+            http2=_env_bool(f"{prefijo}_HTTP2", base.http2),
+        )
+
+
+# ==========================================================
+# 🔹 POOL COMPARTIDO POR PROCESO
+# ==========================================================
+MAX_VALIDADORES = 256      # recursos GET recordados para revalidar (ETag)
+
+
+class PoolHTTP:
+    """
+    Cliente httpx único por proceso, con conexiones keep-alive reutilizables
+    y un límite de peticiones concurrentes por host.
+
+    Se abre y cierra en el lifespan de FastAPI; si se usa antes (scripts,
+    pruebas manuales) se abre de forma perezosa en la primera petición.
+    """
+
+    def __init__(self, config: Optional[ConfigPoolHTTP] = None, **kwargs_cliente: Any):
+        self.config = config or ConfigPoolHTTP.desde_entorno()
+        self._kwargs_cliente = kwargs_cliente
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._http2_activo = False
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._esperando: Dict[str, int] = {}
+        # GET condicional: (url, params) → (ETag, Last-Modified, JSON); acotado
+        self._validadores: "OrderedDict[Hashable, Tuple[Optional[str], Optional[str], Any]]" = OrderedDict()
+        self._revalidaciones = {"304": 0, "200": 0}
+
+    async def abrir(self) -> None:
+        """Crea el cliente subyacente (idempotente)."""
+        self._asegurar_cliente()
+
+    async def cerrar(self) -> None:
+        """Cierra todas las conexiones del pool."""
+        if self._cliente is not None:
+            cliente, self._cliente = self._cliente, None
+            await cliente.aclose()
+        self._semaforos.clear()
+        self._esperando.clear()
+
+    def _asegurar_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            http2 = self.config.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP/2 solicitado pero el paquete 'h2' no está instalado; se usa HTTP/1.1")
+                    http2 = False
+            self._http2_activo = http2
+            self._cliente = httpx.AsyncClient(
+                timeout=self.config.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_conexiones,
+                    max_keepalive_connections=self.config.max_keepalive,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+                http2=http2,
+                **self._kwargs_cliente,
+            )
+        return self._cliente
+
+    @property
+    def abierto(self) -> bool:
+        return self._cliente is not None
+
+    async def request(self, metodo: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Envía una petición respetando el límite de concurrencia del host destino."""
+        cliente = self._asegurar_cliente()
+        host = urlsplit(url).netloc
+        semaforo = self._semaforos.get(host)
+        if semaforo is None:
+            semaforo = self._semaforos.setdefault(host, asyncio.Semaphore(self.config.max_por_host))
+
+        self._esperando[host] = self._esperando.get(host, 0) + 1
+        try:
+            await semaforo.acquire()
+        finally:
+            self._esperando[host] -= 1
+        try:
+            return await cliente.request(metodo, url, **kwargs)
+        finally:
+            semaforo.release()
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def get_json_condicional(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        GET de un recurso JSON revalidando la copia anterior: envía
+        If-None-Match / If-Modified-Since y, ante un 304, devuelve el JSON
+        guardado sin descargar ni parsear el cuerpo. Lanza HTTPStatusError
+        como raise_for_status().
+        """
+        clave = (url, tuple(sorted((params or {}).items())))
+        previo = self._validadores.get(clave)
+        cabeceras = dict(headers or {})
+        if previo is not None:
+            etag, modificado, _ = previo
+            if etag:
+                cabeceras["If-None-Match"] = etag
+            if modificado:
+                cabeceras["If-Modified-Since"] = modificado
+        resp = await self.get(url, params=params, headers=cabeceras, **kwargs)
+        if resp.status_code == 304 and previo is not None:
+            self._revalidaciones["304"] += 1
+            self._validadores.move_to_end(clave)
+            return previo[2]
+        resp.raise_for_status()
+        datos = resp.json()
+        self._revalidaciones["200"] += 1
+        etag, modificado = resp.headers.get("etag"), resp.headers.get("last-modified")
+        if etag or modificado:
+            self._validadores[clave] = (etag, modificado, datos)
+            self._validadores.move_to_end(clave)
+            if len(self._validadores) > MAX_VALIDADORES:
+                self._validadores.popitem(last=False)
+        return datos
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Estado del pool para dimensionarlo: conexiones en uso, ociosas y
+        peticiones en espera (por el pool de httpcore o por el límite por host).
+        """
+        transporte = getattr(self._cliente, "_transport", None)
+        pool = getattr(transporte, "_pool", None)
+        conexiones = list(getattr(pool, "connections", []) or [])
+        en_espera_pool = sum(1 for r in getattr(pool, "_requests", []) or [] if r.is_queued())
+        en_espera_host = {h: n for h, n in self._esperando.items() if n > 0}
+
+        return {
+            "abierto": self.abierto,
+            "http2": self._http2_activo,
+            "conexiones_totales": len(conexiones),
+            "en_uso": sum(1 for c in conexiones if not c.is_idle() and not c.is_closed()),
+            "ociosas": sum(1 for c in conexiones if c.is_idle()),
+            "esperando": en_espera_pool + sum(en_espera_host.values()),
+            "esperando_por_host": en_espera_host,
+            "revalidaciones": dict(self._revalidaciones, recursos=len(self._validadores)),
+            "limites": asdict(self.config),
+        }
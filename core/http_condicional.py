@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from core.aplicacion import serializar_json
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 GET condicional para recursos que cambian poco
+#     (precio XM, catálogo de métricas, configuración, matriz
+#     de tarifas, tabla de cargos T).
+#     - ETag fuerte = hash del cuerpo JSON: mismo contenido,
+#       mismo ETag en todos los workers y réplicas.
+#     - Last-Modified = primera vez que este proceso sirvió ese
+#       contenido (o la fecha que indique la ruta).
+#     - Cache-Control: max-age por ruta (0 → no-cache: el cliente
+#       guarda la copia pero revalida siempre).
+#     - If-None-Match (o If-Modified-Since si no hay ETag en la
+#       petición) que coincide → 304 sin cuerpo.
+#     El "timestamp" de respuesta_estandar se fija a Last-Modified:
+#     si no, cada respuesta tendría un cuerpo (y un ETag) distinto.
+#     HTTP_CONDICIONAL=0 desactiva las cabeceras y el 304.
+# ==========================================================
+ACTIVO = os.environ.get("HTTP_CONDICIONAL", "1").strip().lower() not in ("0", "false", "no", "off")
+MAX_HUELLAS = 1024
+
+# ETag → primera vez visto (Last-Modified); acotado
+_vistos: "OrderedDict[str, datetime]" = OrderedDict()
+# Ruta → (objeto fuente, cuerpo, ETag): evita re-serializar un contenido
+# grande (catálogo de métricas) mientras la caché devuelva el mismo objeto
+_cuerpos: Dict[str, Tuple[Any, bytes, str]] = {}
+
+
+def _serializar(contenido: Any) -> bytes:
+    # Mismo codificador que el resto de respuestas: el ETag es el hash de los bytes enviados
+    return serializar_json(contenido)
+
+
+def _etag(cuerpo: bytes) -> str:
+    return '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+
+
+def _primera_vez(etag: str, ultima_modificacion: Optional[datetime]) -> datetime:
+    if ultima_modificacion is not None:
+        if ultima_modificacion.tzinfo is None:
+            ultima_modificacion = ultima_modificacion.astimezone()
+        return ultima_modificacion.astimezone(timezone.utc).replace(microsecond=0)
+    visto = _vistos.get(etag)
+    if visto is None:
+        visto = datetime.now(timezone.utc).replace(microsecond=0)
+        _vistos[etag] = visto
+        if len(_vistos) > MAX_HUELLAS:
+            _vistos.popitem(last=False)
+    return visto
+
+
+def _coincide(request: Request, etag: str, modificado: datetime) -> bool:
+    """¿La copia del cliente sigue vigente? (RFC 9110 §13.1.2 y §13.1.3)."""
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide is not None:
+        if si_no_coincide.strip() == "*":
+            return True
+        # Comparación débil: W/"x" y "x" son la misma versión
+        candidatos = {e.strip().removeprefix("W/") for e in si_no_coincide.split(",")}
+        return etag in candidatos
+    desde = request.headers.get("if-modified-since")
+    if desde:
+        try:
+            return modificado <= parsedate_to_datetime(desde)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _cache_control(max_age: int) -> str:
+    return f"max-age={max_age}" if max_age > 0 else "no-cache"
+
+
+def respuesta_condicional(
+    request: Request,
+    contenido: Any,
+    max_age: int = 0,
+    ultima_modificacion: Optional[datetime] = None,
+    fuente: Any = None,
+) -> Response:
+    """
+    Respuesta JSON de `contenido` con ETag, Last-Modified y Cache-Control,
+    o 304 si la copia del cliente coincide.
+
+    `fuente`: objeto del que sale el contenido (p. ej. la lista cacheada del
+    catálogo). Si la ruta lo recibe de nuevo (mismo objeto), se reutilizan el
+    cuerpo y el ETag ya calculados sin volver a serializar.
+    """
+    if not ACTIVO:
+        return Response(_serializar(contenido), media_type="application/json")
+
+    ruta = request.url.path + ("?" + request.url.query if request.url.query else "")
+    previo = _cuerpos.get(ruta) if fuente is not None else None
+    if previo is not None and previo[0] is fuente:
+        _, cuerpo, etag = previo
+        modificado = _primera_vez(etag, ultima_modificacion)
+    else:
+        marca = isinstance(contenido, dict) and "timestamp" in contenido
+        base = {k: v for k, v in contenido.items() if k != "timestamp"} if marca else contenido
+        etag = _etag(_serializar(base))
+        modificado = _primera_vez(etag, ultima_modificacion)
+        if marca:
+            contenido = {**contenido, "timestamp": modificado.isoformat()}
+        cuerpo = _serializar(contenido)
+        if fuente is not None:
+            _cuerpos[ruta] = (fuente, cuerpo, etag)
+            if len(_cuerpos) > MAX_HUELLAS:
+                _cuerpos.pop(next(iter(_cuerpos)))
+
+    cabeceras = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(modificado, usegmt=True),
+        "Cache-Control": _cache_control(max_age),
+    }
+    if _coincide(request, etag, modificado):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, media_type="application/json", headers=cabeceras)
+
+
+def max_age_entorno(nombre: str, defecto: int) -> int:
+    """max-age (s) de una ruta: HTTP_MAX_AGE_<NOMBRE> o `defecto`."""
+    valor = os.environ.get(f"HTTP_MAX_AGE_{nombre.upper()}")
+    return int(valor) if valor not in (None, "") else defecto
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, Info, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from core import cache as cache_mod
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 📈 Métricas Prometheus comunes a los siete servicios
+#     - GET /metrics en cada app (instrumentar(app, servicio)).
+#     - Latencia y código por plantilla de ruta (no por URL:
+#       la cardinalidad no crece con los parámetros).
+#     - Llamadas a XM, fan-out de tarifa_total, cachés y
+#       retraso del event loop.
+#     Cada observación es un incremento bajo un lock en memoria
+#     (~1 µs); el coste real solo se paga al hacer el scrape.
+#     METRICAS=0 desactiva middleware y endpoint.
+# ==========================================================
+ACTIVAS = os.environ.get("METRICAS", "1").strip().lower() not in ("0", "false", "no", "off")
+RUTA_METRICAS = "/metrics"
+INTERVALO_LAZO_S = float(os.environ.get("METRICAS_INTERVALO_LAZO_S", 0.5))
+
+_BUCKETS_HTTP = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_BUCKETS_LAZO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+SERVICIO = Info("tarifa_servicio", "Microservicio que expone estas métricas")
+
+PETICIONES_SEGUNDOS = Histogram(
+    "http_peticion_segundos",
+    "Latencia de las peticiones HTTP por plantilla de ruta",
+    ["metodo", "ruta"],
+    buckets=_BUCKETS_HTTP,
+)
+PETICIONES = Counter(
+    "http_peticiones",
+    "Peticiones HTTP atendidas por ruta y código de estado",
+    ["metodo", "ruta", "codigo"],
+)
+PETICIONES_EN_CURSO = Gauge("http_peticiones_en_curso", "Peticiones HTTP en curso")
+
+XM_SEGUNDOS = Histogram(
+    "xm_peticion_segundos",
+    "Latencia de las llamadas POST a la API de XM",
+    ["ruta"],
+    buckets=_BUCKETS_HTTP,
+)
+XM_ERRORES = Counter(
+    "xm_errores",
+    "Llamadas a XM fallidas por tipo (http_4xx, http_5xx, timeout, red, otro)",
+    ["ruta", "tipo"],
+)
+
+COMPONENTE_SEGUNDOS = Histogram(
+    "tarifa_componente_segundos",
+    "Latencia de la consulta de cada componente en el fan-out de tarifa_total",
+    ["componente", "resultado"],
+    buckets=_BUCKETS_HTTP,
+)
+
+LAZO_RETRASO = Histogram(
+    "event_loop_retraso_segundos",
+    "Retraso del event loop: cuánto tarda en despertar un sleep respecto a lo pedido",
+    buckets=_BUCKETS_LAZO,
+)
+LAZO_RETRASO_ULTIMO = Gauge("event_loop_retraso_ultimo_segundos", "Último retraso medido del event loop")
+
+
+# ==========================================================
+# 🔹 Cachés: se leen sus contadores en el scrape (coste 0 por acceso)
+# ==========================================================
+class _ColectorCaches(Collector):
+    def collect(self):
+        familias = {
+            "aciertos": CounterMetricFamily("cache_aciertos", "Lecturas servidas desde la caché", labels=["cache"]),
+            "fallos": CounterMetricFamily("cache_fallos", "Lecturas que ejecutaron el cargador", labels=["cache"]),
+            "coalescidas": CounterMetricFamily("cache_coalescidas", "Lecturas que esperaron una carga en curso", labels=["cache"]),
+            "obsoletas_servidas": CounterMetricFamily("cache_obsoletas_servidas", "Valores expirados servidos por error de recarga", labels=["cache"]),
+            "expulsiones": CounterMetricFamily("cache_expulsiones", "Entradas expulsadas por tamaño (LRU)", labels=["cache"]),
+            "aciertos_compartida": CounterMetricFamily("cache_aciertos_compartida", "Fallos locales servidos por la caché compartida entre workers", labels=["cache"]),
+            "esperas_compartida": CounterMetricFamily("cache_esperas_compartida", "Cargas que esperaron a otro worker", labels=["cache"]),
+        }
+        entradas = GaugeMetricFamily("cache_entradas", "Entradas guardadas", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_ratio_aciertos", "Aciertos / consultas desde el arranque", labels=["cache"])
+
+        # Se agrupa por nombre: dos cachés con el mismo nombre suman sus contadores
+        por_nombre: Dict[str, Dict[str, float]] = {}
+        for cache in cache_mod.instancias():
+            stats = cache.estadisticas()
+            acumulado = por_nombre.setdefault(stats["nombre"], dict.fromkeys([*familias, "entradas"], 0))
+            for campo in acumulado:
+                acumulado[campo] += stats[campo]
+
+        for nombre, stats in sorted(por_nombre.items()):
+            for campo, familia in familias.items():
+                familia.add_metric([nombre], stats[campo])
+            entradas.add_metric([nombre], stats["entradas"])
+            consultas = stats["aciertos"] + stats["fallos"] + stats["coalescidas"]
+            ratio.add_metric([nombre], stats["aciertos"] / consultas if consultas else 0.0)
+
+        yield from familias.values()
+        yield entradas
+        yield ratio
+
+
+REGISTRY.register(_ColectorCaches())
+
+
+# ==========================================================
+# 🔹 Instrumentación de llamadas salientes
+# ==========================================================
+@contextmanager
+def cronometro_xm(ruta: str) -> Iterator[None]:
+    """Mide una llamada a XM y clasifica la excepción, si la hay."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        XM_ERRORES.labels(ruta, _tipo_error(e)).inc()
+        raise
+    finally:
+        XM_SEGUNDOS.labels(ruta).observe(time.perf_counter() - inicio)
+
+
+def registrar_error_xm(ruta: str, codigo: int) -> None:
+    XM_ERRORES.labels(ruta, f"http_{codigo // 100}xx").inc()
+
+
+def _tipo_error(error: BaseException) -> str:
+    # Sin importar httpx aquí: basta con el nombre de la jerarquía
+    nombres = {c.__name__ for c in type(error).__mro__}
+    if "TimeoutException" in nombres or isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if "TransportError" in nombres:
+        return "red"
+    return "otro"
+
+
+def observar_componente(componente: str, resultado: str, segundos: float) -> None:
+    COMPONENTE_SEGUNDOS.labels(componente, resultado).observe(segundos)
+
+
+# ==========================================================
+# 🔹 Retraso del event loop
+# ==========================================================
+async def _vigilar_lazo(intervalo: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(intervalo)
+        retraso = max(0.0, loop.time() - inicio - intervalo)
+        LAZO_RETRASO.observe(retraso)
+        LAZO_RETRASO_ULTIMO.set(retraso)
+
+
+# ==========================================================
+# 🔹 Middleware ASGI (sin BaseHTTPMiddleware: no copia el cuerpo)
+# ==========================================================
+class MiddlewareMetricas:
+    def __init__(self, app: Any):
+        self.app = app
+        self._vigia: Optional[asyncio.Task] = None
+
+    def _asegurar_vigia(self) -> None:
+        # Se arranca con la primera petición: no todos los servicios tienen lifespan
+        if self._vigia is None or self._vigia.done() or self._vigia.get_loop() is not asyncio.get_running_loop():
+            self._vigia = asyncio.ensure_future(_vigilar_lazo(INTERVALO_LAZO_S))
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"] == RUTA_METRICAS:
+            await self.app(scope, receive, send)
+            return
+        self._asegurar_vigia()
+
+        codigo = 500
+
+        async def enviar(mensaje: Dict[str, Any]) -> None:
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        PETICIONES_EN_CURSO.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            PETICIONES_EN_CURSO.dec()
+            # El router deja la ruta resuelta en el scope; sin ruta (404) no se usa la URL
+            ruta = getattr(scope.get("route"), "path", None) or "sin_ruta"
+            metodo = scope["method"]
+            PETICIONES_SEGUNDOS.labels(metodo, ruta).observe(time.perf_counter() - inicio)
+            PETICIONES.labels(metodo, ruta, str(codigo)).inc()
+
+
+def instrumentar(app: Any, servicio: str) -> None:
+    """Añade el middleware de métricas y GET /metrics a una app FastAPI."""
+    if not ACTIVAS:
+        return
+    SERVICIO.info({"servicio": servicio})
+    app.add_middleware(MiddlewareMetricas)
+
+    from fastapi import Response
+
+    def metricas() -> Response:
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+    app.add_api_route(RUTA_METRICAS, metricas, methods=["GET"], include_in_schema=False)
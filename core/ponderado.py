@@ -0,0 +1,193 @@
+import logging
+from dataclasses import dataclass
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 PROMEDIO PONDERADO Σ(E×P)/Σ(E) COMPARTIDO POR G, T, D y R
+#     Trabaja sobre columnas contiguas float64 (NumPy o array('d')):
+#     un producto punto y una suma, sin recorrer filas en Python.
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class ResultadoPonderado:
+    energia_total: float
+    costo_total: float
+    promedio: Optional[float]  # None si la energía válida suma 0
+    filas: int
+    filas_descartadas: int  # energía o precio NaN
+
+
+def _columna(filas: Sequence[Any], obtener: Callable[[Any], Any]) -> np.ndarray:
+    try:
+        return np.fromiter(map(obtener, filas), dtype=np.float64, count=len(filas))
+    except TypeError:
+        # Algún valor es None (p. ej. compra sin precio): se marca como NaN
+        nan = float("nan")
+        return np.fromiter((nan if v is None else v for v in map(obtener, filas)), dtype=np.float64, count=len(filas))
+
+
+def es_columnar(datos: Any) -> bool:
+    """True si los datos vienen por columnas: {"energia_kWh": [...], "costo_unitario_kWh": [...]}."""
+    return isinstance(datos, Mapping)
+
+
+def numero_filas(datos: Any) -> int:
+    """Filas de una entrada por filas (lista) o por columnas (dict de listas)."""
+    if es_columnar(datos):
+        return max((len(v) for v in datos.values() if v is not None), default=0)
+    return len(datos)
+
+
+def _columnas_desde_dict(
+    datos: Mapping[str, Any], campo_energia: str, campo_precio: str, precio_defecto: Optional[float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Una conversión por columna (None → NaN); sin objetos por fila
+    energia = np.asarray(datos.get(campo_energia, ()), dtype=np.float64)
+    precios = datos.get(campo_precio)
+    if precios is None:
+        precio = np.full(energia.shape, np.nan)
+    else:
+        precio = np.array(precios, dtype=np.float64)
+    if energia.ndim != 1 or energia.shape != precio.shape:
+        raise ValueError(
+            f"'{campo_energia}' y '{campo_precio}' deben ser listas de igual longitud "
+            f"({energia.size} y {precio.size})"
+        )
+    if precio_defecto is not None:
+        precio[np.isnan(precio)] = precio_defecto
+    return energia, precio
+
+
+def columnas(
+    filas: Union[Sequence[Any], Mapping[str, Any]],
+    campo_energia: str,
+    campo_precio: str,
+    precio_defecto: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extrae las columnas (energía, precio) de una lista de dicts u objetos
+    (modelos Pydantic) sin comprobar el tipo fila por fila: la extracción corre
+    en C (map + itemgetter/attrgetter). Los valores None quedan como NaN; los
+    precios ausentes toman `precio_defecto` si se indica.
+
+    También acepta el formato columnar (dict campo → lista/arreglo), que se
+    convierte directamente sin pasar por filas.
+    """
+    if es_columnar(filas):
+        return _columnas_desde_dict(filas, campo_energia, campo_precio, precio_defecto)
+    if len(filas) == 0:
+        return np.empty(0), np.empty(0)
+    # Todas las filas de una petición son del mismo tipo: se decide una vez
+    if isinstance(filas[0], dict):
+        energia = _columna(filas, itemgetter(campo_energia))
+        precio = _columna(filas, (lambda f: f.get(campo_precio)) if precio_defecto is not None else itemgetter(campo_precio))
+    else:
+        energia = _columna(filas, attrgetter(campo_energia))
+        precio = _columna(filas, (lambda f: getattr(f, campo_precio, None)) if precio_defecto is not None else attrgetter(campo_precio))
+    if precio_defecto is not None:
+        precio[np.isnan(precio)] = precio_defecto
+    return energia, precio
+
+
+def promedio_ponderado(energia: Any, precio: Any) -> ResultadoPonderado:
+    """
+    Σ(E×P)/Σ(E) sobre dos columnas de igual longitud. Las filas con energía o
+    precio NaN se descartan y se informan; si la energía válida suma 0 el
+    promedio es None (el llamador decide qué responder).
+    """
+    e = np.asarray(energia, dtype=np.float64)
+    p = np.asarray(precio, dtype=np.float64)
+    if e.shape != p.shape:
+        raise ValueError(f"Columnas de distinta longitud: energía {e.size}, precio {p.size}")
+
+    costo_total = float(np.dot(e, p))
+    energia_total = float(e.sum())
+    descartadas = 0
+    # NaN se propaga a las sumas: solo entonces se paga el filtrado
+    if np.isnan(costo_total) or np.isnan(energia_total):
+        validas = ~(np.isnan(e) | np.isnan(p))
+        descartadas = int(e.size - np.count_nonzero(validas))
+        e, p = e[validas], p[validas]
+        costo_total = float(np.dot(e, p))
+        energia_total = float(e.sum())
+        logger.warning("Promedio ponderado: %d filas con energía o precio NaN descartadas", descartadas)
+
+    promedio = costo_total / energia_total if energia_total != 0 else None
+    return ResultadoPonderado(
+        energia_total=energia_total,
+        costo_total=costo_total,
+        promedio=promedio,
+        filas=int(e.size) + descartadas,
+        filas_descartadas=descartadas,
+    )
+
+
+def promedio_ponderado_filas(
+    filas: Union[Sequence[Any], Mapping[str, Any]],
+    campo_energia: str,
+    campo_precio: str,
+    precio_defecto: Optional[float] = None,
+) -> ResultadoPonderado:
+    """Atajo: columnas() + promedio_ponderado()."""
+    return promedio_ponderado(*columnas(filas, campo_energia, campo_precio, precio_defecto))
+
+
+class AcumuladorPonderado:
+    """
+    Sumas corrientes de Σ(E), Σ(E×P) por bloques, para entradas que no caben
+    en memoria (archivos de liquidación horaria). Cada bloque se suma con
+    NumPy y se descarta: la memoria no depende del número de filas.
+
+    Las filas sin precio (NaN) se acumulan aparte para valorarlas al final
+    con `precio_defecto` (p. ej. el PBND) sin tener que releerlas.
+    """
+
+    def __init__(self) -> None:
+        self.filas = 0
+        self.filas_descartadas = 0
+        self.filas_sin_precio = 0
+        self.energia_con_precio = 0.0
+        self.energia_sin_precio = 0.0
+        self.costo_con_precio = 0.0
+
+    def agregar(self, energia: Any, precio: Any) -> None:
+        e = np.asarray(energia, dtype=np.float64)
+        p = np.asarray(precio, dtype=np.float64)
+        if e.shape != p.shape:
+            raise ValueError(f"Columnas de distinta longitud: energía {e.size}, precio {p.size}")
+        self.filas += int(e.size)
+
+        energia_nan = np.isnan(e)
+        if energia_nan.any():
+            self.filas_descartadas += int(np.count_nonzero(energia_nan))
+            e, p = e[~energia_nan], p[~energia_nan]
+        sin_precio = np.isnan(p)
+        if sin_precio.any():
+            self.filas_sin_precio += int(np.count_nonzero(sin_precio))
+            self.energia_sin_precio += float(e[sin_precio].sum())
+            e, p = e[~sin_precio], p[~sin_precio]
+        self.energia_con_precio += float(e.sum())
+        self.costo_con_precio += float(np.dot(e, p))
+
+    def resultado(self, precio_defecto: Optional[float] = None) -> ResultadoPonderado:
+        """Promedio de lo acumulado; sin `precio_defecto`, las filas sin precio se descartan."""
+        energia_total, costo_total = self.energia_con_precio, self.costo_con_precio
+        descartadas = self.filas_descartadas
+        if precio_defecto is None:
+            descartadas += self.filas_sin_precio
+        else:
+            energia_total += self.energia_sin_precio
+            costo_total += self.energia_sin_precio * precio_defecto
+        return ResultadoPonderado(
+            energia_total=energia_total,
+            costo_total=costo_total,
+            promedio=costo_total / energia_total if energia_total != 0 else None,
+            filas=self.filas,
+            filas_descartadas=descartadas,
+        )
@@ -0,0 +1,230 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+# ==========================================================
+# 📝 Registro estructurado común a los servicios
+#     - Los handlers de la app solo encolan el LogRecord
+#       (QueueHandler); el formateo JSON y la escritura a
+#       stdout ocurren en el hilo del QueueListener, fuera
+#       del event loop.
+#     - Formateo perezoso: los mensajes con argumentos %s se
+#       interpolan en el hilo de escritura, no al registrar.
+#     - Muestreo de DEBUG: de cada mensaje (misma plantilla)
+#       se deja pasar 1 de cada N (LOG_MUESTREO_DEBUG).
+#     - request_id por petición (cabecera X-Request-ID).
+#
+#     LOG_LEVEL (INFO), LOG_FORMATO (json | texto),
+#     LOG_MUESTREO_DEBUG (0.1), LOG_COLA_MAX (10000).
+# ==========================================================
+NIVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+FORMATO = os.environ.get("LOG_FORMATO", "json").strip().lower()
+MUESTREO_DEBUG = float(os.environ.get("LOG_MUESTREO_DEBUG", 0.1))
+COLA_MAX = int(os.environ.get("LOG_COLA_MAX", 10000))
+
+id_peticion: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("id_peticion", default=None)
+
+# Atributos propios de LogRecord: el resto son campos `extra=` y van al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "servicio"}
+# Argumentos que se pueden interpolar más tarde sin riesgo (no cambian después de registrar)
+_INMUTABLES = (str, int, float, bool, type(None), bytes, uuid.UUID, datetime)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_servicio = "tarifa"
+
+
+class FiltroContexto(logging.Filter):
+    """Añade `servicio` y el `request_id` de la petición en curso."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.servicio = _servicio
+        record.request_id = id_peticion.get()
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar 1 de cada `cada` registros DEBUG por (logger, plantilla); el
+    primero siempre pasa. INFO y superiores no se muestrean.
+    """
+
+    def __init__(self, tasa: float):
+        super().__init__()
+        self.cada = max(1, round(1 / tasa)) if tasa > 0 else 0
+        self._vistos: Dict[Tuple[str, Any], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.cada == 1:
+            return True
+        if self.cada == 0:
+            return False
+        clave = (record.name, record.msg)
+        with self._lock:
+            n = self._vistos.get(clave, 0)
+            self._vistos[clave] = n + 1
+            if len(self._vistos) > 4096:
+                self._vistos.clear()
+        if n % self.cada:
+            return False
+        record.muestreo = self.cada
+        return True
+
+
+class ManejadorCola(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que registra: los argumentos
+    inmutables se interpolan en el listener. Si la cola está llena el
+    registro se descarta (y se cuenta) en lugar de bloquear el event loop.
+    """
+
+    def __init__(self, cola: "queue.Queue[Any]"):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, _INMUTABLES) for a in args)):
+            # Un dict o lista podría cambiar antes de escribirse: se fija ya
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro: ts, nivel, servicio, logger, mensaje, request_id y extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "servicio": getattr(record, "servicio", _servicio),
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            datos["request_id"] = request_id
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD and not clave.startswith("_"):
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FormateadorTexto(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def configurar_registro(servicio: str, nivel: Optional[str] = None, formato: Optional[str] = None) -> None:
+    """
+    Sustituye los handlers del logger raíz por un ManejadorCola y arranca el
+    QueueListener que escribe en stdout. Idempotente: una segunda llamada
+    solo cambia nivel y servicio. Los loggers de uvicorn pasan a propagarse
+    al raíz para salir por la misma cola y con el mismo formato.
+    """
+    global _listener, _servicio
+    _servicio = servicio
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel or NIVEL)
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormateadorTexto() if (formato or FORMATO) == "texto" else FormateadorJSON())
+    cola: "queue.Queue[Any]" = queue.Queue(maxsize=COLA_MAX)
+    manejador = ManejadorCola(cola)
+    manejador.addFilter(FiltroMuestreo(MUESTREO_DEBUG))
+    manejador.addFilter(FiltroContexto())
+
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(manejador)
+    for nombre in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        registro_uvicorn = logging.getLogger(nombre)
+        registro_uvicorn.handlers.clear()
+        registro_uvicorn.propagate = True
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_registro)
+
+
+def detener_registro() -> None:
+    """Vacía la cola y detiene el hilo de escritura."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def registros_descartados() -> int:
+    for manejador in logging.getLogger().handlers:
+        if isinstance(manejador, ManejadorCola):
+            return manejador.descartados
+    return 0
+
+
+# ==========================================================
+# 🔹 Middleware ASGI: request_id de la petición
+# ==========================================================
+class MiddlewareIdPeticion:
+    """
+    Toma X-Request-ID de la petición (o genera uno), lo deja en el contexto
+    para los logs y las llamadas salientes, y lo devuelve en la respuesta.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        valor = None
+        for nombre, contenido in scope["headers"]:
+            if nombre == b"x-request-id":
+                valor = contenido.decode("latin-1")[:128]
+                break
+        valor = valor or uuid.uuid4().hex
+        token = id_peticion.set(valor)
+
+        async def enviar(mensaje: Dict[str, Any]) -> None:
+            if mensaje["type"] == "http.response.start":
+                mensaje["headers"] = [*mensaje.get("headers", ()), (b"x-request-id", valor.encode("latin-1"))]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            id_peticion.reset(token)
+
+
+def cabeceras_contexto() -> Dict[str, str]:
+    """Cabeceras a propagar en llamadas entre servicios (X-Request-ID)."""
+    valor = id_peticion.get()
+    return {"X-Request-ID": valor} if valor else {}
@@ -9,13 +9,13 @@ async def calcular_comercializacion(consumo_kWh: float) -> Dict:
     En un sistema real, incluiría costos de facturación, atención al cliente,
     recaudo, pérdidas no técnicas y margen del comercializador.
     """
-    logger.info(f"Calculando componente de comercialización para {consumo_kWh} kWh...")
+    logger.debug("Calculando componente de comercialización para %s kWh...", consumo_kWh)
 
     # 💰 Valor promedio de comercialización ($/kWh)
     # Este valor puede parametrizarse luego desde normativa_config.json
     C_promedio = 7.53
 
-    logger.info(f"Resultado comercialización -> C_promedio = {C_promedio}")
+    logger.debug("Resultado comercialización -> C_promedio = %s", C_promedio)
 
     # Estructura estandarizada (idéntica a los demás microservicios)
     return {
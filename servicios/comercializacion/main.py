@@ -1,7 +1,8 @@
-from fastapi import FastAPI
 from logica import calcular_comercializacion
+from core.aplicacion import crear_app
 
-app = FastAPI(title="Microservicio Comercialización")
+
+app = crear_app("comercializacion", title="Microservicio Comercialización")
 
 @app.get("/")
 async def root():
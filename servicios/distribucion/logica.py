@@ -1,20 +1,23 @@
 import logging
 from typing import Dict, List, Union
 from core.calculadora import cargar_configuracion
+from core.ponderado import numero_filas, promedio_ponderado_filas
 from core.utils import redondear, respuesta_estandar
 
 logger = logging.getLogger(__name__)
 
-def calcular_componente_D(redes: List[Union[Dict, object]]) -> Dict:
+def calcular_componente_D(redes: Union[List[Union[Dict, object]], Dict[str, List[float]]]) -> Dict:
     """
     Calcula el componente D (Distribución) con base en los tramos de red o centros de transformación.
 
     Parámetros:
     -----------
-    redes : List[Dict|object]
+    redes : List[Dict|object] | Dict[str, List[float]]
         Lista de redes con los campos:
         - energia_kWh
         - costo_unitario_kWh
+        o, en formato columnar, un dict con una lista por campo
+        ({"energia_kWh": [...], "costo_unitario_kWh": [...]}).
 
     Retorna:
     --------
@@ -25,36 +28,29 @@ def calcular_componente_D(redes: List[Union[Dict, object]]) -> Dict:
         componente_cfg = config.get("componente_D", {})
         metodo = componente_cfg.get("metodo", "promedio_simple")
 
-        if not redes:
+        if numero_filas(redes) == 0:
             logger.warning("Lista de redes vacía, retornando 0.0")
             return respuesta_estandar(True, "Sin datos de distribución", {"D_promedio": 0.0})
 
-        energia_total = sum(
-            r["energia_kWh"] if isinstance(r, dict) else r.energia_kWh
-            for r in redes
-        )
+        resultado = promedio_ponderado_filas(redes, "energia_kWh", "costo_unitario_kWh")
+        energia_total, costo_total = resultado.energia_total, resultado.costo_total
 
-        costo_total = sum(
-            (r["energia_kWh"] * r["costo_unitario_kWh"]) if isinstance(r, dict)
-            else (r.energia_kWh * r.costo_unitario_kWh)
-            for r in redes
-        )
-
-        if energia_total == 0:
+        if resultado.promedio is None:
             return respuesta_estandar(True, "Energía total nula", {"D_promedio": 0.0})
 
-        promedio = redondear(costo_total / energia_total, 2)
-        logger.info(f"Componente D calculado: {promedio} $/kWh")
+        promedio = redondear(resultado.promedio, 2)
+        logger.debug("Componente D calculado: %s $/kWh", promedio)
 
         return respuesta_estandar(True, "Cálculo exitoso", {
             "metodo": metodo,
             "energia_total_kWh": energia_total,
             "costo_total": costo_total,
-            "D_promedio": promedio
+            "D_promedio": promedio,
+            "filas_descartadas": resultado.filas_descartadas
         })
 
     except Exception as e:
-        logger.error(f"Error al calcular componente D: {e}")
+        logger.error("Error al calcular componente D: %s", e)
         return respuesta_estandar(False, f"Error: {str(e)}", {"D_promedio": 0.0})
 
 
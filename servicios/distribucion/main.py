@@ -1,15 +1,16 @@
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import HTTPException
+from pydantic import BaseModel, model_validator
+from typing import List, Union
 from logica import calcular_componente_D
+from core.aplicacion import crear_app
 
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Inicializar aplicación FastAPI
-app = FastAPI(
+app = crear_app(
+    "distribucion",
     title="Microservicio Distribución",
     description="Calcula el componente D (Distribución) de la tarifa eléctrica",
     version="1.0.0"
@@ -20,6 +21,20 @@ class TramoDistribucion(BaseModel):
     energia_kWh: float
     costo_unitario_kWh: float
 
+# Formato columnar: una lista por campo (validada una sola vez)
+class ColumnasDistribucion(BaseModel):
+    energia_kWh: List[float]
+    costo_unitario_kWh: List[float]
+
+    @model_validator(mode="after")
+    def _misma_longitud(self):
+        if len(self.energia_kWh) != len(self.costo_unitario_kWh):
+            raise ValueError(
+                f"'energia_kWh' ({len(self.energia_kWh)}) y 'costo_unitario_kWh' "
+                f"({len(self.costo_unitario_kWh)}) deben tener la misma longitud"
+            )
+        return self
+
 
 @app.get("/")
 def root():
@@ -27,14 +42,16 @@ def root():
 
 
 @app.post("/distribucion/calcular")
-def calcular_distribucion(redes: List[TramoDistribucion]):
+def calcular_distribucion(redes: Union[List[TramoDistribucion], ColumnasDistribucion]):
     """
     Calcula el componente D con base en los tramos de red.
+    Acepta una lista de objetos o el formato columnar (una lista por campo).
     """
     try:
-        data = [r.dict() for r in redes]
+        # Por filas, el motor lee los modelos; por columnas, las listas directamente
+        data = dict(redes) if isinstance(redes, ColumnasDistribucion) else redes
         resultado = calcular_componente_D(data)
         return resultado
     except Exception as e:
-        logger.error(f"Error en cálculo de distribución: {e}")
+        logger.error("Error en cálculo de distribución: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
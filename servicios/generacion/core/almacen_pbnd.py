@@ -0,0 +1,203 @@
+import logging
+import os
+import sqlite3
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenPBND:
+    """
+    Serie local del Precio Bolsa Nacional Diario (PBND) en SQLite.
+
+    Los valores se persisten en disco y se mantienen además en dos arreglos
+    ordenados (ordinal de fecha, valor) para que la consulta por fecha sea
+    una búsqueda binaria en memoria, sin I/O.
+
+    Guarda también el precio de bolsa horario (24 valores por día) en una
+    matriz densa días × 24 indexada por ordinal: el precio de cualquier
+    tramo de horas consecutivas es un corte, sin búsquedas.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pbnd_diario (
+                fecha TEXT PRIMARY KEY,
+                valor REAL NOT NULL,
+                metrica TEXT,
+                actualizado TEXT
+            ) WITHOUT ROWID
+            """
+        )
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bolsa_horaria (
+                fecha TEXT PRIMARY KEY,
+                valores BLOB NOT NULL,
+                metrica TEXT,
+                actualizado TEXT
+            ) WITHOUT ROWID
+            """
+        )
+        self._con.commit()
+        self._ordinales = array("l")
+        self._valores = array("d")
+        # Horario: fila i = día (base + i); NaN = hora sin dato; cargado[i] = día presente
+        self._base_horaria = 0
+        self._horario = np.empty((0, 24))
+        self._cargado = np.zeros(0, dtype=bool)
+        self._version_datos = self._con.execute("PRAGMA data_version").fetchone()[0]
+        self._recargar_indice()
+
+    def refrescar_si_cambio(self) -> bool:
+        """
+        Recarga el índice si otra conexión (otro worker) escribió en la serie
+        desde la última lectura. Devuelve True si recargó.
+        """
+        version = self._con.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version_datos:
+            return False
+        self._version_datos = version
+        self._recargar_indice()
+        return True
+
+    def _recargar_indice(self) -> None:
+        self._ordinales = array("l")
+        self._valores = array("d")
+        for fecha, valor in self._con.execute("SELECT fecha, valor FROM pbnd_diario ORDER BY fecha"):
+            self._ordinales.append(date.fromisoformat(fecha).toordinal())
+            self._valores.append(valor)
+        filas = self._con.execute("SELECT fecha, valores FROM bolsa_horaria ORDER BY fecha").fetchall()
+        self._horario = np.empty((0, 24))
+        self._cargado = np.zeros(0, dtype=bool)
+        self._colocar_horarios([(date.fromisoformat(f), np.frombuffer(v, dtype="<f8")) for f, v in filas])
+
+    def __len__(self) -> int:
+        return len(self._ordinales)
+
+    def primera_fecha(self) -> Optional[date]:
+        return date.fromordinal(self._ordinales[0]) if self._ordinales else None
+
+    def ultima_fecha(self) -> Optional[date]:
+        return date.fromordinal(self._ordinales[-1]) if self._ordinales else None
+
+    def guardar_diarios(self, filas: Iterable[Tuple[date, float]], metrica: Optional[str] = None) -> int:
+        """Inserta o actualiza valores diarios. Devuelve cuántas filas se escribieron."""
+        filas = sorted((f, float(v)) for f, v in filas)
+        if not filas:
+            return 0
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO pbnd_diario (fecha, valor, metrica, actualizado) VALUES (?, ?, ?, ?)",
+                [(f.isoformat(), v, metrica, ahora) for f, v in filas],
+            )
+
+        # Caso habitual (sincronización incremental): solo fechas posteriores → append
+        if not self._ordinales or filas[0][0].toordinal() > self._ordinales[-1]:
+            for f, v in filas:
+                self._ordinales.append(f.toordinal())
+                self._valores.append(v)
+        else:
+            self._recargar_indice()
+        return len(filas)
+
+    # ------------------------------------------------------
+    # Precio de bolsa horario
+    # ------------------------------------------------------
+    def _colocar_horarios(self, filas: Sequence[Tuple[date, np.ndarray]]) -> None:
+        """Copia filas (fecha, 24 valores) en la matriz, ampliándola si hace falta."""
+        if not filas:
+            return
+        ordinales = [f.toordinal() for f, _ in filas]
+        inicio, fin = min(ordinales), max(ordinales)
+        if len(self._cargado):
+            inicio = min(inicio, self._base_horaria)
+            fin = max(fin, self._base_horaria + len(self._cargado) - 1)
+        if len(self._cargado) == 0 or inicio != self._base_horaria or fin - inicio + 1 != len(self._cargado):
+            horario = np.full((fin - inicio + 1, 24), np.nan)
+            cargado = np.zeros(fin - inicio + 1, dtype=bool)
+            if len(self._cargado):
+                desplazamiento = self._base_horaria - inicio
+                horario[desplazamiento:desplazamiento + len(self._cargado)] = self._horario
+                cargado[desplazamiento:desplazamiento + len(self._cargado)] = self._cargado
+            self._base_horaria, self._horario, self._cargado = inicio, horario, cargado
+        for o, (_, valores) in zip(ordinales, filas):
+            self._horario[o - self._base_horaria] = valores
+            self._cargado[o - self._base_horaria] = True
+
+    def guardar_horarios(self, filas: Iterable[Tuple[date, Sequence[float]]], metrica: Optional[str] = None) -> int:
+        """Inserta o actualiza días de 24 precios horarios (NaN = hora sin dato)."""
+        filas = [(f, np.asarray(v, dtype="<f8").reshape(24)) for f, v in filas]
+        if not filas:
+            return 0
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO bolsa_horaria (fecha, valores, metrica, actualizado) VALUES (?, ?, ?, ?)",
+                [(f.isoformat(), v.tobytes(), metrica, ahora) for f, v in filas],
+            )
+        self._colocar_horarios(filas)
+        return len(filas)
+
+    def dias_horarios_faltantes(self, desde: date, hasta: date) -> List[date]:
+        """Días entre `desde` y `hasta` (inclusive) sin precios horarios guardados."""
+        faltan = []
+        for o in range(desde.toordinal(), hasta.toordinal() + 1):
+            i = o - self._base_horaria
+            if not (0 <= i < len(self._cargado)) or not self._cargado[i]:
+                faltan.append(date.fromordinal(o))
+        return faltan
+
+    def precios_horarios(self, desde: date, dias: int) -> np.ndarray:
+        """
+        Precios de `dias` días completos desde `desde`, hora a hora (dias × 24
+        valores, hora 0 = 00:00–01:00). NaN donde no hay dato.
+        """
+        precios = np.full((dias, 24), np.nan)
+        i = desde.toordinal() - self._base_horaria
+        a, b = max(i, 0), min(i + dias, len(self._cargado))
+        if a < b:
+            precios[a - i:b - i] = self._horario[a:b]
+        return precios.reshape(-1)
+
+    def cobertura_horaria(self) -> Tuple[int, Optional[date], Optional[date]]:
+        """(días con precios horarios, primero, último)."""
+        dias = int(np.count_nonzero(self._cargado))
+        if not dias:
+            return 0, None, None
+        presentes = np.flatnonzero(self._cargado)
+        base = self._base_horaria
+        return dias, date.fromordinal(base + int(presentes[0])), date.fromordinal(base + int(presentes[-1]))
+
+    def valor_en(self, fecha: date, max_retroceso_dias: int = 0) -> Optional[Tuple[date, float]]:
+        """
+        Devuelve (fecha_dato, valor) del dato más reciente en o antes de `fecha`,
+        siempre que no esté a más de `max_retroceso_dias` días.
+        """
+        objetivo = fecha.toordinal()
+        i = bisect_right(self._ordinales, objetivo) - 1
+        if i < 0 or objetivo - self._ordinales[i] > max_retroceso_dias:
+            return None
+        return date.fromordinal(self._ordinales[i]), self._valores[i]
+
+    def rango(self, desde: date, hasta: date) -> List[Tuple[date, float]]:
+        """Valores almacenados entre `desde` y `hasta` (inclusive)."""
+        i = bisect_right(self._ordinales, desde.toordinal() - 1)
+        j = bisect_right(self._ordinales, hasta.toordinal())
+        return [(date.fromordinal(o), v) for o, v in zip(self._ordinales[i:j], self._valores[i:j])]
+
+    def cerrar(self) -> None:
+        self._con.close()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODOS = ("off", "grabar", "reproducir", "hibrido")
+
+
+class SinGrabacion(RuntimeError):
+    """Modo reproducir: no hay respuesta grabada para esa petición (y no se sale a la red)."""
+
+
+def clave_canonica(path: str, payload: Dict[str, Any]) -> str:
+    """Ruta + payload con claves ordenadas y sin espacios: el mismo pedido da la misma clave."""
+    return path + "\n" + json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class GrabacionXM:
+    """
+    Respuestas de XM grabadas en SQLite (cuerpo JSON comprimido con zlib),
+    indexadas por el SHA-256 de la clave canónica (ruta + payload).
+
+    - grabar: siempre sale a XM y guarda cada respuesta correcta.
+    - reproducir: solo sirve lo grabado; sin red (SinGrabacion si falta).
+    - hibrido: sirve lo grabado y sale a XM (grabando) solo si falta o si
+      la grabación de un rango reciente superó `ttl_reciente_s`.
+    - off: sin grabación.
+    """
+
+    def __init__(self, ruta: str, modo: str = "off", ttl_reciente_s: float = 900.0):
+        if modo not in MODOS:
+            raise ValueError(f"XM_GRABACION debe ser uno de {MODOS}: {modo!r}")
+        self.ruta = ruta
+        self.modo = modo
+        self.ttl_reciente_s = ttl_reciente_s
+        self.aciertos = 0
+        self.fallos = 0
+        self.grabadas = 0
+        self._con: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def desde_entorno(cls, directorio_datos: str) -> "GrabacionXM":
+        return cls(
+            ruta=os.environ.get("XM_GRABACION_PATH", os.path.join(directorio_datos, "xm_grabaciones.sqlite3")),
+            modo=os.environ.get("XM_GRABACION", "off").strip().lower(),
+            ttl_reciente_s=float(os.environ.get("XM_CACHE_TTL_S", 900)),
+        )
+
+    # ------------------------------------------------------
+    # Modo
+    # ------------------------------------------------------
+    @property
+    def lee(self) -> bool:
+        return self.modo in ("reproducir", "hibrido")
+
+    @property
+    def graba(self) -> bool:
+        return self.modo in ("grabar", "hibrido")
+
+    @property
+    def usa_red(self) -> bool:
+        return self.modo != "reproducir"
+
+    # ------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------
+    def _conexion(self) -> sqlite3.Connection:
+        if self._con is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            self._con = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    clave BLOB PRIMARY KEY,
+                    ruta TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    cuerpo BLOB NOT NULL,
+                    grabada REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._con.commit()
+        return self._con
+
+    def buscar(self, path: str, payload: Dict[str, Any], aceptar_vencida: bool = False) -> Optional[Any]:
+        """
+        Respuesta grabada (ya decodificada) o None si falta o está vencida.
+        `aceptar_vencida` la devuelve igual (XM no responde en modo híbrido).
+        """
+        canonica = clave_canonica(path, payload)
+        fila = self._conexion().execute(
+            "SELECT cuerpo, grabada FROM respuestas WHERE clave = ?", (hashlib.sha256(canonica.encode()).digest(),)
+        ).fetchone()
+        if fila is None or (self.modo == "hibrido" and not aceptar_vencida and self._vencida(payload, fila[1])):
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return json.loads(zlib.decompress(fila[0]))
+
+    def _vencida(self, payload: Dict[str, Any], grabada: float) -> bool:
+        # Un rango cerrado (termina antes de ayer) no cambia; uno reciente sí, y /lists puede crecer
+        fin = payload.get("EndDate")
+        try:
+            if fin and date.fromisoformat(fin) < date.today() - timedelta(days=1):
+                return False
+        except ValueError:
+            pass
+        return time.time() - grabada > self.ttl_reciente_s
+
+    def guardar(self, path: str, payload: Dict[str, Any], cuerpo: bytes) -> None:
+        """Graba el cuerpo crudo de una respuesta correcta (reemplaza la anterior)."""
+        canonica = clave_canonica(path, payload)
+        con = self._conexion()
+        with con:
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, ruta, payload, cuerpo, grabada) VALUES (?, ?, ?, ?, ?)",
+                (
+                    hashlib.sha256(canonica.encode()).digest(),
+                    path,
+                    canonica.split("\n", 1)[1],
+                    zlib.compress(cuerpo, 6),
+                    time.time(),
+                ),
+            )
+        self.grabadas += 1
+
+    def importar(self, ruta_semilla: str) -> int:
+        """
+        Copia en este almacén las respuestas de otro archivo de grabaciones
+        (p. ej. una semilla incluida en la imagen) que aún no estén. Devuelve
+        cuántas se añadieron.
+        """
+        con = self._conexion()
+        antes = con.total_changes
+        con.execute("ATTACH DATABASE ? AS semilla", (ruta_semilla,))
+        try:
+            with con:
+                con.execute("INSERT OR IGNORE INTO respuestas SELECT clave, ruta, payload, cuerpo, grabada FROM semilla.respuestas")
+        finally:
+            con.execute("DETACH DATABASE semilla")
+        return con.total_changes - antes
+
+    def estadisticas(self) -> Dict[str, Any]:
+        datos: Dict[str, Any] = {
+            "modo": self.modo,
+            "ruta": self.ruta,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "grabadas": self.grabadas,
+        }
+        if self.modo != "off":
+            con = self._conexion()
+            datos["entradas"], datos["bytes_comprimidos"] = con.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(cuerpo)), 0) FROM respuestas"
+            ).fetchone()
+        return datos
+
+    def cerrar(self) -> None:
+        if self._con is not None:
+            self._con.close()
+            self._con = None
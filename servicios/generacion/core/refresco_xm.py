@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from datetime import time as hora_del_dia
+from typing import Any, Dict, Optional
+
+from core import xm_api
+from core.cache_compartida import Liderazgo
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Calentamiento y refresco en segundo plano de los datos XM
+#     Al arrancar se cargan el catálogo de métricas y el PBND
+#     más reciente; después una tarea los refresca cada
+#     XM_REFRESCO_S y justo después de la publicación diaria de
+#     XM (XM_HORA_PUBLICACION, hora de Colombia). Las peticiones
+#     solo leen la caché y la serie local.
+# ==========================================================
+REFRESCO_S = float(os.environ.get("XM_REFRESCO_S", 3600))
+HORA_PUBLICACION = os.environ.get("XM_HORA_PUBLICACION", "08:15")
+ESPERA_ARRANQUE_S = float(os.environ.get("XM_CALENTAMIENTO_ESPERA_S", 15))
+LISTO_MAX_S = float(os.environ.get("XM_LISTO_MAX_S", 120))
+REINTENTO_MIN_S = 5.0
+
+# Colombia no tiene horario de verano: UTC-5 fijo (sin depender de tzdata)
+ZONA_XM = timezone(timedelta(hours=-5), "COT")
+
+
+def _hora(texto: str) -> Optional[hora_del_dia]:
+    if not texto:
+        return None
+    try:
+        return hora_del_dia.fromisoformat(texto)
+    except ValueError:
+        logger.warning("XM_HORA_PUBLICACION inválida (%r); solo se refresca cada %ss", texto, REFRESCO_S)
+        return None
+
+
+def proxima_ejecucion(ahora: datetime, intervalo_s: float, publicacion: Optional[hora_del_dia]) -> datetime:
+    """Lo que llegue antes: ahora + intervalo o la próxima hora de publicación de XM."""
+    siguiente = ahora + timedelta(seconds=intervalo_s)
+    if publicacion is None:
+        return siguiente
+    local = ahora.astimezone(ZONA_XM)
+    hoy = datetime.combine(local.date(), publicacion, tzinfo=ZONA_XM)
+    publicada = hoy if hoy > local else hoy + timedelta(days=1)
+    return min(siguiente, publicada)
+
+
+class RefrescoXM:
+    """
+    Mantiene caliente el estado XM de generación: catálogo de métricas (en
+    `cache_xm`) y serie PBND (SQLite + índice en memoria).
+
+    `listo` pasa a True tras el primer calentamiento completo, o pasados
+    LISTO_MAX_S aunque XM no responda (se atiende con la serie local o el
+    respaldo de configuración en vez de quedar fuera de servicio).
+
+    Con varios workers y caché compartida, solo el líder del host fuerza la
+    recarga en XM; los demás releen lo que él publicó.
+    """
+
+    def __init__(
+        self,
+        intervalo_s: float = REFRESCO_S,
+        hora_publicacion: Optional[str] = HORA_PUBLICACION,
+        listo_max_s: float = LISTO_MAX_S,
+    ):
+        self.intervalo_s = intervalo_s
+        self.publicacion = _hora(hora_publicacion or "")
+        self.listo_max_s = listo_max_s
+        self.calentado = False
+        self.refrescos = 0
+        self.fallos_seguidos = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultimo_refresco: Optional[datetime] = None
+        self.proximo_refresco: Optional[datetime] = None
+        self.total_metricas = 0
+        self.pbnd: Optional[Dict[str, Any]] = None
+        self._arranque = time.monotonic()
+        self._calentado = asyncio.Event()
+        self._tarea: Optional[asyncio.Task] = None
+        compartida = xm_api.cache_xm.compartida
+        self._liderazgo = Liderazgo(f"{compartida.espacio}-refresco") if compartida is not None else None
+
+    def es_lider(self) -> bool:
+        return self._liderazgo is None or self._liderazgo.es_lider()
+
+    @property
+    def listo(self) -> bool:
+        return self.calentado or time.monotonic() - self._arranque >= self.listo_max_s
+
+    async def refrescar(self) -> None:
+        """Recarga catálogo y serie PBND. Los valores anteriores se conservan si XM falla."""
+        metricas = await xm_api.listar_metricas_xm(force=self.calentado, en_todos=self.es_lider())
+        await xm_api.sincronizar_pbnd()
+        valor, fuente = await xm_api.obtener_precio_bolsa_xm()
+        if fuente != "XM":
+            raise RuntimeError("PBND no disponible en XM ni en la serie local")
+        ultima = xm_api.obtener_almacen().ultima_fecha()
+        self.total_metricas = len(metricas)
+        self.pbnd = {"valor_kWh": valor, "fuente": fuente, "fecha_dato": ultima.isoformat() if ultima else None}
+        self.ultimo_refresco = datetime.now(timezone.utc)
+        self.refrescos += 1
+
+    async def _bucle(self) -> None:
+        while True:
+            try:
+                await self.refrescar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.fallos_seguidos += 1
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                # Backoff exponencial acotado por el intervalo normal
+                espera = min(self.intervalo_s, REINTENTO_MIN_S * 2 ** (self.fallos_seguidos - 1))
+                logger.warning("⚠️ Refresco XM fallido (%s); reintento en %.0fs", self.ultimo_error, espera)
+                self.proximo_refresco = datetime.now(timezone.utc) + timedelta(seconds=espera)
+                await asyncio.sleep(espera)
+                continue
+
+            self.fallos_seguidos = 0
+            self.ultimo_error = None
+            if not self.calentado:
+                self.calentado = True
+                self._calentado.set()
+                # Desde aquí las peticiones no sincronizan con XM: lo hace esta tarea
+                xm_api.delegar_sincronizacion(True)
+                logger.info("🔥 Datos XM precargados: %d métricas, PBND %s", self.total_metricas, self.pbnd)
+            ahora = datetime.now(timezone.utc)
+            self.proximo_refresco = proxima_ejecucion(ahora, self.intervalo_s, self.publicacion)
+            await asyncio.sleep((self.proximo_refresco - ahora).total_seconds())
+
+    async def iniciar(self, espera_s: float = ESPERA_ARRANQUE_S) -> None:
+        """
+        Lanza la tarea de refresco y espera hasta `espera_s` al primer
+        calentamiento; si XM tarda más, el arranque sigue y /generacion/listo
+        responde 503 mientras tanto.
+        """
+        self._arranque = time.monotonic()
+        self._tarea = asyncio.create_task(self._bucle())
+        try:
+            await asyncio.wait_for(self._calentado.wait(), timeout=espera_s)
+        except asyncio.TimeoutError:
+            logger.warning("⏳ Datos XM aún sin precargar tras %.0fs; el servicio arranca igual", espera_s)
+
+    async def detener(self) -> None:
+        xm_api.delegar_sincronizacion(False)
+        if self._liderazgo is not None:
+            self._liderazgo.soltar()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "listo": self.listo,
+            "calentado": self.calentado,
+            "lider": self._liderazgo is None or self._liderazgo.tomado,
+            "refrescos": self.refrescos,
+            "fallos_seguidos": self.fallos_seguidos,
+            "ultimo_error": self.ultimo_error,
+            "ultimo_refresco": self.ultimo_refresco.isoformat() if self.ultimo_refresco else None,
+            "proximo_refresco": self.proximo_refresco.isoformat() if self.proximo_refresco else None,
+            "intervalo_s": self.intervalo_s,
+            "hora_publicacion": self.publicacion.isoformat(timespec="minutes") if self.publicacion else None,
+            "total_metricas": self.total_metricas,
+            "pbnd": self.pbnd,
+        }
@@ -1,34 +1,200 @@
-import httpx
+import json
+import logging
+import os
+import time
 from datetime import date, timedelta
-from core.calculadora import cargar_configuracion
+from typing import List, Optional, Tuple
 
-BASE_URL = "https://servapibi.xm.com.co"
+import numpy as np
+from core.almacen_pbnd import AlmacenPBND
+from core import cache_compartida
+from core.cache import CacheTTL
+from core.calculadora import obtener_configuracion
+from core.cliente_http import ConfigPoolHTTP, PoolHTTP
+from core.grabacion_xm import GrabacionXM, SinGrabacion
+from core.metricas import cronometro_xm, registrar_error_xm
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.environ.get("XM_BASE_URL", "https://servapibi.xm.com.co")
 TIMEOUT = 30.0
-_metricas_cache = {"items": None}
+
+# ==========================================================
+# 🔹 Cliente persistente y caché de respuestas XM
+# ==========================================================
+# Un único cliente keep-alive para todas las llamadas a XM (XM_HTTP_* lo ajusta)
+pool_xm = PoolHTTP(
+    ConfigPoolHTTP.desde_entorno("XM_HTTP", timeout=TIMEOUT, max_conexiones=20, max_por_host=8),
+    follow_redirects=True,
+)
+
+# TTL para rangos recientes (XM aún puede publicar datos) y para rangos cerrados
+TTL_RECIENTE = float(os.environ.get("XM_CACHE_TTL_S", 900))
+TTL_HISTORICO = float(os.environ.get("XM_CACHE_TTL_HISTORICO_S", 86400))
+TTL_METRICAS = float(os.environ.get("XM_CACHE_TTL_METRICAS_S", 86400))
+
+# Con varios workers, las respuestas se comparten en el host: una consulta a XM por clave
+cache_xm = CacheTTL(
+    ttl=TTL_RECIENTE, max_entradas=512, nombre="xm",
+    compartida=cache_compartida.crear("xm", BASE_URL),
+)
+
+_CLAVE_METRICAS = ("/lists", "ListadoMetricas")
+_CLAVE_PBND = ("PBND", "Sistema")
+
+# ==========================================================
+# 🔹 Serie local del PBND (SQLite)
+# ==========================================================
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PBND_DB_PATH = os.environ.get("PBND_DB_PATH", os.path.join(DIRECTORIO_DATOS, "pbnd.sqlite3"))
+PBND_BACKFILL_DIAS = int(os.environ.get("PBND_BACKFILL_DIAS", 365))
+VENTANA_DAILY_DIAS = 30       # días por consulta /daily al sincronizar
+DIAS_RETROCESO = 5            # antigüedad máxima aceptada para "el PBND de hoy"
+METRICA_PBND_DEFECTO = "PPPrecBolsNaci"
+# Precio de bolsa nacional horario (/hourly, Hour01…Hour24)
+METRICA_BOLSA_HORARIA = os.environ.get("XM_METRICA_BOLSA_HORARIA", "PrecBolsNaci")
+
+REVISION_SERIE_S = 1.0       # cada cuánto se mira si otro worker amplió la serie
+_almacen: Optional[AlmacenPBND] = None
+_proxima_revision_serie = 0.0
+# True mientras una tarea de fondo (refresco_xm) mantiene la serie al día
+_sincronizacion_delegada = False
+
+
+def obtener_almacen() -> AlmacenPBND:
+    """Abre (una sola vez) la serie local del PBND."""
+    global _almacen
+    if _almacen is None:
+        _almacen = AlmacenPBND(PBND_DB_PATH)
+    return _almacen
+
+
+def _serie_al_dia(almacen: AlmacenPBND) -> None:
+    """Relee el índice si otro worker escribió en la serie (como mucho cada REVISION_SERIE_S)."""
+    global _proxima_revision_serie
+    if cache_xm.compartida is None or time.monotonic() < _proxima_revision_serie:
+        return
+    _proxima_revision_serie = time.monotonic() + REVISION_SERIE_S
+    almacen.refrescar_si_cambio()
+
+
+def delegar_sincronizacion(activa: bool) -> None:
+    """Con la sincronización delegada, las peticiones del día no esperan a XM."""
+    global _sincronizacion_delegada
+    _sincronizacion_delegada = activa
+
+
+def cerrar_almacen() -> None:
+    global _almacen
+    if _almacen is not None:
+        _almacen.cerrar()
+        _almacen = None
+
+
+# ==========================================================
+# 🔹 Grabación / reproducción de respuestas XM
+#     XM_GRABACION = off | grabar | reproducir | hibrido
+#     XM_GRABACION_PATH (data/xm_grabaciones.sqlite3)
+#     XM_GRABACION_SEMILLA: archivo de grabaciones que se
+#     importa al arrancar (p. ej. incluido en la imagen).
+# ==========================================================
+grabacion_xm = GrabacionXM.desde_entorno(DIRECTORIO_DATOS)
+
+
+def preparar_grabacion() -> None:
+    """Importa la semilla de grabaciones, si se configuró una."""
+    semilla = os.environ.get("XM_GRABACION_SEMILLA")
+    if not semilla or grabacion_xm.modo == "off":
+        return
+    if not os.path.exists(semilla):
+        logger.warning("⚠️ XM_GRABACION_SEMILLA no existe: %s", semilla)
+        return
+    nuevas = grabacion_xm.importar(semilla)
+    logger.info("📼 Grabaciones XM: %d respuestas importadas de %s", nuevas, semilla)
 
 
 async def _post(path: str, payload: dict):
-    """Envía una solicitud POST al endpoint de XM."""
+    """
+    POST a XM pasando por la grabación: en reproducir/hibrido se sirve la
+    respuesta grabada para (ruta, payload); si falta, reproducir falla sin
+    red e hibrido consulta XM y la graba.
+    """
+    if grabacion_xm.lee:
+        grabada = grabacion_xm.buscar(path, payload)
+        if grabada is not None:
+            return grabada
+        if not grabacion_xm.usa_red:
+            raise SinGrabacion(f"Sin respuesta grabada de XM para {path} {payload}")
+    try:
+        cuerpo = await _post_red(path, payload)
+    except Exception as e:
+        vencida = grabacion_xm.buscar(path, payload, aceptar_vencida=True) if grabacion_xm.lee else None
+        if vencida is None:
+            raise
+        logger.warning("⚠️ XM no respondió (%s); se sirve la respuesta grabada de %s", e, path)
+        return vencida
+    if grabacion_xm.graba:
+        grabacion_xm.guardar(path, payload, cuerpo)
+    return json.loads(cuerpo)
+
+
+async def _post_red(path: str, payload: dict) -> bytes:
+    """Envía una solicitud POST al endpoint de XM y devuelve el cuerpo de la respuesta."""
     url = f"{BASE_URL}{path}"
-    print(f"🌐 Enviando POST a {url} con payload={payload}")
-    async with httpx.AsyncClient(timeout=TIMEOUT, follow_redirects=True) as client:
-        r = await client.post(url, json=payload, headers={"Content-Type": "application/json"})
-        print(f"📩 Respuesta HTTP {r.status_code}: {r.text[:300]}...")
-        if r.status_code >= 400:
-            detalle = r.text.strip() if r.text else ""
-            raise RuntimeError(f"XM API devolvió {r.status_code}: {detalle}")
-        return r.json()
-
-
-async def listar_metricas_xm(force: bool = False):
-    """Consulta el inventario de métricas en XM (/lists)."""
-    global _metricas_cache
-    if not force and _metricas_cache["items"] is not None:
-        return _metricas_cache["items"]
+    # Alto volumen: DEBUG muestreado; el dict se serializa solo si el nivel está activo
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🌐 POST %s payload=%s", url, json.dumps(payload, ensure_ascii=False))
+    with cronometro_xm(path):
+        r = await pool_xm.post(url, json=payload, headers={"Content-Type": "application/json"})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📩 XM %s → HTTP %d: %s", path, r.status_code, r.text[:300])
+    if r.status_code >= 400:
+        registrar_error_xm(path, r.status_code)
+        detalle = r.text.strip() if r.text else ""
+        raise RuntimeError(f"XM API devolvió {r.status_code}: {detalle}")
+    return r.content
+
+
+def _ttl_rango(payload: dict) -> float:
+    """Los rangos que terminan antes de ayer ya no cambian: se cachean más tiempo."""
+    fin = payload.get("EndDate")
+    try:
+        if fin and date.fromisoformat(fin) < date.today() - timedelta(days=1):
+            return TTL_HISTORICO
+    except ValueError:
+        pass
+    return TTL_RECIENTE
+
+
+async def _consultar(path: str, payload: dict):
+    """
+    POST a XM a través de la caché: clave = (métrica, entidad, rango de fechas).
+    Las consultas concurrentes idénticas comparten una sola llamada.
+    """
+    clave = (
+        path,
+        payload.get("MetricId"),
+        payload.get("Entity"),
+        payload.get("StartDate"),
+        payload.get("EndDate"),
+    )
+    return await cache_xm.obtener(clave, lambda: _post(path, payload), ttl=_ttl_rango(payload))
 
+
+async def listar_metricas_xm(force: bool = False, en_todos: bool = True):
+    """
+    Consulta el inventario de métricas en XM (/lists).
+    `force` descarta la copia en caché; con `en_todos=False` solo la de este
+    worker, que relee la compartida (la refrescó otro worker).
+    """
+    if force:
+        cache_xm.invalidar(_CLAVE_METRICAS, compartida=en_todos)
+    return await cache_xm.obtener(_CLAVE_METRICAS, _cargar_metricas_xm, ttl=TTL_METRICAS)
+
+
+async def _cargar_metricas_xm():
     payload = {"MetricId": "ListadoMetricas"}
     resp_json = await _post("/lists", payload)
-    print(f"📘 Respuesta XM /lists recibida (keys={list(resp_json.keys())})")
 
     data = resp_json.get("Data") or resp_json.get("data") or resp_json.get("List") or []
     metricas = []
@@ -44,8 +210,7 @@ async def listar_metricas_xm(force: bool = False):
         }
         metricas.append(m)
 
-    _metricas_cache["items"] = metricas
-    print(f"✅ Total métricas cargadas: {len(metricas)}")
+    logger.info("✅ Inventario de métricas XM cargado: %d métricas", len(metricas))
     return metricas
 
 
@@ -57,72 +222,251 @@ def _pick_metric_precio_bolsa(metricas: list):
     for m in metricas:
         mid = str(m.get("MetricId") or "").lower()
         if mid in ["ppprecbolsnaci", "precbolsnaci"]:
-            print(f"🎯 Métrica detectada por ID: {mid}")
+            logger.debug("🎯 Métrica PBND detectada por ID: %s", mid)
             return m
 
     for m in metricas:
         nombre = str(m.get("MetricName") or "").lower()
         if "precio" in nombre and "bolsa" in nombre and "nacional" in nombre:
-            print(f"🎯 Métrica detectada por nombre: {nombre}")
+            logger.debug("🎯 Métrica PBND detectada por nombre: %s", nombre)
             return m
-    print("⚠️ No se encontró una métrica PBND explícita")
+    logger.warning("⚠️ No se encontró una métrica PBND explícita")
     return None
 
 
-async def obtener_precio_bolsa_xm():
+async def _id_metrica_pbnd() -> str:
+    metricas = await listar_metricas_xm()
+    m = _pick_metric_precio_bolsa(metricas)
+    return m.get("MetricId", METRICA_PBND_DEFECTO) if m else METRICA_PBND_DEFECTO
+
+
+def _extraer_diarios(resp_json: dict) -> List[Tuple[date, float]]:
+    """Convierte la respuesta /daily de XM en pares (fecha, valor)."""
+    filas = []
+    for item in resp_json.get("Items") or []:
+        fecha_txt = str(item.get("Date") or "")[:10]
+        if not fecha_txt:
+            continue
+        for ent in item.get("DailyEntities") or []:
+            v = ent.get("Value")
+            if v is not None:
+                filas.append((date.fromisoformat(fecha_txt), float(v)))
+                break
+    return filas
+
+
+async def sincronizar_pbnd(hasta: Optional[date] = None) -> int:
+    """
+    Trae de XM solo los días que faltan en la serie local:
+    - serie vacía → backfill de PBND_BACKFILL_DIAS días;
+    - serie con datos → desde el día siguiente al último almacenado;
+    - fecha histórica anterior a la serie → la ventana de DIAS_RETROCESO días previa.
+    Devuelve el número de días guardados.
+    """
+    almacen = obtener_almacen()
+    almacen.refrescar_si_cambio()
+    hasta = hasta or date.today()
+    ultima = almacen.ultima_fecha()
+    primera = almacen.primera_fecha()
+
+    if ultima is None:
+        desde = hasta - timedelta(days=PBND_BACKFILL_DIAS)
+    elif hasta > ultima:
+        desde = ultima + timedelta(days=1)
+    elif hasta < primera:
+        desde = hasta - timedelta(days=DIAS_RETROCESO)
+    else:
+        return 0
+
+    metric_id = await _id_metrica_pbnd()
+    guardados = 0
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=VENTANA_DAILY_DIAS - 1), hasta)
+        resp_json = await _consultar("/daily", {
+            "MetricId": metric_id,
+            "StartDate": inicio.strftime("%Y-%m-%d"),
+            "EndDate": fin.strftime("%Y-%m-%d"),
+            "Entity": "Sistema",
+        })
+        guardados += almacen.guardar_diarios(_extraer_diarios(resp_json), metrica=metric_id)
+        inicio = fin + timedelta(days=1)
+
+    logger.info("🗄️ Serie PBND sincronizada: %d días nuevos (%s → %s)", guardados, desde, hasta)
+    return guardados
+
+
+async def _pbnd_local(objetivo: date) -> Optional[Tuple[date, float]]:
+    """
+    Lee el PBND de la serie local. Si falta el dato (o puede haber uno más
+    reciente), sincroniza primero; la sincronización se coalesce y se limita
+    a una por ventana de TTL para cada fecha objetivo.
+    """
+    almacen = obtener_almacen()
+    _serie_al_dia(almacen)
+    encontrado = almacen.valor_en(objetivo, DIAS_RETROCESO)
+    if encontrado is not None and (objetivo - encontrado[0]).days <= 1:
+        return encontrado
+    # El refresco en segundo plano ya trae lo publicado: se sirve el último dato
+    if encontrado is not None and _sincronizacion_delegada and objetivo >= almacen.ultima_fecha():
+        return encontrado
+
+    try:
+        await cache_xm.obtener(("PBND_SYNC", objetivo.isoformat()), lambda: sincronizar_pbnd(objetivo), ttl=TTL_RECIENTE)
+    except Exception as e:
+        logger.warning("⚠️ No se pudo sincronizar la serie PBND: %s", e)
+    # La sincronización pudo hacerla otro worker (resultado compartido)
+    almacen.refrescar_si_cambio()
+    return almacen.valor_en(objetivo, DIAS_RETROCESO)
+
+
+async def obtener_precio_bolsa_xm(fecha: Optional[date] = None):
     """
     Obtiene el Precio Bolsa Nacional Diario desde XM, retrocediendo días si el resultado viene vacío.
     Devuelve una tupla (valor, fuente), donde la fuente puede ser 'XM' o 'Respaldo local (config.json)'.
+
+    La consulta se resuelve primero contra la serie local (SQLite); XM solo se
+    consulta para sincronizar los días faltantes. `fecha` permite recalcular
+    periodos históricos (por defecto, hoy).
     """
     try:
-        print("🚀 Iniciando consulta del Precio Bolsa Nacional a XM...")
-        metricas = await listar_metricas_xm()
-        m = _pick_metric_precio_bolsa(metricas)
-        metric_id = m.get("MetricId", "PPPrecBolsNaci") if m else "PPPrecBolsNaci"
-
-        dias_retroceso = 0
-        valor = None
-
-        while dias_retroceso < 5 and valor is None:  # hasta 5 días atrás
-            end_d = date.today() - timedelta(days=dias_retroceso)
-            start_d = end_d - timedelta(days=3)
-            print(f"📅 Intento {dias_retroceso+1}: rango {start_d} → {end_d}")
-
-            payload = {
-                "MetricId": metric_id,
-                "StartDate": start_d.strftime("%Y-%m-%d"),
-                "EndDate": end_d.strftime("%Y-%m-%d"),
-                "Entity": "Sistema",
-            }
-
-            resp_json = await _post("/daily", payload)
-            items = resp_json.get("Items") or []
-            print(f"🧠 Datos XM recibidos: {len(items)} items")
-
-            for item in reversed(items):
-                if "DailyEntities" in item:
-                    for ent in item["DailyEntities"]:
-                        v = ent.get("Value")
-                        if v is not None:
-                            valor = float(v)
-                            print(f"✅ Valor encontrado ({end_d}): {valor}")
-                            break
-                if valor is not None:
-                    break
-
-            if valor is None:
-                dias_retroceso += 1
-                print(f"⚠️ Sin datos válidos en este rango, retrocediendo un día...")
-
-        if valor is None:
-            raise RuntimeError("No se pudo extraer valor del Precio Bolsa desde XM en los últimos 5 días")
+        encontrado = await _pbnd_local(fecha or date.today())
+        if encontrado is not None:
+            return float(encontrado[1]), "XM"
+        if fecha is not None:
+            raise RuntimeError(f"Sin PBND para {fecha} ni en los {DIAS_RETROCESO} días previos")
 
-        # 💡 Si llegó aquí, significa que se obtuvo correctamente desde XM
+        valor = await cache_xm.obtener(_CLAVE_PBND, _buscar_pbnd_xm, ttl=TTL_RECIENTE)
         return float(valor), "XM"
 
     except Exception as e:
-        print(f"❌ Error al obtener PBND desde XM: {e}")
-        print("🔁 Usando valor de respaldo desde configuración local...")
-        cfg = cargar_configuracion()
-        valor_respaldo = float(cfg.get("tarifas", {}).get("generacion", {}).get("valor_kWh", 320.5))
+        logger.warning("❌ Error al obtener PBND desde XM (%s); se usa el respaldo de la configuración local", e)
+        # Tarifa de generación vigente en la fecha consultada
+        valor_respaldo = obtener_configuracion().en_fecha(fecha).tarifa("generacion", 320.5)
         return valor_respaldo, "Respaldo local (config.json)"
+
+
+# ==========================================================
+# 🔹 Precio de bolsa horario (perfiles de carga)
+# ==========================================================
+def _extraer_horarios(resp_json: dict) -> List[Tuple[date, List[float]]]:
+    """Convierte la respuesta /hourly de XM en pares (fecha, 24 valores; NaN si falta la hora)."""
+    filas = []
+    for item in resp_json.get("Items") or []:
+        fecha_txt = str(item.get("Date") or "")[:10]
+        if not fecha_txt:
+            continue
+        for ent in item.get("HourlyEntities") or []:
+            valores = ent.get("Values") or {}
+            horas = [valores.get(f"Hour{h:02d}") for h in range(1, 25)]
+            if any(v not in (None, "") for v in horas):
+                filas.append((date.fromisoformat(fecha_txt), [float("nan") if v in (None, "") else float(v) for v in horas]))
+                break
+    return filas
+
+
+async def sincronizar_bolsa_horaria(desde: date, hasta: date) -> int:
+    """
+    Trae de XM (/hourly) solo los días de [desde, hasta] que faltan en la
+    serie horaria local, en ventanas de VENTANA_DAILY_DIAS días. Devuelve los
+    días guardados.
+    """
+    almacen = obtener_almacen()
+    almacen.refrescar_si_cambio()
+    hasta = min(hasta, date.today())
+    faltantes = almacen.dias_horarios_faltantes(desde, hasta) if desde <= hasta else []
+    guardados = 0
+    while faltantes:
+        inicio = faltantes[0]
+        fin = min(inicio + timedelta(days=VENTANA_DAILY_DIAS - 1), faltantes[-1])
+        resp_json = await _consultar("/hourly", {
+            "MetricId": METRICA_BOLSA_HORARIA,
+            "StartDate": inicio.strftime("%Y-%m-%d"),
+            "EndDate": fin.strftime("%Y-%m-%d"),
+            "Entity": "Sistema",
+        })
+        guardados += almacen.guardar_horarios(_extraer_horarios(resp_json), metrica=METRICA_BOLSA_HORARIA)
+        faltantes = [d for d in faltantes if d > fin]
+
+    if guardados:
+        logger.info("🗄️ Precio de bolsa horario sincronizado: %d días nuevos (%s → %s)", guardados, desde, hasta)
+    return guardados
+
+
+async def precios_bolsa_horarios(desde: date, dias: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Precio de bolsa hora a hora para `dias` días desde `desde` (dias × 24,
+    hora 0 = 00:00–01:00 hora de Colombia) y la máscara de horas sin precio
+    horario. Esas horas toman el PBND del día o, si tampoco hay, la tarifa
+    de generación de la configuración vigente en esa fecha.
+    """
+    hasta = desde + timedelta(days=dias - 1)
+    try:
+        await cache_xm.obtener(
+            ("HORARIO_SYNC", desde.isoformat(), hasta.isoformat()),
+            lambda: sincronizar_bolsa_horaria(desde, hasta),
+            ttl=TTL_RECIENTE,
+        )
+    except Exception as e:
+        logger.warning("⚠️ No se pudo sincronizar el precio de bolsa horario: %s", e)
+    almacen = obtener_almacen()
+    almacen.refrescar_si_cambio()
+    precios = almacen.precios_horarios(desde, dias)
+
+    huecos = np.isnan(precios)
+    if huecos.any():
+        por_dia = precios.reshape(dias, 24)
+        cfg = obtener_configuracion()
+        for i in np.flatnonzero(huecos.reshape(dias, 24).any(axis=1)):
+            dia = desde + timedelta(days=int(i))
+            encontrado = almacen.valor_en(dia, DIAS_RETROCESO)
+            respaldo = encontrado[1] if encontrado is not None else cfg.en_fecha(dia).tarifa("generacion", 320.5)
+            fila = por_dia[i]
+            fila[np.isnan(fila)] = respaldo
+    return precios, huecos
+
+
+async def _buscar_pbnd_xm() -> float:
+    """Recorre hacia atrás rangos de 3 días (hasta 5 intentos) hasta encontrar un PBND."""
+    logger.debug("🚀 Consultando el Precio Bolsa Nacional en XM")
+    metric_id = await _id_metrica_pbnd()
+
+    dias_retroceso = 0
+    valor = None
+
+    while dias_retroceso < 5 and valor is None:  # hasta 5 días atrás
+        end_d = date.today() - timedelta(days=dias_retroceso)
+        start_d = end_d - timedelta(days=3)
+        logger.debug("📅 Intento %d: rango %s → %s", dias_retroceso + 1, start_d, end_d)
+
+        payload = {
+            "MetricId": metric_id,
+            "StartDate": start_d.strftime("%Y-%m-%d"),
+            "EndDate": end_d.strftime("%Y-%m-%d"),
+            "Entity": "Sistema",
+        }
+
+        resp_json = await _consultar("/daily", payload)
+        items = resp_json.get("Items") or []
+        logger.debug("🧠 Datos XM recibidos: %d items", len(items))
+
+        for item in reversed(items):
+            if "DailyEntities" in item:
+                for ent in item["DailyEntities"]:
+                    v = ent.get("Value")
+                    if v is not None:
+                        valor = float(v)
+                        logger.info("✅ PBND encontrado (%s): %s", end_d, valor)
+                        break
+            if valor is not None:
+                break
+
+        if valor is None:
+            dias_retroceso += 1
+            logger.debug("⚠️ Sin datos válidos en este rango, retrocediendo un día")
+
+    if valor is None:
+        raise RuntimeError("No se pudo extraer valor del Precio Bolsa desde XM en los últimos 5 días")
+
+    # 💡 Si llegó aquí, significa que se obtuvo correctamente desde XM
+    return float(valor)
@@ -0,0 +1,178 @@
+import logging
+import math
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.refresco_xm import ZONA_XM
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Valoración horaria de perfiles de carga
+#     Energía de C clientes × H horas consecutivas contra el
+#     precio de bolsa de esas H horas: el cruce con la serie
+#     horaria es un corte (las horas son consecutivas) y el
+#     costo de todos los clientes, un producto matriz·vector.
+# ==========================================================
+MAX_HORAS = 3 * 8784                 # tres años bisiestos
+BYTES_VALOR = 8                      # float64 little-endian en el flujo binario
+MAX_CLIENTES_DETALLE = 10000         # más clientes → solo totales
+
+
+class ErrorPerfil(ValueError):
+    """El perfil de carga no se puede valorar (inicio, forma o tamaño inválidos)."""
+
+
+def hora_local(inicio: datetime) -> datetime:
+    """
+    Primera hora del perfil en hora de Colombia (sin zona). Con zona se
+    convierte; sin zona se asume hora de Colombia. Debe caer en punto.
+    """
+    if inicio.tzinfo is not None:
+        inicio = inicio.astimezone(ZONA_XM).replace(tzinfo=None)
+    if inicio.minute or inicio.second or inicio.microsecond:
+        raise ErrorPerfil(f"'inicio' debe ser una hora en punto: {inicio.isoformat()}")
+    return inicio
+
+
+def dias_cubiertos(inicio: datetime, horas: int) -> Tuple[date, int, int]:
+    """(primer día, número de días completos a consultar, hora de inicio dentro del primer día)."""
+    if horas <= 0:
+        raise ErrorPerfil("El perfil no tiene horas")
+    if horas > MAX_HORAS:
+        raise ErrorPerfil(f"El perfil supera {MAX_HORAS} horas ({horas})")
+    desplazamiento = inicio.hour
+    return inicio.date(), math.ceil((desplazamiento + horas) / 24), desplazamiento
+
+
+def matriz_energia(energia: Any) -> Tuple[np.ndarray, int]:
+    """
+    Energía como matriz clientes × horas (un perfil 1D es un cliente).
+    Los valores no finitos se ponen a 0 y se devuelven contados.
+    """
+    try:
+        matriz = np.asarray(energia, dtype=np.float64)
+    except ValueError:
+        raise ErrorPerfil("Todos los perfiles de 'energia_kWh' deben tener el mismo número de horas") from None
+    if matriz.ndim == 1:
+        matriz = matriz.reshape(1, -1)
+    if matriz.ndim != 2:
+        raise ErrorPerfil("'energia_kWh' debe ser una lista de horas o una lista de perfiles")
+    invalidas = ~np.isfinite(matriz)
+    n_invalidas = int(np.count_nonzero(invalidas))
+    if n_invalidas:
+        matriz = np.where(invalidas, 0.0, matriz)
+    return matriz, n_invalidas
+
+
+@dataclass(frozen=True)
+class ResultadoHorario:
+    energia: np.ndarray   # kWh por cliente
+    costo: np.ndarray     # $ por cliente
+    horas: int
+
+    @property
+    def clientes(self) -> int:
+        return int(self.energia.size)
+
+    @property
+    def energia_total(self) -> float:
+        return float(self.energia.sum())
+
+    @property
+    def costo_total(self) -> float:
+        return float(self.costo.sum())
+
+    @property
+    def promedio(self) -> Optional[float]:
+        energia = self.energia_total
+        return self.costo_total / energia if energia != 0 else None
+
+    def por_cliente(self, ids: Optional[Sequence[str]] = None) -> List[dict]:
+        ids = ids if ids is not None else [str(i) for i in range(self.clientes)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            g = np.where(self.energia != 0, self.costo / self.energia, np.nan)
+        return [
+            {"id": i, "energia_kWh": round(e, 6), "costo": round(c, 2), "G_kWh": None if math.isnan(p) else round(p, 4)}
+            for i, e, c, p in zip(ids, self.energia.tolist(), self.costo.tolist(), g.tolist())
+        ]
+
+
+def valorar(energia: np.ndarray, precios: np.ndarray) -> ResultadoHorario:
+    """
+    Costo de cada perfil (fila de `energia`) hora a hora: energia @ precios.
+    `precios` son exactamente las horas del perfil.
+    """
+    if energia.shape[1] != precios.size:
+        raise ErrorPerfil(f"El perfil tiene {energia.shape[1]} horas y hay {precios.size} precios")
+    return ResultadoHorario(energia=energia.sum(axis=1), costo=energia @ precios, horas=int(precios.size))
+
+
+def recortar(precios_dias: np.ndarray, desplazamiento: int, horas: int) -> np.ndarray:
+    """Horas del perfil dentro de los días completos consultados."""
+    return precios_dias[desplazamiento:desplazamiento + horas]
+
+
+class IngestaPerfilBinaria:
+    """
+    Perfiles en flujo binario: float64 little-endian, `horas` valores por
+    cliente, uno tras otro. Cada trozo se valora al llegar (perfiles
+    completos × precios) y se descarta; solo quedan dos números por cliente.
+    """
+
+    def __init__(self, precios: np.ndarray, guardar_detalle: bool = True):
+        self.precios = precios
+        self.horas = int(precios.size)
+        self.bytes_perfil = self.horas * BYTES_VALOR
+        self.guardar_detalle = guardar_detalle
+        self.clientes = 0
+        self.horas_invalidas = 0
+        self.energia_total = 0.0
+        self.costo_total = 0.0
+        self._energia: List[np.ndarray] = []
+        self._costo: List[np.ndarray] = []
+        self._resto = bytearray()
+
+    @property
+    def promedio(self) -> Optional[float]:
+        return self.costo_total / self.energia_total if self.energia_total != 0 else None
+
+    def alimentar(self, trozo: bytes) -> None:
+        self._resto += trozo
+        completos = len(self._resto) // self.bytes_perfil
+        if not completos:
+            return
+        n = completos * self.bytes_perfil
+        bloque = np.frombuffer(bytes(self._resto[:n]), dtype="<f8").reshape(completos, self.horas)
+        del self._resto[:n]
+        matriz, invalidas = matriz_energia(bloque)
+        self.horas_invalidas += invalidas
+        resultado = valorar(matriz, self.precios)
+        self.clientes += completos
+        self.energia_total += resultado.energia_total
+        self.costo_total += resultado.costo_total
+        if self.guardar_detalle:
+            self._energia.append(resultado.energia)
+            self._costo.append(resultado.costo)
+            if self.clientes > MAX_CLIENTES_DETALLE:
+                self.guardar_detalle = False
+                self._energia, self._costo = [], []
+
+    def terminar(self) -> Optional[ResultadoHorario]:
+        """Resultado por cliente (None si hay demasiados clientes para detallarlos)."""
+        if self._resto:
+            raise ErrorPerfil(
+                f"El flujo termina con {len(self._resto)} bytes sueltos: se esperaban perfiles de "
+                f"{self.horas} valores float64 ({self.bytes_perfil} bytes)"
+            )
+        if not self.guardar_detalle:
+            return None
+        vacio = np.empty(0)
+        return ResultadoHorario(
+            energia=np.concatenate(self._energia) if self._energia else vacio,
+            costo=np.concatenate(self._costo) if self._costo else vacio,
+            horas=self.horas,
+        )
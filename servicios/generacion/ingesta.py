@@ -0,0 +1,185 @@
+import csv
+import json
+import logging
+import math
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.ponderado import AcumuladorPonderado
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Ingesta en flujo de compras de energía (NDJSON / CSV)
+#     El cuerpo se procesa por trozos según llega: las líneas
+#     válidas se acumulan en bloques de TAMANO_BLOQUE filas que
+#     se suman con NumPy y se descartan. Memoria constante.
+# ==========================================================
+TAMANO_BLOQUE = 16384
+MAX_ERRORES_REPORTADOS = 100
+MAX_BYTES_LINEA = 64 * 1024
+
+FORMATOS = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json-lines": "ndjson",
+    "text/csv": "csv",
+    "application/csv": "csv",
+}
+
+_NAN = float("nan")
+
+
+class ErrorFormato(ValueError):
+    """El flujo no se puede interpretar (p. ej. CSV sin cabecera válida)."""
+
+
+def formato_desde_content_type(content_type: Optional[str]) -> Optional[str]:
+    """'ndjson' o 'csv' según la cabecera Content-Type (None si no se admite)."""
+    tipo = (content_type or "").split(";")[0].strip().lower()
+    return FORMATOS.get(tipo)
+
+
+def _numero(valor: Any, campo: str, opcional: bool = False) -> float:
+    if valor is None or valor == "":
+        if opcional:
+            return _NAN
+        raise ValueError(f"falta '{campo}'")
+    if isinstance(valor, bool):
+        raise ValueError(f"'{campo}' no es numérico")
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' no es numérico: {valor!r}") from None
+    if not math.isfinite(numero):
+        raise ValueError(f"'{campo}' no es finito")
+    return numero
+
+
+class IngestaCompras:
+    """
+    Convierte un flujo de bytes NDJSON o CSV de compras (energia_kWh, precio_kWh
+    opcional) en sumas corrientes. Las filas inválidas se cuentan y las primeras
+    MAX_ERRORES_REPORTADOS se informan con su número de línea.
+    """
+
+    def __init__(self, formato: str):
+        if formato not in ("ndjson", "csv"):
+            raise ValueError(f"Formato no soportado: {formato}")
+        self.formato = formato
+        self.acumulado = AcumuladorPonderado()
+        self.lineas = 0
+        self.filas_invalidas = 0
+        self.errores: List[Dict[str, Any]] = []
+        self._resto = b""
+        self._descartando_linea = False
+        self._columnas: Optional[Tuple[int, Optional[int]]] = None
+        self._energia = array("d")
+        self._precio = array("d")
+
+    # ------------------------------------------------------
+    # Entrada
+    # ------------------------------------------------------
+    def alimentar(self, trozo: bytes) -> None:
+        """Procesa un trozo del cuerpo; la última línea incompleta queda pendiente."""
+        if not trozo:
+            return
+        datos = self._resto + trozo
+        lineas = datos.split(b"\n")
+        self._resto = lineas.pop()
+        for linea in lineas:
+            self._linea(linea)
+        if len(self._resto) > MAX_BYTES_LINEA:
+            if not self._descartando_linea:
+                self._invalida(self.lineas + 1, f"línea de más de {MAX_BYTES_LINEA} bytes")
+                self._descartando_linea = True
+            self._resto = b""
+
+    def terminar(self) -> AcumuladorPonderado:
+        """Procesa lo pendiente y devuelve las sumas acumuladas."""
+        if self._resto:
+            self._linea(self._resto)
+            self._resto = b""
+        self._volcar()
+        return self.acumulado
+
+    # ------------------------------------------------------
+    # Procesamiento por línea
+    # ------------------------------------------------------
+    def _linea(self, crudo: bytes) -> None:
+        self.lineas += 1
+        if self._descartando_linea:
+            # Final de una línea demasiado larga (ya reportada)
+            self._descartando_linea = False
+            return
+        try:
+            texto = crudo.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            self._invalida(self.lineas, "no es UTF-8 válido")
+            return
+        if not texto:
+            return
+        try:
+            if self.formato == "ndjson":
+                energia, precio = self._fila_ndjson(texto)
+            else:
+                fila = self._fila_csv(texto)
+                if fila is None:
+                    return
+                energia, precio = fila
+        except ErrorFormato:
+            raise
+        except ValueError as e:
+            self._invalida(self.lineas, str(e))
+            return
+
+        self._energia.append(energia)
+        self._precio.append(precio)
+        if len(self._energia) >= TAMANO_BLOQUE:
+            self._volcar()
+
+    def _fila_ndjson(self, texto: str) -> Tuple[float, float]:
+        try:
+            fila = json.loads(texto)
+        except ValueError:
+            raise ValueError("JSON inválido") from None
+        if not isinstance(fila, dict):
+            raise ValueError("se esperaba un objeto JSON")
+        return (
+            _numero(fila.get("energia_kWh"), "energia_kWh"),
+            _numero(fila.get("precio_kWh"), "precio_kWh", opcional=True),
+        )
+
+    def _fila_csv(self, texto: str) -> Optional[Tuple[float, float]]:
+        campos = next(csv.reader([texto]))
+        if self._columnas is None:
+            cabecera = [c.strip() for c in campos]
+            if "energia_kWh" not in cabecera:
+                raise ErrorFormato(f"línea {self.lineas}: la cabecera CSV debe incluir 'energia_kWh' (y opcionalmente 'precio_kWh')")
+            self._columnas = (
+                cabecera.index("energia_kWh"),
+                cabecera.index("precio_kWh") if "precio_kWh" in cabecera else None,
+            )
+            return None
+        i_energia, i_precio = self._columnas
+        try:
+            energia = campos[i_energia]
+        except IndexError:
+            raise ValueError("faltan columnas") from None
+        precio = campos[i_precio] if i_precio is not None and i_precio < len(campos) else None
+        return (
+            _numero(energia.strip(), "energia_kWh"),
+            _numero(precio.strip() if precio is not None else None, "precio_kWh", opcional=True),
+        )
+
+    def _invalida(self, linea: int, error: str) -> None:
+        self.filas_invalidas += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append({"linea": linea, "error": error})
+
+    def _volcar(self) -> None:
+        if self._energia:
+            self.acumulado.agregar(self._energia, self._precio)
+            self._energia = array("d")
+            self._precio = array("d")
@@ -1,14 +1,35 @@
 import logging
 import json
-from typing import List, Dict, Union
+from datetime import datetime
+from typing import Any, List, Dict, Optional, Sequence, Tuple, Union
 from core.calculadora import cargar_configuracion
+from core.ponderado import AcumuladorPonderado, numero_filas, promedio_ponderado_filas
 from core.utils import redondear, respuesta_estandar
 import asyncio
 from core.xm_api import obtener_precio_bolsa_xm  # ✅ Nombre correcto de la función # 🔹 Nueva función real XM
+from core.xm_api import precios_bolsa_horarios
+from horario import (
+    MAX_CLIENTES_DETALLE, ErrorPerfil, IngestaPerfilBinaria, ResultadoHorario,
+    dias_cubiertos, hora_local, matriz_energia, recortar, valorar,
+)
 logger = logging.getLogger(__name__)
 
 
-async def calcular_componente_G(compras: List[Union[Dict, object]]) -> Dict:
+async def _precio_referencia() -> Tuple[float, str]:
+    """PBND desde XM o, si falla, valor de referencia de normativa_config.json."""
+    try:
+        valor_xm, fuente = await obtener_precio_bolsa_xm()
+        logger.debug("✅ Precio Bolsa Nacional obtenido desde XM: %s $/kWh", valor_xm)
+    except Exception as e:
+        logger.warning("⚠️ No se pudo obtener valor real de XM (%s). Usando respaldo local.", e)
+        config = cargar_configuracion()
+        componente_cfg = config.get("componente_G", {})
+        valor_xm = componente_cfg.get("valor_referencia", 320.5)
+        fuente = "normativa_config.json"
+    return valor_xm, fuente
+
+
+async def calcular_componente_G(compras: Union[List[Union[Dict, object]], Dict[str, List[float]]]) -> Dict:
     """
     Calcula el componente G (Generación) con base en datos reales de XM o respaldo local.
 
@@ -21,21 +42,12 @@ async def calcular_componente_G(compras: List[Union[Dict, object]]) -> Dict:
         # ================================================================
         # 🔹 Paso 1: Intentar obtener valor real desde XM
         # ================================================================
-        try:
-            valor_xm = await obtener_precio_bolsa_xm()
-            fuente = "XM"
-            logger.info(f"✅ Precio Bolsa Nacional obtenido desde XM: {valor_xm} $/kWh")
-        except Exception as e:
-            logger.warning(f"⚠️ No se pudo obtener valor real de XM ({e}). Usando respaldo local.")
-            config = cargar_configuracion()
-            componente_cfg = config.get("componente_G", {})
-            valor_xm = componente_cfg.get("valor_referencia", 320.5)
-            fuente = "normativa_config.json"
+        valor_xm, fuente = await _precio_referencia()
 
         # ================================================================
         # 🔹 Paso 2: Si no hay compras, usa directamente el valor de XM
         # ================================================================
-        if not compras:
+        if numero_filas(compras) == 0:
             logger.info("No se proporcionaron compras, usando valor base de XM o JSON")
             return respuesta_estandar(True, f"Valor obtenido de {fuente}", {
                 "G_promedio": redondear(valor_xm, 2),
@@ -45,35 +57,145 @@ async def calcular_componente_G(compras: List[Union[Dict, object]]) -> Dict:
         # ================================================================
         # 🔹 Paso 3: Calcular promedio ponderado si hay compras
         # ================================================================
-        energia_total = sum(
-            c["energia_kWh"] if isinstance(c, dict) else c.energia_kWh
-            for c in compras
-        )
-        costo_total = sum(
-            (c["energia_kWh"] * c.get("precio_kWh", valor_xm)) if isinstance(c, dict)
-            else (c.energia_kWh * getattr(c, "precio_kWh", valor_xm))
-            for c in compras
-        )
-
-        if energia_total == 0:
+        # Las compras sin precio se valoran al PBND (o al respaldo)
+        resultado = promedio_ponderado_filas(compras, "energia_kWh", "precio_kWh", precio_defecto=valor_xm)
+        energia_total, costo_total = resultado.energia_total, resultado.costo_total
+
+        if resultado.promedio is None:
             return respuesta_estandar(True, "Energía total nula", {"G_promedio": 0.0})
 
-        promedio = redondear(costo_total / energia_total, 2)
-        logger.info(f"Componente G calculado: {promedio} $/kWh | Fuente: {fuente}")
+        promedio = redondear(resultado.promedio, 2)
+        logger.debug("Componente G calculado: %s $/kWh | Fuente: %s", promedio, fuente)
 
         return respuesta_estandar(True, "Cálculo exitoso", {
             "metodo": "promedio_ponderado",
             "energia_total_kWh": energia_total,
             "costo_total": costo_total,
             "G_promedio": promedio,
-            "fuente": fuente
+            "fuente": fuente,
+            "filas_descartadas": resultado.filas_descartadas
+        })
+
+    except Exception as e:
+        logger.error("❌ Error al calcular componente G: %s", e)
+        return respuesta_estandar(False, f"Error: {str(e)}", {"G_promedio": 0.0})
+
+
+async def calcular_componente_G_acumulado(acumulado: AcumuladorPonderado) -> Dict:
+    """
+    Componente G a partir de sumas corrientes (ingesta en flujo). Las compras
+    sin precio se valoran al PBND al final, sin volver a recorrerlas.
+    """
+    try:
+        valor_xm, fuente = await _precio_referencia()
+        if acumulado.filas - acumulado.filas_descartadas == 0:
+            logger.info("Flujo sin compras válidas, usando valor base de XM o JSON")
+            return respuesta_estandar(True, f"Valor obtenido de {fuente}", {
+                "G_promedio": redondear(valor_xm, 2),
+                "fuente": fuente
+            })
+
+        resultado = acumulado.resultado(precio_defecto=valor_xm)
+        if resultado.promedio is None:
+            return respuesta_estandar(True, "Energía total nula", {"G_promedio": 0.0})
+
+        promedio = redondear(resultado.promedio, 2)
+        logger.debug("Componente G calculado en flujo: %s $/kWh | %s filas | Fuente: %s", promedio, resultado.filas, fuente)
+        return respuesta_estandar(True, "Cálculo exitoso", {
+            "metodo": "promedio_ponderado",
+            "energia_total_kWh": resultado.energia_total,
+            "costo_total": resultado.costo_total,
+            "G_promedio": promedio,
+            "fuente": fuente,
+            "filas": resultado.filas,
+            "filas_sin_precio": acumulado.filas_sin_precio,
+            "filas_descartadas": resultado.filas_descartadas
         })
 
     except Exception as e:
-        logger.error(f"❌ Error al calcular componente G: {e}")
+        logger.error("❌ Error al calcular componente G en flujo: %s", e)
         return respuesta_estandar(False, f"Error: {str(e)}", {"G_promedio": 0.0})
 
 
+# ================================================================
+# 🔹 Valoración horaria (perfiles de carga)
+# ================================================================
+async def precios_perfil(inicio: datetime, horas: int) -> Tuple[Any, int]:
+    """
+    Precio de bolsa de cada hora del perfil (desde `inicio`, hora de Colombia)
+    y cuántas de esas horas no tenían precio horario (van al PBND del día).
+    """
+    dia, dias, desplazamiento = dias_cubiertos(inicio, horas)
+    precios, huecos = await precios_bolsa_horarios(dia, dias)
+    sin_precio = int(recortar(huecos, desplazamiento, horas).sum())
+    return recortar(precios, desplazamiento, horas), sin_precio
+
+
+def datos_horario(
+    inicio: datetime,
+    totales: Union[ResultadoHorario, IngestaPerfilBinaria],
+    horas_sin_precio: int,
+    horas_invalidas: int,
+    detalle: Optional[ResultadoHorario] = None,
+    ids: Optional[Sequence[str]] = None,
+) -> Dict:
+    """Bloque `datos` de la respuesta horaria; `detalle` añade el resultado por cliente."""
+    promedio = totales.promedio
+    datos = {
+        "metodo": "horario",
+        "inicio": inicio.isoformat(timespec="minutes"),
+        "horas": totales.horas,
+        "clientes": totales.clientes,
+        "energia_total_kWh": totales.energia_total,
+        "costo_total": totales.costo_total,
+        "G_promedio": redondear(promedio, 2) if promedio is not None else 0.0,
+        "fuente": "XM horario" if horas_sin_precio == 0 else "XM horario + PBND/respaldo diario",
+        "horas_sin_precio_horario": horas_sin_precio,
+        "horas_invalidas": horas_invalidas,
+    }
+    if detalle is not None and detalle.clientes <= MAX_CLIENTES_DETALLE:
+        datos["por_cliente"] = detalle.por_cliente(ids)
+    return datos
+
+
+async def calcular_componente_G_horario(
+    inicio: datetime,
+    energia: Union[Sequence[float], Sequence[Sequence[float]]],
+    ids: Optional[Sequence[str]] = None,
+) -> Dict:
+    """
+    Componente G de uno o varios perfiles de carga horarios (mismas horas
+    consecutivas desde `inicio`), valorando cada hora a su precio de bolsa.
+    Lanza ErrorPerfil si el perfil es inválido.
+    """
+    inicio = hora_local(inicio)
+    matriz, invalidas = matriz_energia(energia)
+    if ids is not None and len(ids) != matriz.shape[0]:
+        raise ErrorPerfil(f"'ids' tiene {len(ids)} elementos y hay {matriz.shape[0]} perfiles")
+    try:
+        precios, sin_precio = await precios_perfil(inicio, matriz.shape[1])
+        resultado = valorar(matriz, precios)
+        if resultado.promedio is None:
+            return respuesta_estandar(True, "Energía total nula", {"G_promedio": 0.0})
+        logger.debug("Componente G horario: %d clientes × %d horas", resultado.clientes, resultado.horas)
+        return respuesta_estandar(True, "Cálculo exitoso", datos_horario(
+            inicio, resultado, sin_precio, invalidas, detalle=resultado, ids=ids,
+        ))
+    except ErrorPerfil:
+        raise
+    except Exception as e:
+        logger.error("❌ Error al calcular componente G horario: %s", e)
+        return respuesta_estandar(False, f"Error: {str(e)}", {"G_promedio": 0.0})
+
+
+def resultado_flujo_horario(inicio: datetime, ingesta: IngestaPerfilBinaria, horas_sin_precio: int) -> Dict:
+    """Respuesta de la valoración en flujo (sin detalle por cliente si hubo demasiados)."""
+    detalle = ingesta.terminar()
+    return respuesta_estandar(True, "Cálculo exitoso", datos_horario(
+        inicio, ingesta, horas_sin_precio, ingesta.horas_invalidas, detalle=detalle,
+    ))
+
+
 # ================================================================
 # 🔹 Ejecución manual de prueba
 # ================================================================
@@ -1,24 +1,70 @@
 # servicios/generacion/main.py
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
-from logica import calcular_componente_G
-from core.xm_api import listar_metricas_xm, obtener_precio_bolsa_xm
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Union
+from logica import (
+    calcular_componente_G, calcular_componente_G_acumulado,
+    calcular_componente_G_horario, precios_perfil, resultado_flujo_horario,
+)
+from horario import ErrorPerfil, IngestaPerfilBinaria, hora_local
+from core.http_condicional import max_age_entorno, respuesta_condicional
+from core.aplicacion import crear_app
+from ingesta import ErrorFormato, IngestaCompras, formato_desde_content_type
+from core.xm_api import (
+    listar_metricas_xm, obtener_precio_bolsa_xm, pool_xm, cache_xm,
+    TTL_HISTORICO, TTL_METRICAS, TTL_RECIENTE,
+    obtener_almacen, cerrar_almacen,
+    grabacion_xm, preparar_grabacion,
+)
+from core.refresco_xm import ZONA_XM, RefrescoXM
 
 # ==========================================================
 # 🔹 Configuración básica de logging
 # ==========================================================
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ==========================================================
 # 🔹 Inicialización de la aplicación FastAPI
 # ==========================================================
-app = FastAPI(
+refresco_xm = RefrescoXM()
+
+# max-age (s) de las lecturas con GET condicional (HTTP_MAX_AGE_<RUTA>);
+# por defecto, el TTL de la caché XM de la que salen
+MAX_AGE_PRECIO = max_age_entorno("precio_xm", int(TTL_RECIENTE))
+MAX_AGE_PRECIO_HISTORICO = max_age_entorno("precio_xm_historico", int(TTL_HISTORICO))
+MAX_AGE_METRICAS = max_age_entorno("metricas_xm", int(TTL_METRICAS))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cliente XM persistente: se abre al arrancar y se cierra al apagar
+    await pool_xm.abrir()
+    obtener_almacen()
+    preparar_grabacion()
+    # Catálogo de métricas + serie PBND precargados antes de atender; luego
+    # se refrescan en segundo plano (backfill incremental incluido)
+    await refresco_xm.iniciar()
+    try:
+        yield
+    finally:
+        await refresco_xm.detener()
+        await pool_xm.cerrar()
+        cerrar_almacen()
+        grabacion_xm.cerrar()
+        if cache_xm.compartida is not None:
+            cache_xm.compartida.cerrar()
+
+
+app = crear_app(
+    "generacion",
     title="Microservicio Generación",
     description="Calcula el componente G (Generación) de la tarifa eléctrica usando datos reales de XM",
-    version="1.1.1"
+    version="1.1.1",
+    lifespan=lifespan
 )
 
 # ==========================================================
@@ -29,6 +75,28 @@ class CompraEnergia(BaseModel):
     precio_kWh: float | None = None  # si viene 0/None, se usa PBND desde XM
 
 
+# Formato columnar: una lista por campo (validada una sola vez)
+class ColumnasCompras(BaseModel):
+    energia_kWh: List[float]
+    precio_kWh: Optional[List[Optional[float]]] = None  # null (o ausente) → PBND
+
+    @model_validator(mode="after")
+    def _misma_longitud(self):
+        if self.precio_kWh is not None and len(self.precio_kWh) != len(self.energia_kWh):
+            raise ValueError(
+                f"'energia_kWh' ({len(self.energia_kWh)}) y 'precio_kWh' "
+                f"({len(self.precio_kWh)}) deben tener la misma longitud"
+            )
+        return self
+
+
+# Perfil de carga horario: una lista de horas (un cliente) o una lista de perfiles
+class PerfilHorario(BaseModel):
+    inicio: datetime  # primera hora; sin zona horaria se asume hora de Colombia
+    energia_kWh: Union[List[float], List[List[float]]]
+    ids: Optional[List[str]] = None
+
+
 # ==========================================================
 # 🔹 Endpoints
 # ==========================================================
@@ -39,47 +107,158 @@ def root():
 
 
 @app.get("/generacion/precio-xm")
-async def obtener_precio_xm():
+async def obtener_precio_xm(request: Request, fecha: Optional[date] = None):
     """
     Devuelve el Precio Bolsa Nacional Diario (PBND) desde XM o el respaldo local si no hay conexión.
+    Con `fecha` (YYYY-MM-DD) devuelve el PBND vigente en ese día (recálculo histórico).
+    Admite GET condicional (ETag / If-None-Match → 304).
     """
     try:
-        valor, fuente = await obtener_precio_bolsa_xm()
-        logger.info(f"📊 Valor G obtenido: {valor} $/kWh | Fuente: {fuente}")
-        return {"valor_kWh": valor, "fuente": fuente}
+        valor, fuente = await obtener_precio_bolsa_xm(fecha)
+        logger.debug("📊 Valor G obtenido: %s $/kWh | Fuente: %s", valor, fuente)
+        historico = fecha is not None and fecha < datetime.now(ZONA_XM).date()
+        return respuesta_condicional(
+            request, {"valor_kWh": valor, "fuente": fuente},
+            max_age=MAX_AGE_PRECIO_HISTORICO if historico else MAX_AGE_PRECIO,
+        )
     except Exception as e:
         logger.exception("❌ Error al obtener el precio desde XM")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/generacion/listo")
+def listo():
+    """Readiness: 200 cuando los datos XM están precargados (503 mientras tanto)."""
+    estado = refresco_xm.estadisticas()
+    return JSONResponse(estado, status_code=200 if estado["listo"] else 503)
+
+
 @app.get("/generacion/metricas-xm")
-async def listar_metricas():
+async def listar_metricas(request: Request, refrescar: bool = False):
     """
-    Consulta y lista las métricas disponibles en el servicio XM.
+    Lista las métricas disponibles en XM desde el catálogo precargado.
+    `refrescar=true` fuerza una nueva consulta a XM.
+    Admite GET condicional: mientras el catálogo no cambie, el cuerpo ya
+    serializado se reutiliza y un cliente con el ETag recibe 304.
     """
     try:
-        items = await listar_metricas_xm(force=True)
-        return {
+        items = await listar_metricas_xm(force=refrescar)
+        contenido = {
             "ok": True,
             "total_metricas": len(items),
             "metricas": items
         }
+        return respuesta_condicional(request, contenido, max_age=MAX_AGE_METRICAS, fuente=items)
     except Exception as e:
         logger.exception("❌ Error al listar métricas XM")
         raise HTTPException(status_code=502, detail=str(e))
 
 
+@app.get("/generacion/pbnd/estado")
+def estado_serie_pbnd():
+    """Cobertura de la serie local del PBND."""
+    almacen = obtener_almacen()
+    primera, ultima = almacen.primera_fecha(), almacen.ultima_fecha()
+    dias_h, primera_h, ultima_h = almacen.cobertura_horaria()
+    return {
+        "dias": len(almacen),
+        "primera_fecha": primera.isoformat() if primera else None,
+        "ultima_fecha": ultima.isoformat() if ultima else None,
+        "horario": {
+            "dias": dias_h,
+            "primera_fecha": primera_h.isoformat() if primera_h else None,
+            "ultima_fecha": ultima_h.isoformat() if ultima_h else None,
+        },
+    }
+
+
+@app.get("/generacion/cache-xm")
+def estado_cache_xm():
+    """Estadísticas de la caché de respuestas XM y del pool de conexiones."""
+    compartida = cache_xm.compartida.estadisticas() if cache_xm.compartida is not None else None
+    return {
+        "cache": cache_xm.estadisticas(),
+        "compartida": compartida,
+        "pool": pool_xm.estadisticas(),
+        "grabacion": grabacion_xm.estadisticas(),
+    }
+
+
 @app.post("/generacion/calcular")
-async def calcular_generacion(compras: List[CompraEnergia]):
+async def calcular_generacion(compras: Union[List[CompraEnergia], ColumnasCompras]):
     """
     Calcula el componente G (Generación) total.  
     Si `precio_kWh` es 0 o None en alguna compra, se reemplaza internamente por el PBND de XM.
+    Acepta una lista de compras o el formato columnar (una lista por campo).
     """
     try:
-        data = [c.model_dump() for c in compras]
+        # Por filas, el motor lee los modelos directamente (sin model_dump); por columnas, las listas
+        data = dict(compras) if isinstance(compras, ColumnasCompras) else compras
         resultado = await calcular_componente_G(data)
-        logger.info("✅ Cálculo de componente G completado correctamente")
+        logger.debug("✅ Cálculo de componente G completado correctamente")
         return resultado
     except Exception as e:
         logger.exception("❌ Error al procesar solicitud de cálculo de generación")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/generacion/calcular/flujo")
+async def calcular_generacion_flujo(request: Request):
+    """
+    Igual que /generacion/calcular para listas muy grandes: el cuerpo llega en
+    `application/x-ndjson` (un objeto por línea) o `text/csv` (cabecera
+    energia_kWh[,precio_kWh]) y se procesa por trozos, con memoria constante.
+    Las filas inválidas se omiten y se informan con su número de línea.
+    """
+    formato = formato_desde_content_type(request.headers.get("content-type"))
+    if formato is None:
+        raise HTTPException(status_code=415, detail="Use Content-Type application/x-ndjson o text/csv")
+
+    ingesta = IngestaCompras(formato)
+    try:
+        async for trozo in request.stream():
+            ingesta.alimentar(trozo)
+        acumulado = ingesta.terminar()
+    except ErrorFormato as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    resultado = await calcular_componente_G_acumulado(acumulado)
+    resultado["datos"]["lineas"] = ingesta.lineas
+    resultado["datos"]["filas_invalidas"] = ingesta.filas_invalidas
+    resultado["datos"]["errores"] = ingesta.errores
+    if ingesta.filas_invalidas:
+        resultado["mensaje"] += f" | ⚠️ {ingesta.filas_invalidas} filas inválidas omitidas"
+    return resultado
+
+
+@app.post("/generacion/calcular/horario")
+async def calcular_generacion_horario(perfil: PerfilHorario):
+    """
+    Valora perfiles de consumo horario (p. ej. 8760 horas de un año) hora a
+    hora contra el precio de bolsa horario de XM, guardado en la serie local.
+    Varios perfiles con el mismo `inicio` se valoran en una sola operación.
+    """
+    try:
+        return await calcular_componente_G_horario(perfil.inicio, perfil.energia_kWh, perfil.ids)
+    except ErrorPerfil as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@app.post("/generacion/calcular/horario/flujo")
+async def calcular_generacion_horario_flujo(request: Request, inicio: datetime, horas: int):
+    """
+    Igual que /generacion/calcular/horario para carteras grandes: el cuerpo
+    (`application/octet-stream`) son perfiles float64 little-endian de
+    `horas` valores cada uno, consecutivos. Se valoran por trozos al llegar.
+    """
+    if (request.headers.get("content-type") or "").split(";")[0].strip().lower() != "application/octet-stream":
+        raise HTTPException(status_code=415, detail="Use Content-Type application/octet-stream (float64 little-endian)")
+    try:
+        inicio = hora_local(inicio)
+        precios, sin_precio = await precios_perfil(inicio, horas)
+        ingesta = IngestaPerfilBinaria(precios)
+        async for trozo in request.stream():
+            ingesta.alimentar(trozo)
+        return resultado_flujo_horario(inicio, ingesta, sin_precio)
+    except ErrorPerfil as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -34,7 +34,7 @@ def calcular_componente_PR(energia_total_kWh: float, costo_promedio_kWh: float,
         costo_total_PR = energia_perdida_kWh * costo_promedio_kWh
         PR_promedio = redondear(costo_total_PR / energia_total_kWh, 2)
 
-        logger.info(f"Componente PR calculado: {PR_promedio} $/kWh")
+        logger.debug("Componente PR calculado: %s $/kWh", PR_promedio)
 
         return respuesta_estandar(True, "Cálculo exitoso", {
             "metodo": metodo,
@@ -47,7 +47,7 @@ def calcular_componente_PR(energia_total_kWh: float, costo_promedio_kWh: float,
         })
 
     except Exception as e:
-        logger.error(f"Error al calcular componente PR: {e}")
+        logger.error("Error al calcular componente PR: %s", e)
         return respuesta_estandar(False, f"Error: {str(e)}", {"PR_promedio": 0.0})
 
 
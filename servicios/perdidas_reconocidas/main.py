@@ -1,13 +1,14 @@
 import logging
-from fastapi import FastAPI, HTTPException
+from fastapi import HTTPException
 from pydantic import BaseModel
 from logica import calcular_componente_PR
+from core.aplicacion import crear_app
 
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
+app = crear_app(
+    "perdidas_reconocidas",
     title="Microservicio Pérdidas Reconocidas",
     description="Calcula el componente PR (Pérdidas Reconocidas) de la tarifa eléctrica",
     version="1.0.0"
@@ -38,5 +39,5 @@ def calcular_perdidas(req: PerdidasRequest):
         )
         return resultado
     except Exception as e:
-        logger.error(f"Error en cálculo de PR: {e}")
+        logger.error("Error en cálculo de PR: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
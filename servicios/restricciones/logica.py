@@ -1,20 +1,23 @@
 import logging
 from typing import Dict, List, Union
 from core.calculadora import cargar_configuracion
+from core.ponderado import numero_filas, promedio_ponderado_filas
 from core.utils import redondear, respuesta_estandar
 
 logger = logging.getLogger(__name__)
 
-def calcular_componente_R(eventos: List[Union[Dict, object]]) -> Dict:
+def calcular_componente_R(eventos: Union[List[Union[Dict, object]], Dict[str, List[float]]]) -> Dict:
     """
     Calcula el componente R (Restricciones) con base en los eventos o ajustes del sistema.
 
     Parámetros:
     -----------
-    eventos : List[Dict|object]
+    eventos : List[Dict|object] | Dict[str, List[float]]
         Lista con los campos:
         - energia_afectada_kWh
         - costo_unitario_kWh
+        o, en formato columnar, un dict con una lista por campo
+        ({"energia_afectada_kWh": [...], "costo_unitario_kWh": [...]}).
 
     Retorna:
     --------
@@ -25,36 +28,29 @@ def calcular_componente_R(eventos: List[Union[Dict, object]]) -> Dict:
         componente_cfg = config.get("componente_R", {})
         metodo = componente_cfg.get("metodo", "promedio_simple")
 
-        if not eventos:
+        if numero_filas(eventos) == 0:
             logger.warning("Lista de eventos vacía, retornando 0.0")
             return respuesta_estandar(True, "Sin eventos de restricciones", {"R_promedio": 0.0})
 
-        energia_total = sum(
-            e["energia_afectada_kWh"] if isinstance(e, dict) else e.energia_afectada_kWh
-            for e in eventos
-        )
+        resultado = promedio_ponderado_filas(eventos, "energia_afectada_kWh", "costo_unitario_kWh")
+        energia_total, costo_total = resultado.energia_total, resultado.costo_total
 
-        costo_total = sum(
-            (e["energia_afectada_kWh"] * e["costo_unitario_kWh"]) if isinstance(e, dict)
-            else (e.energia_afectada_kWh * e.costo_unitario_kWh)
-            for e in eventos
-        )
-
-        if energia_total == 0:
+        if resultado.promedio is None:
             return respuesta_estandar(True, "Energía total nula", {"R_promedio": 0.0})
 
-        promedio = redondear(costo_total / energia_total, 2)
-        logger.info(f"Componente R calculado: {promedio} $/kWh")
+        promedio = redondear(resultado.promedio, 2)
+        logger.debug("Componente R calculado: %s $/kWh", promedio)
 
         return respuesta_estandar(True, "Cálculo exitoso", {
             "metodo": metodo,
             "energia_total_afectada_kWh": energia_total,
             "costo_total": costo_total,
-            "R_promedio": promedio
+            "R_promedio": promedio,
+            "filas_descartadas": resultado.filas_descartadas
         })
 
     except Exception as e:
-        logger.error(f"Error al calcular componente R: {e}")
+        logger.error("Error al calcular componente R: %s", e)
         return respuesta_estandar(False, f"Error: {str(e)}", {"R_promedio": 0.0})
 
 
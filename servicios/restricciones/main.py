@@ -1,14 +1,15 @@
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import HTTPException
+from pydantic import BaseModel, model_validator
+from typing import List, Union
 from logica import calcular_componente_R
+from core.aplicacion import crear_app
 
 # Configuración de logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
+app = crear_app(
+    "restricciones",
     title="Microservicio Restricciones",
     description="Calcula el componente R (Restricciones) de la tarifa eléctrica",
     version="1.0.0"
@@ -19,6 +20,20 @@ class EventoRestriccion(BaseModel):
     energia_afectada_kWh: float
     costo_unitario_kWh: float
 
+# Formato columnar: una lista por campo (validada una sola vez)
+class ColumnasRestriccion(BaseModel):
+    energia_afectada_kWh: List[float]
+    costo_unitario_kWh: List[float]
+
+    @model_validator(mode="after")
+    def _misma_longitud(self):
+        if len(self.energia_afectada_kWh) != len(self.costo_unitario_kWh):
+            raise ValueError(
+                f"'energia_afectada_kWh' ({len(self.energia_afectada_kWh)}) y 'costo_unitario_kWh' "
+                f"({len(self.costo_unitario_kWh)}) deben tener la misma longitud"
+            )
+        return self
+
 
 @app.get("/")
 def root():
@@ -26,14 +41,16 @@ def root():
 
 
 @app.post("/restricciones/calcular")
-def calcular_restricciones(eventos: List[EventoRestriccion]):
+def calcular_restricciones(eventos: Union[List[EventoRestriccion], ColumnasRestriccion]):
     """
     Calcula el componente R (Restricciones) a partir de los eventos registrados.
+    Acepta una lista de objetos o el formato columnar (una lista por campo).
     """
     try:
-        data = [e.dict() for e in eventos]
+        # Por filas, el motor lee los modelos; por columnas, las listas directamente
+        data = dict(eventos) if isinstance(eventos, ColumnasRestriccion) else eventos
         resultado = calcular_componente_R(data)
         return resultado
     except Exception as e:
-        logger.error(f"Error en cálculo de restricciones: {e}")
+        logger.error("Error en cálculo de restricciones: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
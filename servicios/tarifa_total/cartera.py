@@ -0,0 +1,493 @@
+"""
+Facturación de la cartera completa fuera de línea (proceso nocturno).
+
+Lee un CSV o Parquet con `consumo`, `estrato`, `zona` y `nivel_tension` (más
+las columnas que traiga, p. ej. el id del cliente), valora cada fila en la
+matriz estrato × zona × nivel (matriz.py) construida con los motores de
+`servicios/*/logica.py` y la configuración normativa de `core/calculadora.py`,
+y escribe un CSV con `tarifa_kWh`, `costo_total`, `subsidio_contribucion` y
+`error` añadidos al final de cada fila.
+
+    python cartera.py cartera.csv facturas.csv
+    python cartera.py cartera.parquet facturas.csv --fecha 2025-01-31 --procesos 8
+
+Si se interrumpe, la misma orden continúa donde quedó (ver `<salida>.progreso`).
+"""
+import os
+
+# Sin servidor: por defecto los motores se llaman en proceso (ver motores_locales.py)
+os.environ.setdefault("TARIFA_MODO", "local")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import csv  # noqa: E402
+import io  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import math  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from collections import deque  # noqa: E402
+from concurrent.futures import Future, ProcessPoolExecutor  # noqa: E402
+from datetime import date  # noqa: E402
+from itertools import islice  # noqa: E402
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from core.registro import configurar_registro  # noqa: E402
+from clients import modo_local, pool_http  # noqa: E402
+from logica import obtener_matriz_tarifas  # noqa: E402
+from matriz import ErrorMatriz, MatrizTarifas  # noqa: E402
+import motores_locales  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Parámetros del proceso por lotes
+#     El archivo se lee en trozos de FILAS_POR_TROZO filas; a lo
+#     sumo TROZOS_POR_PROCESO trozos por proceso están en vuelo,
+#     así la memoria no crece con el tamaño de la cartera.
+# ==========================================================
+FILAS_POR_TROZO = int(os.environ.get("CARTERA_FILAS_POR_TROZO", 50_000))
+TROZOS_POR_PROCESO = 2
+PROGRESO_CADA_S = 5.0
+PLAZO_S = 30.0              # sin usuario esperando: se da tiempo a XM y a los motores
+VERSION_PROGRESO = 2
+
+COLUMNAS = ("consumo", "estrato", "zona", "nivel_tension")
+_ALIAS = {"consumo_kwh": "consumo"}
+NIVELES_TENSION = ("NT1", "NT2", "NT3", "NT4", "NT5")
+COLUMNAS_SALIDA = ("tarifa_kWh", "costo_total", "subsidio_contribucion", "error")
+
+
+class ErrorCartera(ValueError):
+    """La entrada o el punto de reanudación no sirven para facturar."""
+
+
+# ==========================================================
+# 🔹 Trabajo de cada proceso: trozo → filas CSV de salida
+# ==========================================================
+_matriz: Optional[MatrizTarifas] = None
+_posiciones: Tuple[int, ...] = ()
+_separador = ","
+_celdas: Dict[Tuple[str, str, str], Any] = {}
+
+
+def _iniciar_trabajador(matriz: MatrizTarifas, posiciones: Tuple[int, ...], separador: str) -> None:
+    global _matriz, _posiciones, _separador
+    _matriz, _posiciones, _separador = matriz, posiciones, separador
+    _celdas.clear()
+
+
+def _celda(estrato: int, zona: str, nivel: str) -> Any:
+    """Índices de la celda o el motivo por el que no hay tarifa (memorizado: hay pocas combinaciones)."""
+    clave = (estrato, zona, nivel)
+    celda = _celdas.get(clave)
+    if celda is None:
+        try:
+            celda = _matriz.indices(estrato, zona, nivel)
+        except ErrorMatriz as e:
+            celda = str(e)
+        _celdas[clave] = celda
+    return celda
+
+
+def _validar(fila: List[Any]) -> Tuple[float, Any]:
+    """
+    (consumo, índices de la celda) o (NaN, motivo de rechazo), con las reglas
+    de modelo.DatosEntrada y las combinaciones de la matriz.
+    """
+    i_consumo, i_estrato, i_zona, i_nivel = _posiciones
+    try:
+        consumo = float(fila[i_consumo])
+        estrato = float(fila[i_estrato])
+        zona = str(fila[i_zona] or "").strip()
+        nivel = str(fila[i_nivel] or "").strip().upper()
+    except (IndexError, TypeError, ValueError):
+        return math.nan, "fila incompleta o no numérica"
+    if not (consumo > 0 and math.isfinite(consumo)):
+        return math.nan, "consumo debe ser mayor que 0"
+    if not (estrato.is_integer() and 1 <= estrato <= 6):
+        return math.nan, "estrato debe ser un entero entre 1 y 6"
+    if not zona:
+        return math.nan, "zona vacía"
+    if nivel not in NIVELES_TENSION:
+        return math.nan, f"nivel_tension debe ser uno de {', '.join(NIVELES_TENSION)}"
+    celda = _celda(int(estrato), zona, nivel)
+    if isinstance(celda, str):
+        return math.nan, celda
+    return consumo, celda
+
+
+def _filas_trozo(trozo: Any) -> List[List[Any]]:
+    if isinstance(trozo, bytes):
+        lineas = trozo.decode("utf-8").splitlines()
+        return [fila for fila in csv.reader(lineas, delimiter=_separador) if fila]
+    # pyarrow.RecordBatch
+    return [list(fila) for fila in zip(*trozo.to_pydict().values())]
+
+
+def facturar_trozo(trozo: Any) -> Tuple[str, int, int, float, float]:
+    """
+    Valora un trozo (bytes CSV o RecordBatch de Parquet) y devuelve
+    (texto CSV de salida, filas, rechazadas, consumo total, costo total).
+    Los costos de todas las filas válidas salen de una sola operación sobre
+    la matriz (MatrizTarifas.costos).
+    """
+    filas = _filas_trozo(trozo)
+    validadas = [_validar(fila) for fila in filas]
+    validos = [i for i, (_, celda) in enumerate(validadas) if not isinstance(celda, str)]
+    consumos = np.array([validadas[i][0] for i in validos], dtype=np.float64)
+    celdas = np.array([validadas[i][1] for i in validos], dtype=np.intp).reshape(-1, 3)
+    i_estrato, i_zona, i_nivel = celdas.T
+    costos = _matriz.costos(consumos, i_estrato, i_zona, i_nivel)
+    plenos = np.round(consumos * _matriz.costo_unitario[i_zona, i_nivel], 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tarifas = np.round(costos / consumos, 4)
+    por_fila = dict(zip(validos, zip(tarifas.tolist(), costos.tolist(), np.round(costos - plenos, 2).tolist())))
+
+    salida = io.StringIO()
+    escritor = csv.writer(salida, delimiter=_separador, lineterminator="\n")
+    for i, (fila, (_, celda)) in enumerate(zip(filas, validadas)):
+        if isinstance(celda, str):
+            escritor.writerow(fila + ["", "", "", celda])
+        else:
+            escritor.writerow(fila + [*por_fila[i], ""])
+    return (
+        salida.getvalue(), len(filas), len(filas) - len(validos),
+        float(consumos.sum()), float(costos.sum()),
+    )
+
+
+# ==========================================================
+# 🔹 Lectura por trozos (CSV o Parquet)
+# ==========================================================
+def _posiciones_columnas(encabezado: List[str]) -> Tuple[int, ...]:
+    nombres = [_ALIAS.get(c.strip().lower(), c.strip().lower()) for c in encabezado]
+    faltantes = [c for c in COLUMNAS if c not in nombres]
+    if faltantes:
+        raise ErrorCartera(f"Faltan columnas en la entrada: {', '.join(faltantes)} (hay: {', '.join(encabezado)})")
+    return tuple(nombres.index(c) for c in COLUMNAS)
+
+
+class LectorCSV:
+    """Trozos de `filas` líneas como bytes; la posición en bytes permite reanudar."""
+
+    def __init__(self, ruta: str, filas: int, separador: str):
+        self.filas = filas
+        self._archivo = open(ruta, "rb")
+        self.total_bytes = os.fstat(self._archivo.fileno()).st_size
+        primera = self._archivo.readline().decode("utf-8-sig").rstrip("\r\n")
+        self.encabezado = next(csv.reader([primera], delimiter=separador), [])
+
+    def posicion(self) -> int:
+        return self._archivo.tell()
+
+    def saltar(self, posicion: int, trozos: int) -> None:
+        self._archivo.seek(posicion)
+
+    def avance(self, progreso: Dict[str, Any]) -> Optional[float]:
+        return progreso["posicion_entrada"] / self.total_bytes if self.total_bytes else None
+
+    def trozos(self) -> Iterator[bytes]:
+        while True:
+            lineas = list(islice(self._archivo, self.filas))
+            if not lineas:
+                return
+            yield b"".join(lineas)
+
+    def cerrar(self) -> None:
+        self._archivo.close()
+
+
+class LectorParquet:
+    """Lotes de `filas` filas con pyarrow (dependencia opcional); se reanuda por número de trozo."""
+
+    def __init__(self, ruta: str, filas: int, separador: str):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ErrorCartera("Leer Parquet requiere pyarrow (pip install pyarrow); o convierta la cartera a CSV") from None
+        self.filas = filas
+        self._archivo = pq.ParquetFile(ruta)
+        self.encabezado = list(self._archivo.schema_arrow.names)
+        self.total_filas = self._archivo.metadata.num_rows
+        self._leidos = 0
+        self._saltar = 0
+
+    def posicion(self) -> int:
+        return self._leidos
+
+    def saltar(self, posicion: int, trozos: int) -> None:
+        self._saltar = trozos
+
+    def avance(self, progreso: Dict[str, Any]) -> Optional[float]:
+        return min(1.0, progreso["trozos"] * self.filas / self.total_filas) if self.total_filas else None
+
+    def trozos(self) -> Iterator[Any]:
+        # iter_batches con el mismo tamaño de lote produce siempre los mismos trozos
+        for lote in self._archivo.iter_batches(batch_size=self.filas):
+            self._leidos += 1
+            if self._leidos > self._saltar:
+                yield lote
+
+    def cerrar(self) -> None:
+        self._archivo.close()
+
+
+def abrir_entrada(ruta: str, filas: int, separador: str):
+    if ruta.lower().endswith((".parquet", ".pq")):
+        return LectorParquet(ruta, filas, separador)
+    return LectorCSV(ruta, filas, separador)
+
+
+# ==========================================================
+# 🔹 Punto de reanudación (<salida>.progreso, JSON)
+#     Se reescribe de forma atómica tras cada trozo ya volcado
+#     a disco: trozos hechos, posición en la entrada, bytes
+#     válidos de la salida, totales y la matriz usada (la misma
+#     para toda la corrida aunque se reanude otro día).
+# ==========================================================
+def _firma_entrada(ruta: str) -> Dict[str, Any]:
+    estado = os.stat(ruta)
+    return {"ruta": os.path.abspath(ruta), "bytes": estado.st_size, "modificado_ns": estado.st_mtime_ns}
+
+
+def leer_progreso(ruta: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise ErrorCartera(f"Punto de reanudación ilegible ({ruta}): {e}; use --desde-cero") from None
+
+
+def guardar_progreso(ruta: str, progreso: Dict[str, Any]) -> None:
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(progreso, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def _compatible(progreso: Dict[str, Any], firma: Dict[str, Any], filas: int, separador: str) -> Optional[str]:
+    """Motivo por el que no se puede reanudar, o None."""
+    if progreso.get("version") != VERSION_PROGRESO:
+        return "versión distinta del punto de reanudación"
+    if progreso.get("entrada") != firma:
+        return "la entrada cambió desde la corrida anterior"
+    if progreso.get("filas_por_trozo") != filas or progreso.get("separador") != separador:
+        return f"la corrida anterior usó {progreso.get('filas_por_trozo')} filas por trozo y separador {progreso.get('separador')!r}"
+    return None
+
+
+# ==========================================================
+# 🔹 Matriz de la corrida (un fan-out, como /tarifa/matriz)
+# ==========================================================
+async def resolver_matriz(fecha: Optional[date], plazo_s: float) -> Dict[str, Any]:
+    """Matriz del periodo serializada (se guarda en el punto de reanudación)."""
+    await pool_http.abrir()
+    if modo_local():
+        motores_locales.cargar_todos()
+    try:
+        matriz, resuelto = await obtener_matriz_tarifas(plazo_s, fecha)
+    finally:
+        await pool_http.cerrar()
+        await motores_locales.cerrar()
+    return {
+        "matriz": matriz.a_json(),
+        "componentes": resuelto["componentes"],
+        "fuente_G": resuelto["fuente_G"],
+        "degradados": resuelto["degradados"],
+        "version_config": resuelto["version_config"],
+        "fecha": resuelto["fecha"],
+        "vigencia": resuelto["vigencia"],
+    }
+
+
+# ==========================================================
+# 🔹 Corrida completa
+# ==========================================================
+def _procesos_por_defecto() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def facturar_cartera(
+    entrada: str,
+    salida: str,
+    fecha: Optional[date] = None,
+    procesos: Optional[int] = None,
+    filas_por_trozo: int = FILAS_POR_TROZO,
+    separador: str = ",",
+    desde_cero: bool = False,
+    plazo_s: float = PLAZO_S,
+    progreso_cada_s: float = PROGRESO_CADA_S,
+) -> Dict[str, Any]:
+    """
+    Factura `entrada` en `salida` y devuelve el resumen (el mismo contenido
+    que queda en `<salida>.progreso`). Si existe un punto de reanudación
+    compatible, continúa desde el último trozo escrito.
+    """
+    procesos = procesos or _procesos_por_defecto()
+    ruta_progreso = f"{salida}.progreso"
+    firma = _firma_entrada(entrada)
+    lector = abrir_entrada(entrada, filas_por_trozo, separador)
+    try:
+        posiciones = _posiciones_columnas(lector.encabezado)
+        progreso = None if desde_cero else leer_progreso(ruta_progreso)
+        if progreso is not None:
+            motivo = _compatible(progreso, firma, filas_por_trozo, separador)
+            if motivo:
+                raise ErrorCartera(f"No se puede reanudar {salida}: {motivo}; use --desde-cero")
+            if progreso.get("completo"):
+                logger.info("✅ %s ya estaba completa (%s filas); nada que hacer", salida, progreso["filas"])
+                return progreso
+
+        if progreso is None:
+            tarifa = asyncio.run(resolver_matriz(fecha, plazo_s))
+            if tarifa["degradados"]:
+                logger.warning("⚠️ Componentes degradados en la tarifa de la corrida: %s", tarifa["degradados"])
+            progreso = {
+                "version": VERSION_PROGRESO,
+                "entrada": firma,
+                "filas_por_trozo": filas_por_trozo,
+                "separador": separador,
+                "tarifa": tarifa,
+                "trozos": 0,
+                "posicion_entrada": lector.posicion(),
+                "bytes_salida": 0,
+                "filas": 0,
+                "rechazadas": 0,
+                "consumo_total_kWh": 0.0,
+                "costo_total_$": 0.0,
+                "duracion_s": 0.0,
+                "completo": False,
+            }
+            with open(salida, "w", encoding="utf-8", newline="") as f:
+                csv.writer(f, delimiter=separador, lineterminator="\n").writerow(lector.encabezado + list(COLUMNAS_SALIDA))
+                progreso["bytes_salida"] = f.tell()
+            guardar_progreso(ruta_progreso, progreso)
+        else:
+            logger.info("↩️ Reanudando %s en el trozo %s (%s filas ya facturadas)", salida, progreso["trozos"], progreso["filas"])
+            lector.saltar(progreso["posicion_entrada"], progreso["trozos"])
+
+        return _ejecutar(lector, salida, ruta_progreso, progreso, posiciones, procesos, separador, progreso_cada_s)
+    finally:
+        lector.cerrar()
+
+
+def _ejecutar(
+    lector: Any,
+    salida: str,
+    ruta_progreso: str,
+    progreso: Dict[str, Any],
+    posiciones: Tuple[int, ...],
+    procesos: int,
+    separador: str,
+    progreso_cada_s: float,
+) -> Dict[str, Any]:
+    matriz = MatrizTarifas.desde_json(progreso["tarifa"]["matriz"])
+    logger.info(
+        "🧾 Facturando con %s procesos, %s filas por trozo | matriz %s zonas × %s niveles (G: %s)",
+        procesos, lector.filas, len(matriz.zonas), len(matriz.niveles), progreso["tarifa"]["fuente_G"],
+    )
+    inicio = time.perf_counter()
+    duracion_previa = progreso["duracion_s"]
+    filas_previas = progreso["filas"]
+    ultimo_aviso = inicio
+    en_vuelo: Deque[Tuple[Future, int]] = deque()
+
+    with open(salida, "r+b") as destino, ProcessPoolExecutor(
+        max_workers=procesos, initializer=_iniciar_trabajador, initargs=(matriz, posiciones, separador)
+    ) as pool:
+        if os.fstat(destino.fileno()).st_size < progreso["bytes_salida"]:
+            raise ErrorCartera(f"{salida} es más corta que su punto de reanudación; use --desde-cero")
+        # Lo escrito después del último punto de reanudación se descarta
+        destino.truncate(progreso["bytes_salida"])
+        destino.seek(progreso["bytes_salida"])
+
+        def volcar() -> None:
+            nonlocal ultimo_aviso
+            futuro, posicion = en_vuelo.popleft()
+            texto, filas, rechazadas, consumo, costo = futuro.result()
+            destino.write(texto.encode("utf-8"))
+            destino.flush()
+            os.fsync(destino.fileno())
+            progreso["trozos"] += 1
+            progreso["posicion_entrada"] = posicion
+            progreso["bytes_salida"] = destino.tell()
+            progreso["filas"] += filas
+            progreso["rechazadas"] += rechazadas
+            progreso["consumo_total_kWh"] += consumo
+            progreso["costo_total_$"] += costo
+            ahora = time.perf_counter()
+            progreso["duracion_s"] = duracion_previa + ahora - inicio
+            guardar_progreso(ruta_progreso, progreso)
+            if ahora - ultimo_aviso >= progreso_cada_s:
+                ultimo_aviso = ahora
+                _avisar(progreso, lector.avance(progreso), (progreso["filas"] - filas_previas) / (ahora - inicio))
+
+        for trozo in lector.trozos():
+            en_vuelo.append((pool.submit(facturar_trozo, trozo), lector.posicion()))
+            if len(en_vuelo) >= procesos * TROZOS_POR_PROCESO:
+                volcar()
+        while en_vuelo:
+            volcar()
+
+    transcurrido = time.perf_counter() - inicio
+    progreso["completo"] = True
+    progreso["consumo_total_kWh"] = round(progreso["consumo_total_kWh"], 4)
+    progreso["costo_total_$"] = round(progreso["costo_total_$"], 2)
+    guardar_progreso(ruta_progreso, progreso)
+    nuevas = progreso["filas"] - filas_previas
+    logger.info(
+        "✅ Cartera facturada: %s filas (%s rechazadas) | costo total %.2f $ | %.0f filas/s en esta corrida",
+        progreso["filas"], progreso["rechazadas"], progreso["costo_total_$"], nuevas / transcurrido if transcurrido else 0.0,
+    )
+    return progreso
+
+
+def _avisar(progreso: Dict[str, Any], avance: Optional[float], filas_s: float) -> None:
+    porcentaje = f"{avance * 100:.1f}%" if avance is not None else "?"
+    logger.info(
+        "📈 %s | %s filas (%s rechazadas) | %.0f filas/s | %s trozos",
+        porcentaje, progreso["filas"], progreso["rechazadas"], filas_s, progreso["trozos"],
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entrada", help="CSV o Parquet (.parquet) con consumo, estrato, zona y nivel_tension")
+    parser.add_argument("salida", help="CSV de salida (las columnas de entrada + tarifa_kWh, costo_total, error)")
+    parser.add_argument("--fecha", type=date.fromisoformat, help="Normativa y PBND de esta fecha (AAAA-MM-DD)")
+    parser.add_argument("--procesos", type=int, help="Procesos de cálculo (por defecto, los núcleos disponibles)")
+    parser.add_argument("--filas-por-trozo", type=int, default=FILAS_POR_TROZO)
+    parser.add_argument("--separador", default=",")
+    parser.add_argument("--desde-cero", action="store_true", help="Ignora el punto de reanudación y reescribe la salida")
+    parser.add_argument("--plazo-s", type=float, default=PLAZO_S, help="Plazo para resolver los componentes")
+    parser.add_argument("--progreso-s", type=float, default=PROGRESO_CADA_S, help="Intervalo de los avisos de avance")
+    args = parser.parse_args(argv)
+    if args.filas_por_trozo <= 0:
+        parser.error("--filas-por-trozo debe ser mayor que 0")
+
+    configurar_registro("cartera", formato="texto")
+    try:
+        facturar_cartera(
+            args.entrada, args.salida, fecha=args.fecha, procesos=args.procesos,
+            filas_por_trozo=args.filas_por_trozo, separador=args.separador,
+            desde_cero=args.desde_cero, plazo_s=args.plazo_s, progreso_cada_s=args.progreso_s,
+        )
+    except (ErrorCartera, OSError) as e:
+        logger.error("❌ %s", e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
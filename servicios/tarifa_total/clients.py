@@ -1,18 +1,32 @@
-import httpx
 import asyncio
+import hashlib
+import json
 import logging
-from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import Dict, Any, List
+import os
+import time
+import httpx
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
 
 # 👇 importa el loader centralizado del core (compartido por todos)
-from core.calculadora import cargar_configuracion
+from core.calculadora import ConfiguracionNormativa, descongelar, obtener_configuracion
+from core import cache_compartida
+from core.cache import CacheTTL
+from core.cliente_http import ConfigPoolHTTP, PoolHTTP
+from core import metricas
+from core.registro import cabeceras_contexto
+import motores_locales
+import resiliencia
+from resiliencia import CircuitoAbierto
 
 logger = logging.getLogger(__name__)
 
 # =====================================================
-# 🔗 URLs base de los microservicios (sin cambios)
+# 🔗 URLs base de los microservicios
+#     TARIFA_URL_<X> / TARIFA_URL_PRECIO_XM permiten apuntar a otros hosts
 # =====================================================
-URLS: Dict[str, str] = {
+_URLS_DEFECTO: Dict[str, str] = {
     "G": "http://generacion:8001/generacion/calcular",
     "T": "http://transmision:8002/transmision/calcular",
     "D": "http://distribucion:8003/distribucion/calcular",
@@ -20,6 +34,101 @@ URLS: Dict[str, str] = {
     "R": "http://restricciones:8005/restricciones/calcular",
     "C": "http://comercializacion:8006/comercializacion/calcular",
 }
+URLS: Dict[str, str] = {
+    nombre: os.environ.get(f"TARIFA_URL_{nombre}", url) for nombre, url in _URLS_DEFECTO.items()
+}
+
+URL_PRECIO_XM = os.environ.get("TARIFA_URL_PRECIO_XM", "http://generacion:8001/generacion/precio-xm")
+
+# =====================================================
+# 🧩 Modo de ejecución
+#     "http"  → cada componente es un microservicio (distribuido)
+#     "local" → los motores se importan y llaman en proceso (monolito)
+# =====================================================
+MODO = os.environ.get("TARIFA_MODO", "http").strip().lower()
+
+
+def modo_local() -> bool:
+    return MODO == "local"
+
+# =====================================================
+# 🔌 Pool de conexiones compartido (abierto/cerrado en el lifespan)
+#     Ajustable con TARIFA_HTTP_TIMEOUT, TARIFA_HTTP_MAX_CONEXIONES,
+#     TARIFA_HTTP_MAX_KEEPALIVE, TARIFA_HTTP_KEEPALIVE_EXPIRY,
+#     TARIFA_HTTP_MAX_POR_HOST y TARIFA_HTTP_HTTP2
+# =====================================================
+pool_http = PoolHTTP(ConfigPoolHTTP.desde_entorno("TARIFA_HTTP", timeout=8.0))
+
+# =====================================================
+# 🗃️ Caché de resultados por componente
+#     Clave: hash del payload enviado. TTL por componente con
+#     TARIFA_CACHE_TTL_<G|T|D|PR|R|C> (s); tamaño con TARIFA_CACHE_MAX_ENTRADAS.
+#     G depende del PBND de XM, por eso caduca antes.
+#     Con varios workers, los valores se comparten en el host
+#     (core/cache_compartida.py): un solo worker consulta cada
+#     componente por payload.
+# =====================================================
+_TTL_DEFECTO = {"G": 300.0, "T": 3600.0, "D": 3600.0, "PR": 3600.0, "R": 3600.0, "C": 3600.0}
+TTL_COMPONENTES: Dict[str, float] = {
+    nombre: float(os.environ.get(f"TARIFA_CACHE_TTL_{nombre}", ttl))
+    for nombre, ttl in _TTL_DEFECTO.items()
+}
+_MAX_ENTRADAS_CACHE = int(os.environ.get("TARIFA_CACHE_MAX_ENTRADAS", 256))
+
+# Un espacio para las seis cachés (la clave incluye el componente); depende de a
+# dónde se consulta, para que otro despliegue no reutilice valores
+_compartida = cache_compartida.crear(
+    "componentes", MODO, sorted(URLS.items()), URL_PRECIO_XM, os.environ.get("XM_BASE_URL"),
+    max_ranuras=4 * _MAX_ENTRADAS_CACHE,
+)
+caches_componentes: Dict[str, CacheTTL] = {
+    nombre: CacheTTL(
+        ttl=ttl, max_entradas=_MAX_ENTRADAS_CACHE, servir_obsoleto=False,
+        nombre=f"componente_{nombre}", compartida=_compartida,
+    )
+    for nombre, ttl in TTL_COMPONENTES.items()
+}
+_CLAVE_PRECIO_XM = "precio-xm"
+
+# =====================================================
+# ⏱️ Plazo global por petición y política de respaldo
+#     TARIFA_PLAZO_S: presupuesto total del fan-out (s).
+#     TARIFA_RESPALDO_<X>: "ultimo_valido" (último valor bueno del
+#     mismo payload, marcado como obsoleto; si no hay, como "config"),
+#     "config" (tarifas.<x>.valor_kWh) o "cero".
+# =====================================================
+PLAZO_S = float(os.environ.get("TARIFA_PLAZO_S", 1.5))
+
+_TARIFA_CONFIG: Dict[str, str] = {
+    "G": "generacion",
+    "T": "transmision",
+    "D": "distribucion",
+    "PR": "perdidas_reconocidas",
+    "R": "restricciones",
+    "C": "comercializacion",
+}
+POLITICA_RESPALDO: Dict[str, str] = {
+    nombre: os.environ.get(f"TARIFA_RESPALDO_{nombre}", "ultimo_valido") for nombre in _TARIFA_CONFIG
+}
+
+
+class Plazo:
+    """Presupuesto de tiempo de una petición, compartido por todas sus llamadas."""
+
+    def __init__(self, segundos: Optional[float] = None):
+        self.segundos = PLAZO_S if segundos is None else segundos
+        self._limite = time.monotonic() + self.segundos
+
+    def restante(self) -> float:
+        return max(0.0, self._limite - time.monotonic())
+
+
+@dataclass
+class ResultadoComponente:
+    valor: float
+    degradado: bool = False
+    motivo: Optional[str] = None
+    obsoleto: bool = False  # último valor válido conocido, no el actual
 
 # =====================================================
 # 🧭 Campos esperados en las respuestas (sin cambios)
@@ -35,77 +144,74 @@ CAMPOS: Dict[str, str] = {
 
 # =====================================================
 # 🧩 Helpers para construir payloads desde el JSON
-#     con fallbacks a los ejemplos anteriores
+#     con fallbacks a los ejemplos anteriores.
+#     Reciben el snapshot de configuración de la petición
+#     (obtener_configuracion()), así una recarga no mezcla
+#     versiones dentro de un mismo cálculo.
 # =====================================================
 
-def _cfg() -> Dict[str, Any]:
+def _cfg() -> ConfiguracionNormativa:
     """
-    Devuelve el dict de configuración normativa.
+    Devuelve el snapshot vigente de la configuración normativa.
     Carga desde /app/config/normativa_config.json (imagen base)
     o la ruta indicada por NORMATIVA_CONFIG_PATH.
     """
-    return cargar_configuracion() or {}
+    return obtener_configuracion()
 
-def _payload_generacion(consumo_kWh: float) -> List[Dict[str, float]]:
+def _payload_generacion(cfg: ConfiguracionNormativa, consumo_kWh: float) -> List[Dict[str, float]]:
     """
     Espera: lista de compras con energia_kWh y precio_kWh
     JSON: componente_G.compras = [{ energia_kWh, precio_kWh }, ...]
     """
-    cfg = _cfg().get("componente_G", {})
-    compras = cfg.get("compras")
-    if isinstance(compras, list) and compras:
-        return compras
+    compras = cfg.seccion("componente_G").get("compras")
+    if compras:
+        return descongelar(compras)
     # fallback: usa 'tarifas' si existiera, o ejemplo fijo
-    tarifas = (_cfg().get("tarifas", {}).get("generacion") or {})
-    v = tarifas.get("valor_kWh", 320.5)
+    v = cfg.tarifa("generacion", 320.5)
     return [
         {"energia_kWh": 5000, "precio_kWh": v},
         {"energia_kWh": 3000, "precio_kWh": v},
         {"energia_kWh": 2000, "precio_kWh": v},
     ]
 
-def _payload_transmision(consumo_kWh: float) -> List[Dict[str, float]]:
+def _payload_transmision(cfg: ConfiguracionNormativa, consumo_kWh: float) -> List[Dict[str, float]]:
     """
     Espera: lista de líneas con energia_kWh y costo_unitario_kWh
     JSON: componente_T.lineas = [{ energia_kWh, costo_unitario_kWh }, ...]
     """
-    cfg = _cfg().get("componente_T", {})
-    lineas = cfg.get("lineas")
-    if isinstance(lineas, list) and lineas:
-        return lineas
-    tarifas = (_cfg().get("tarifas", {}).get("transmision") or {})
-    v = tarifas.get("valor_kWh", 35.0)
+    lineas = cfg.seccion("componente_T").get("lineas")
+    if lineas:
+        return descongelar(lineas)
+    v = cfg.tarifa("transmision", 35.0)
     return [
         {"energia_kWh": 4000, "costo_unitario_kWh": v},
         {"energia_kWh": 6000, "costo_unitario_kWh": v},
     ]
 
-def _payload_distribucion(consumo_kWh: float) -> List[Dict[str, float]]:
+def _payload_distribucion(cfg: ConfiguracionNormativa, consumo_kWh: float) -> List[Dict[str, float]]:
     """
     Espera: lista de redes con energia_kWh y costo_unitario_kWh
     JSON: componente_D.redes = [{ energia_kWh, costo_unitario_kWh }, ...]
     """
-    cfg = _cfg().get("componente_D", {})
-    redes = cfg.get("redes")
-    if isinstance(redes, list) and redes:
-        return redes
-    tarifas = (_cfg().get("tarifas", {}).get("distribucion") or {})
-    v = tarifas.get("valor_kWh", 40.0)
+    redes = cfg.seccion("componente_D").get("redes")
+    if redes:
+        return descongelar(redes)
+    v = cfg.tarifa("distribucion", 40.0)
     return [
         {"energia_kWh": 5000, "costo_unitario_kWh": v},
         {"energia_kWh": 3000, "costo_unitario_kWh": v},
         {"energia_kWh": 2000, "costo_unitario_kWh": v},
     ]
 
-def _payload_perdidas(consumo_kWh: float) -> Dict[str, float]:
+def _payload_perdidas(cfg: ConfiguracionNormativa, consumo_kWh: float) -> Dict[str, float]:
     """
     Espera: { energia_total_kWh, costo_promedio_kWh, porcentaje_perdidas }
     JSON: componente_PR.{ costo_promedio_kWh, porcentaje_perdidas }
     - energia_total_kWh la hacemos depender del consumo de entrada.
     """
-    cfg = _cfg().get("componente_PR", {})
-    costo_promedio = cfg.get("costo_promedio_kWh")
-    porcentaje = cfg.get("porcentaje_perdidas")
+    pr = cfg.seccion("componente_PR")
+    costo_promedio = pr.get("costo_promedio_kWh")
+    porcentaje = pr.get("porcentaje_perdidas")
     if costo_promedio is not None and porcentaje is not None:
         return {
             "energia_total_kWh": float(consumo_kWh),
@@ -113,44 +219,37 @@ def _payload_perdidas(consumo_kWh: float) -> Dict[str, float]:
             "porcentaje_perdidas": float(porcentaje),
         }
     # fallback: si no hay config, usa ejemplo estable
-    tarifas = (_cfg().get("tarifas", {}).get("perdidas_reconocidas") or {})
-    v = tarifas.get("valor_kWh", 130.0)
     return {
         "energia_total_kWh": float(consumo_kWh),
-        "costo_promedio_kWh": float(v),
+        "costo_promedio_kWh": cfg.tarifa("perdidas_reconocidas", 130.0),
         "porcentaje_perdidas": 0.10,  # 10% por defecto
     }
 
-def _payload_restricciones(consumo_kWh: float) -> List[Dict[str, float]]:
+def _payload_restricciones(cfg: ConfiguracionNormativa, consumo_kWh: float) -> List[Dict[str, float]]:
     """
     Espera: lista de eventos con energia_afectada_kWh y costo_unitario_kWh
     JSON: componente_R.eventos = [{ energia_afectada_kWh, costo_unitario_kWh }, ...]
     """
-    cfg = _cfg().get("componente_R", {})
-    eventos = cfg.get("eventos")
-    if isinstance(eventos, list) and eventos:
-        return eventos
-    tarifas = (_cfg().get("tarifas", {}).get("restricciones") or {})
-    v = tarifas.get("valor_kWh", 5.2)
+    eventos = cfg.seccion("componente_R").get("eventos")
+    if eventos:
+        return descongelar(eventos)
+    v = cfg.tarifa("restricciones", 5.2)
     return [
         {"energia_afectada_kWh": 3000, "costo_unitario_kWh": v},
         {"energia_afectada_kWh": 2000, "costo_unitario_kWh": v},
         {"energia_afectada_kWh": 5000, "costo_unitario_kWh": v},
     ]
 
-def _payload_comercializacion(consumo_kWh: float) -> Dict[str, float]:
+def _payload_comercializacion(cfg: ConfiguracionNormativa, consumo_kWh: float) -> Dict[str, float]:
     """
     Espera: { consumo_kWh, valor_unitario_kWh }
     JSON: componente_C.valor_unitario_kWh
     """
-    cfg = _cfg().get("componente_C", {})
-    v = cfg.get("valor_unitario_kWh")
+    v = cfg.seccion("componente_C").get("valor_unitario_kWh")
     if v is not None:
         return {"consumo_kWh": float(consumo_kWh), "valor_unitario_kWh": float(v)}
     # fallback a 'tarifas' o 0.0 si no hay nada definido
-    tarifas = (_cfg().get("tarifas", {}).get("comercializacion") or {})
-    vt = tarifas.get("valor_kWh", 0.0)
-    return {"consumo_kWh": float(consumo_kWh), "valor_unitario_kWh": float(vt)}
+    return {"consumo_kWh": float(consumo_kWh), "valor_unitario_kWh": cfg.tarifa("comercializacion", 0.0)}
 
 # Mapa de builders para cada componente
 _BUILDERS = {
@@ -161,39 +260,172 @@ _BUILDERS = {
     "R": _payload_restricciones,
     "C": _payload_comercializacion,
 }
+# Estos payloads no dependen del consumo: se construyen (y se hashean) una
+# sola vez por versión de configuración.
+_PAYLOADS_FIJOS = ("G", "T", "D", "R")
+
+def _huella(payload: Any) -> str:
+    """Hash estable del payload (independiente del orden de las claves)."""
+    canonico = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(canonico.encode("utf-8")).hexdigest()
+
+
+def _compilar_payloads(cfg: ConfiguracionNormativa) -> Dict[str, Tuple[Any, str]]:
+    fijos = {}
+    for nombre in _PAYLOADS_FIJOS:
+        payload = _BUILDERS[nombre](cfg, 0.0)
+        fijos[nombre] = (payload, _huella(payload))
+    return fijos
+
+
+def construir_payload(nombre: str, consumo_kWh: float, cfg: Optional[ConfiguracionNormativa] = None) -> Tuple[Any, str]:
+    """(payload, huella) del componente para el snapshot `cfg`."""
+    cfg = cfg or _cfg()
+    if nombre in _PAYLOADS_FIJOS:
+        return cfg.derivado("tarifa_total.payloads", _compilar_payloads)[nombre]
+    payload = _BUILDERS[nombre](cfg, consumo_kWh)
+    return payload, _huella(payload)
+
+
+async def _consultar_remoto(nombre: str, payload: Any) -> float:
+    """
+    Resultado del componente: POST al microservicio o, en modo local, llamada
+    directa a su motor. Lanza excepción ante cualquier fallo (no se cachea).
+    """
+    if modo_local():
+        data = await motores_locales.calcular(nombre, payload)
+    else:
+        resp = await pool_http.post(URLS[nombre], json=payload, headers=cabeceras_contexto())
+        resp.raise_for_status()
+        data = resp.json()
+    campo = CAMPOS[nombre]
+    valor = data.get("datos", {}).get(campo, 0)
+    return float(valor)
+
+
+def valor_respaldo(nombre: str, cfg: Optional[ConfiguracionNormativa] = None) -> float:
+    """Valor a usar cuando un componente no responde dentro del plazo."""
+    if POLITICA_RESPALDO.get(nombre) == "cero":
+        return 0.0
+    return (cfg or _cfg()).tarifa(_TARIFA_CONFIG[nombre], 0.0)
+
 
 # =====================================================
-# 🔁 Consulta con reintentos y logs
+# 🔁 Consulta con plazo y logs
 # =====================================================
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-async def consultar_servicio(nombre: str, consumo_kWh: float) -> float:
+async def consultar_servicio(
+    nombre: str,
+    consumo_kWh: float,
+    plazo: Optional[Plazo] = None,
+    cfg: Optional[ConfiguracionNormativa] = None,
+) -> ResultadoComponente:
     """
     Consulta un microservicio con payload construido desde el JSON.
     Si falta info en JSON, cae a fallbacks estables.
+    El resultado se cachea por (componente, hash del payload) y las
+    consultas concurrentes idénticas comparten una sola llamada.
+    La llamada pasa por el interruptor del componente, con reintentos y
+    cobertura dentro del plazo (ver resiliencia.py).
+    Si el plazo se agota, el interruptor está abierto o la llamada falla,
+    aplica la política de respaldo del componente (por defecto, el último
+    valor válido marcado como obsoleto) y marca el resultado como degradado.
+    La llamada en curso sigue en segundo plano y, si termina bien, deja el
+    valor en caché.
     """
+    inicio = time.perf_counter()
+    plazo = plazo or Plazo()
+    cfg = cfg or _cfg()
+    huella = None
     try:
-        payload = _BUILDERS[nombre](consumo_kWh)
-        async with httpx.AsyncClient(timeout=8) as client:
-            resp = await client.post(URLS[nombre], json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            campo = CAMPOS[nombre]
-            valor = data.get("datos", {}).get(campo, 0)
-            return float(valor)
+        payload, huella = construir_payload(nombre, consumo_kWh, cfg)
+        valor = await asyncio.wait_for(
+            caches_componentes[nombre].obtener(
+                huella, lambda: resiliencia.llamar(nombre, lambda: _consultar_remoto(nombre, payload), plazo.restante)
+            ),
+            timeout=plazo.restante(),
+        )
+        return _medido(nombre, inicio, ResultadoComponente(valor))
+    except asyncio.TimeoutError:
+        motivo = f"plazo agotado ({plazo.segundos}s)"
+    except CircuitoAbierto as e:
+        motivo = str(e)
+    except httpx.HTTPStatusError as e:
+        motivo = f"HTTP {e.response.status_code}"
     except Exception as e:
-        logger.warning(f"⚠️  Error consultando {nombre}: {e}")
-        return 0.0
+        motivo = f"error: {type(e).__name__}: {e}"
+
+    politica = POLITICA_RESPALDO.get(nombre)
+    ultimo = caches_componentes[nombre].obtener_obsoleto(huella) if huella and politica == "ultimo_valido" else None
+    if ultimo is not None:
+        valor, edad = ultimo
+        logger.warning("⚠️  %s degradado (%s); último valor válido (hace %.0fs) = %s", nombre, motivo, edad, valor)
+        return _medido(nombre, inicio, ResultadoComponente(valor, degradado=True, motivo=f"{motivo}; último valor válido de hace {edad:.0f}s", obsoleto=True))
+
+    valor = valor_respaldo(nombre, cfg)
+    logger.warning("⚠️  %s degradado (%s); respaldo '%s' = %s", nombre, motivo, politica, valor)
+    return _medido(nombre, inicio, ResultadoComponente(valor, degradado=True, motivo=motivo))
+
+
+def _medido(nombre: str, inicio: float, resultado: ResultadoComponente) -> ResultadoComponente:
+    """Registra la latencia del componente en el fan-out (ok / obsoleto / degradado)."""
+    etiqueta = "obsoleto" if resultado.obsoleto else ("degradado" if resultado.degradado else "ok")
+    metricas.observar_componente(nombre, etiqueta, time.perf_counter() - inicio)
+    return resultado
+
+
+async def _consultar_precio_xm(fecha: Optional[date] = None) -> Tuple[float, str]:
+    if modo_local():
+        valor, fuente = await motores_locales.precio_xm(fecha)
+        data = {"valor_kWh": valor, "fuente": fuente}
+    else:
+        params = {"fecha": fecha.isoformat()} if fecha else None
+        # Revalida con el ETag anterior: si el PBND no cambió, 304 sin cuerpo
+        data = await pool_http.get_json_condicional(URL_PRECIO_XM, params=params, timeout=10.0, headers=cabeceras_contexto())
+    valor = float(data.get("valor_kWh", 0))
+    # Validar si el valor obtenido es real (>0); un valor inválido no se cachea
+    if valor <= 0:
+        raise ValueError("API XM respondió 200 pero sin datos válidos.")
+    return valor, data.get("fuente", "XM")
+
+
+async def obtener_precio_xm(plazo: Optional[Plazo] = None, fecha: Optional[date] = None) -> Tuple[float, str]:
+    """
+    PBND vigente según el microservicio de generación: (valor, fuente).
+    Con `fecha`, el PBND de ese día. Comparte la caché (y el TTL) del
+    componente G. Lanza excepción si no hay un valor válido dentro del plazo.
+    """
+    plazo = plazo or Plazo()
+    clave = _CLAVE_PRECIO_XM if fecha is None else (_CLAVE_PRECIO_XM, fecha.isoformat())
+    return await asyncio.wait_for(
+        caches_componentes["G"].obtener(
+            clave, lambda: resiliencia.llamar("precio_xm", lambda: _consultar_precio_xm(fecha), plazo.restante)
+        ),
+        timeout=plazo.restante(),
+    )
+
+
+def estadisticas_cache() -> Dict[str, Any]:
+    """Aciertos/fallos por componente para medir el efecto de la caché."""
+    return {nombre: cache.estadisticas() for nombre, cache in caches_componentes.items()}
 
 # =====================================================
 # ⚡ Obtener todos los componentes en paralelo
 # =====================================================
-async def obtener_componentes_en_paralelo(consumo_kWh: float = 1000.0) -> Dict[str, float]:
+async def obtener_componentes_en_paralelo(
+    consumo_kWh: float = 1000.0,
+    plazo: Optional[Plazo] = None,
+    cfg: Optional[ConfiguracionNormativa] = None,
+) -> Dict[str, ResultadoComponente]:
     """
     Consulta todos los servicios simultáneamente y devuelve un dict
-    con los promedios G, T, D, PR, R, C.
+    con los promedios G, T, D, PR, R, C (y si cada uno se degradó).
     - consumo_kWh se usa para construir los payloads de PR y C (y
       puede impactar otros si así lo modelas en el JSON).
+    - plazo es el presupuesto compartido por todas las llamadas.
+    - cfg es el snapshot de configuración de la petición.
     """
-    tareas = [consultar_servicio(nombre, consumo_kWh) for nombre in URLS.keys()]
+    plazo = plazo or Plazo()
+    cfg = cfg or _cfg()
+    tareas = [consultar_servicio(nombre, consumo_kWh, plazo, cfg) for nombre in URLS.keys()]
     resultados = await asyncio.gather(*tareas)
     return dict(zip(URLS.keys(), resultados))
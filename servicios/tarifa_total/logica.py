@@ -1,102 +1,146 @@
 import logging
 import asyncio
-from typing import Dict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from core.calculadora import ConfiguracionNormativa, obtener_configuracion
 from core.utils import redondear, respuesta_estandar
-from clients import obtener_componentes_en_paralelo
-import httpx
+from clients import obtener_componentes_en_paralelo, obtener_precio_xm, Plazo, URL_PRECIO_XM
+from matriz import ErrorMatriz, MatrizTarifas, matriz_para
 
 logger = logging.getLogger(__name__)
 
+# ==========================================================
+# 🔹 RESOLUCIÓN DE COMPONENTES (compartida por auto y lote)
+# ==========================================================
+async def _resolver_componentes(
+    plazo: Plazo, fecha: Optional[date] = None, cfg: Optional[ConfiguracionNormativa] = None
+) -> Dict:
+    """
+    Un solo fan-out: los seis microservicios y el PBND de XM se consultan a la
+    vez, con un plazo global compartido. G se sustituye por el PBND de XM
+    cuando está disponible. Los componentes que no responden a tiempo usan su
+    política de respaldo y se informan como degradados. No depende del consumo.
+    Toda la petición usa un único snapshot de la configuración normativa; con
+    `fecha`, los parámetros vigentes ese día y el PBND de esa fecha.
+    """
+    cfg = (cfg or obtener_configuracion()).en_fecha(fecha)
+    logger.debug("🌐 Consultando componentes y valor G desde %s (plazo %ss) ...", URL_PRECIO_XM, plazo.segundos)
+    resultados, precio_xm = await asyncio.gather(
+        obtener_componentes_en_paralelo(plazo=plazo, cfg=cfg),
+        obtener_precio_xm(plazo, fecha),
+        return_exceptions=True,
+    )
+    if isinstance(resultados, BaseException):
+        raise resultados
+
+    componentes = {nombre: r.valor for nombre, r in resultados.items()}
+    degradados = {nombre: r.motivo for nombre, r in resultados.items() if r.degradado}
+    obsoletos = [nombre for nombre, r in resultados.items() if r.obsoleto]
+    valor_G_final = None
+    fuente_G = None
+    comentario_G = None
+    mensaje = None
+
+    # ==========================================================
+    # 🌐 G desde el microservicio de generación (API XM)
+    # ==========================================================
+    if isinstance(precio_xm, BaseException):
+        logger.warning("⚠️ Error al consultar G desde XM: %r", precio_xm)
+    else:
+        valor_G_final, fuente_G = precio_xm
+        componentes["G"] = valor_G_final
+        degradados.pop("G", None)
+        if "G" in obsoletos:
+            obsoletos.remove("G")
+        logger.debug("✅ Valor G obtenido correctamente desde %s: %s", fuente_G, valor_G_final)
+
+    # ==========================================================
+    # 🔁 Si no se obtuvo valor válido desde XM → usar respaldo local
+    # ==========================================================
+    if valor_G_final is None:
+        valor_G_final = componentes.get("G", 0)
+        fuente_G = "Respaldo local (config.json)"
+        logger.info("🔁 API XM no disponible, usando valor de respaldo: %s", valor_G_final)
+
+    # ==========================================================
+    # 💬 Ajuste de mensajes según fuente de G
+    # ==========================================================
+    if str(fuente_G).lower().startswith("xm"):
+        mensaje = "✅ Cálculo automático completado con G obtenido desde API XM"
+        comentario_G = (
+            f"✅ G obtenido correctamente desde la fuente '{fuente_G}' "
+            f"con valor {valor_G_final} $/kWh"
+        )
+    else:
+        mensaje = "⚠️ Cálculo automático completado con G desde respaldo local (config.json)"
+        comentario_G = (
+            f"⚠️ API XM no disponible o sin datos válidos. "
+            f"Se utilizó el valor de respaldo {valor_G_final} $/kWh desde config.json"
+        )
+
+    if degradados:
+        mensaje += f" | ⚠️ Componentes degradados: {', '.join(degradados)}"
+
+    total_tarifa = sum(componentes.values())
+
+    componentes_detalle = dict(componentes)
+    componentes_detalle["G_valor"] = valor_G_final
+    componentes_detalle["G_fuente"] = fuente_G
+    componentes_detalle["G_comentario"] = comentario_G
+
+    return {
+        "componentes": componentes_detalle,
+        "tarifa_total": total_tarifa,
+        "fuente_G": fuente_G,
+        "mensaje": mensaje,
+        "degradados": degradados,
+        "obsoletos": obsoletos,
+        "version_config": cfg.version,
+        "fecha": fecha.isoformat() if fecha else None,
+        "vigencia": cfg.resumen().get("vigencia"),
+    }
+
+
 # ==========================================================
 # 🔹 CÁLCULO AUTOMÁTICO (PRODUCCIÓN)
 # ==========================================================
-async def calcular_tarifa_total_automatica(consumo_kWh: float) -> Dict:
+async def calcular_tarifa_total_automatica(
+    consumo_kWh: float, plazo_s: Optional[float] = None, fecha: Optional[date] = None
+) -> Dict:
     """
     Calcula la tarifa total consultando microservicios en paralelo.
     Si 'G' proviene de XM, se indica explícitamente.
     Si falla, se usa el valor de respaldo del config.json.
+    Con `fecha` se aplica la normativa vigente ese día (re-liquidaciones).
     """
     try:
-        logger.info("🚀 Iniciando cálculo automático (modo producción)...")
+        logger.debug("🚀 Iniciando cálculo automático (modo producción)...")
 
-        componentes = await obtener_componentes_en_paralelo()
-        valor_G_final = None
-        fuente_G = None
-        comentario_G = None
-        mensaje = None
-
-        # ==========================================================
-        # 🌐 Intentar obtener G desde el microservicio de generación (API XM)
-        # ==========================================================
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                logger.info("🌐 Consultando valor G desde http://generacion:8001/generacion/precio-xm ...")
-                r = await client.get("http://generacion:8001/generacion/precio-xm")
-
-                if r.status_code == 200:
-                    data = r.json()
-                    valor_G_api = float(data.get("valor_kWh", 0))
-                    fuente_G_api = data.get("fuente", "XM")
-
-                    # Validar si el valor obtenido es real (>0)
-                    if valor_G_api > 0:
-                        valor_G_final = valor_G_api
-                        fuente_G = fuente_G_api
-                        componentes["G"] = valor_G_final
-                        logger.info(f"✅ Valor G obtenido correctamente desde {fuente_G}: {valor_G_final}")
-                    else:
-                        logger.warning("⚠️ API XM respondió 200 pero sin datos válidos.")
-        except Exception as e:
-            logger.warning(f"⚠️ Error al consultar G desde XM: {e}")
-
-        # ==========================================================
-        # 🔁 Si no se obtuvo valor válido desde XM → usar respaldo local
-        # ==========================================================
-        if valor_G_final is None:
-            valor_G_final = componentes.get("G", 0)
-            fuente_G = "Respaldo local (config.json)"
-            logger.info(f"🔁 API XM no disponible, usando valor de respaldo: {valor_G_final}")
-
-        # ==========================================================
-        # 💬 Ajuste de mensajes según fuente de G
-        # ==========================================================
-        if str(fuente_G).lower().startswith("xm"):
-            mensaje = "✅ Cálculo automático completado con G obtenido desde API XM"
-            comentario_G = (
-                f"✅ G obtenido correctamente desde la fuente '{fuente_G}' "
-                f"con valor {valor_G_final} $/kWh"
-            )
-        else:
-            mensaje = "⚠️ Cálculo automático completado con G desde respaldo local (config.json)"
-            comentario_G = (
-                f"⚠️ API XM no disponible o sin datos válidos. "
-                f"Se utilizó el valor de respaldo {valor_G_final} $/kWh desde config.json"
-            )
+        resuelto = await _resolver_componentes(Plazo(plazo_s), fecha)
 
         # ==========================================================
         # 💰 Cálculo de tarifa total
         # ==========================================================
-        total_tarifa = sum(componentes.values())
+        total_tarifa = resuelto["tarifa_total"]
         total_costo = redondear(total_tarifa * consumo_kWh, 2)
-        logger.info(f"💰 Tarifa total = {total_tarifa} | Costo = {total_costo}")
-
-        # ==========================================================
-        # 🧾 Estructurar respuesta final
-        # ==========================================================
-        componentes_detalle = dict(componentes)
-        componentes_detalle["G_valor"] = valor_G_final
-        componentes_detalle["G_fuente"] = fuente_G
-        componentes_detalle["G_comentario"] = comentario_G
+        logger.debug("💰 Tarifa total = %s | Costo = %s", total_tarifa, total_costo)
 
         # ==========================================================
         # ✅ Respuesta estándar
         # ==========================================================
-        return respuesta_estandar(True, mensaje, {
-            "componentes": componentes_detalle,
+        return respuesta_estandar(True, resuelto["mensaje"], {
+            "componentes": resuelto["componentes"],
             "tarifa_total_$por_kWh": redondear(total_tarifa, 2),
             "consumo_kWh": consumo_kWh,
             "costo_total_$": total_costo,
-            "fuente_G": fuente_G
+            "fuente_G": resuelto["fuente_G"],
+            "componentes_degradados": list(resuelto["degradados"]),
+            "detalle_degradados": resuelto["degradados"],
+            "componentes_obsoletos": resuelto["obsoletos"],
+            "version_config": resuelto["version_config"],
+            "fecha": resuelto["fecha"],
+            "vigencia": resuelto["vigencia"],
         })
 
     except Exception as e:
@@ -104,6 +148,224 @@ async def calcular_tarifa_total_automatica(consumo_kWh: float) -> Dict:
         return respuesta_estandar(False, f"Error interno: {str(e)}", {})
 
 
+# ==========================================================
+# 🔹 CÁLCULO POR LOTE (FACTURACIÓN MASIVA)
+# ==========================================================
+def validar_consumos_lote(consumos: np.ndarray) -> None:
+    """Rechaza consumos negativos o no finitos indicando las filas afectadas."""
+    invalidas = np.flatnonzero(~np.isfinite(consumos) | (consumos < 0))
+    if invalidas.size:
+        muestra = ", ".join(str(i) for i in invalidas[:10])
+        raise ValueError(f"{invalidas.size} consumos inválidos (negativos o no numéricos); filas: {muestra}")
+
+
+def _agrupar_por_fecha(fechas: Sequence[Optional[date]]) -> "tuple[List[Optional[date]], np.ndarray]":
+    """Fechas distintas del lote (None = sin fecha) y, por fila, el índice de su grupo."""
+    ordinales = np.fromiter((f.toordinal() if f else 0 for f in fechas), dtype=np.int64, count=len(fechas))
+    unicos, grupo = np.unique(ordinales, return_inverse=True)
+    return [date.fromordinal(int(o)) if o else None for o in unicos], grupo
+
+
+async def calcular_tarifa_lote(
+    consumos_kWh: Sequence[float],
+    plazo_s: Optional[float] = None,
+    fecha: Optional[date] = None,
+    fechas: Optional[Sequence[Optional[date]]] = None,
+    celdas: Optional[Sequence[Optional[Tuple[Any, Any, Any]]]] = None,
+) -> Dict:
+    """
+    Calcula la tarifa para muchos consumos con una sola consulta a los
+    microservicios: los valores unitarios G/T/D/PR/R/C no dependen del
+    consumo, así que se resuelven una vez y los costos se obtienen en una
+    única pasada vectorizada. Los costos se devuelven en el mismo orden.
+
+    Con `fechas` (una por fila; None usa `fecha`) el lote puede abarcar varios
+    periodos: los componentes se resuelven una vez por fecha distinta, en el
+    mismo fan-out y con el mismo snapshot de configuración.
+
+    Con `celdas` ((estrato, zona, nivel_tension) por fila; None si la fila no
+    las trae) esas filas se valoran en la matriz de su fecha, con subsidio o
+    contribución y cargo por nivel, igual que /tarifa/calcular/cliente.
+    Lanza ErrorMatriz si alguna combinación no existe.
+    """
+    consumos = np.asarray(consumos_kWh, dtype=np.float64)
+    validar_consumos_lote(consumos)
+    if fechas is not None and len(fechas) != consumos.size:
+        raise ValueError(f"'fechas' tiene {len(fechas)} elementos y hay {consumos.size} consumos")
+
+    plazo = Plazo(plazo_s)
+    cfg = obtener_configuracion()
+    if fechas is None:
+        distintas, grupo = [fecha], np.zeros(consumos.size, dtype=np.int64)
+    else:
+        distintas, grupo = _agrupar_por_fecha([f or fecha for f in fechas])
+    resueltos = await asyncio.gather(*(_resolver_componentes(plazo, f, cfg) for f in distintas))
+
+    tarifas = np.array([r["tarifa_total"] for r in resueltos], dtype=np.float64)
+    costos = np.round(consumos * tarifas[grupo], 2)
+    subsidios = None
+    if celdas is not None and any(c is not None for c in celdas):
+        if len(celdas) != consumos.size:
+            raise ValueError(f"'celdas' tiene {len(celdas)} elementos y hay {consumos.size} consumos")
+        subsidios = _valorar_en_matriz(cfg, distintas, resueltos, grupo, consumos, celdas, costos)
+    degradados, obsoletos = {}, set()
+    for r in resueltos:
+        degradados.update(r["degradados"])
+        obsoletos.update(r["obsoletos"])
+    logger.info("📦 Lote de %s consumos calculado | %s fecha(s) distinta(s)", consumos.size, len(resueltos))
+
+    datos = {
+        "mensaje": resueltos[0]["mensaje"],
+        "componentes_degradados": list(degradados),
+        "detalle_degradados": degradados,
+        "componentes_obsoletos": sorted(obsoletos),
+        "version_config": cfg.version,
+        "filas": int(consumos.size),
+        "consumo_total_kWh": redondear(float(consumos.sum()), 4),
+        "costo_total_lote_$": redondear(float(costos.sum()), 2),
+        "costos_total_$": costos.tolist(),
+    }
+    if len(resueltos) == 1:
+        r = resueltos[0]
+        datos.update({
+            "componentes": r["componentes"],
+            "tarifa_total_$por_kWh": redondear(r["tarifa_total"], 2),
+            "fuente_G": r["fuente_G"],
+            "fecha": r["fecha"],
+            "vigencia": r["vigencia"],
+        })
+    else:
+        datos["mensaje"] = f"Lote calculado con {len(resueltos)} fechas distintas"
+    if subsidios is not None:
+        # Tarifa efectiva por fila: la de la matriz (con subsidio / contribución) o la suma de componentes
+        con_celda = ~np.isnan(subsidios)
+        efectivas = np.round(tarifas, 2)[grupo]
+        filas = np.flatnonzero(con_celda & (consumos > 0))
+        efectivas[filas] = np.round(costos[filas] / consumos[filas], 4)
+        datos["tarifas_$por_kWh"] = efectivas.tolist()
+        datos["subsidios_contribucion_$"] = [None if np.isnan(v) else v for v in subsidios.tolist()]
+        datos["filas_con_matriz"] = int(con_celda.sum())
+        datos["subsidio_contribucion_lote_$"] = redondear(float(np.nansum(subsidios)), 2)
+    elif len(resueltos) > 1:
+        datos["tarifas_$por_kWh"] = np.round(tarifas, 2)[grupo].tolist()
+    if len(resueltos) > 1:
+        datos["por_fecha"] = {
+            r["fecha"] or "vigente": {
+                "componentes": r["componentes"],
+                "tarifa_total_$por_kWh": redondear(r["tarifa_total"], 2),
+                "fuente_G": r["fuente_G"],
+                "vigencia": r["vigencia"],
+                "componentes_degradados": list(r["degradados"]),
+            }
+            for r in resueltos
+        }
+    return datos
+
+
+def _valorar_en_matriz(
+    cfg: ConfiguracionNormativa,
+    fechas: List[Optional[date]],
+    resueltos: List[Dict],
+    grupo: np.ndarray,
+    consumos: np.ndarray,
+    celdas: Sequence[Optional[Tuple[Any, Any, Any]]],
+    costos: np.ndarray,
+) -> np.ndarray:
+    """
+    Revalora en `costos` (en su sitio) las filas con celda, con la matriz de su
+    fecha: índices una vez por combinación distinta y un gather por fecha.
+    Devuelve el subsidio (< 0) o contribución (> 0) por fila; NaN sin celda.
+    """
+    matrices = [
+        matriz_para(cfg.en_fecha(f), _componentes_matriz(r), _origen_matriz(r))
+        for f, r in zip(fechas, resueltos)
+    ]
+    indices = np.zeros((consumos.size, 3), dtype=np.intp)
+    con_celda = np.zeros(consumos.size, dtype=bool)
+    vistos: Dict[Tuple, Tuple[int, int, int]] = {}
+    for i, celda in enumerate(celdas):
+        if celda is None:
+            continue
+        clave = (int(grupo[i]), *celda)
+        celda_i = vistos.get(clave)
+        if celda_i is None:
+            try:
+                celda_i = vistos[clave] = matrices[clave[0]].indices(*celda)
+            except ErrorMatriz as e:
+                raise ErrorMatriz(f"cliente {i}: {e}") from None
+        indices[i] = celda_i
+        con_celda[i] = True
+
+    subsidios = np.full(consumos.size, np.nan)
+    for g, matriz in enumerate(matrices):
+        filas = np.flatnonzero(con_celda & (grupo == g))
+        if filas.size == 0:
+            continue
+        i_estrato, i_zona, i_nivel = indices[filas].T
+        costos[filas] = matriz.costos(consumos[filas], i_estrato, i_zona, i_nivel)
+        plenos = np.round(consumos[filas] * matriz.costo_unitario[i_zona, i_nivel], 2)
+        subsidios[filas] = np.round(costos[filas] - plenos, 2)
+    return subsidios
+
+
+# ==========================================================
+# 🔹 MATRIZ ESTRATO × ZONA × NIVEL (ver matriz.py)
+# ==========================================================
+def _componentes_matriz(resuelto: Dict) -> Dict[str, float]:
+    return {k: v for k, v in resuelto["componentes"].items() if k in ("G", "T", "D", "PR", "R", "C")}
+
+
+def _origen_matriz(resuelto: Dict) -> Dict:
+    return {
+        "componentes": _componentes_matriz(resuelto),
+        "version_config": resuelto["version_config"],
+        "vigencia": resuelto["vigencia"],
+    }
+
+
+async def obtener_matriz_tarifas(
+    plazo_s: Optional[float] = None, fecha: Optional[date] = None
+) -> "tuple[MatrizTarifas, Dict]":
+    """
+    (matriz, componentes resueltos) del periodo. El fan-out es el mismo de
+    /auto (con caché); la matriz solo se reconstruye si cambió la
+    configuración o algún valor de componente.
+    """
+    cfg = obtener_configuracion()
+    resuelto = await _resolver_componentes(Plazo(plazo_s), fecha, cfg)
+    return matriz_para(cfg.en_fecha(fecha), _componentes_matriz(resuelto), _origen_matriz(resuelto)), resuelto
+
+
+async def calcular_tarifa_cliente(
+    consumo_kWh: float,
+    estrato: int,
+    zona: str,
+    nivel_tension: str,
+    plazo_s: Optional[float] = None,
+    fecha: Optional[date] = None,
+) -> Dict:
+    """
+    Tarifa de un cliente con subsidio o contribución de su estrato: celda
+    de la matriz × consumo. Lanza ErrorMatriz si la combinación no existe.
+    """
+    matriz, resuelto = await obtener_matriz_tarifas(plazo_s, fecha)
+    liquidacion = matriz.liquidar(consumo_kWh, estrato, zona, nivel_tension)
+    return respuesta_estandar(True, resuelto["mensaje"], {
+        "consumo_kWh": consumo_kWh,
+        "estrato": estrato,
+        "zona": zona,
+        "nivel_tension": nivel_tension,
+        **liquidacion,
+        "componentes": resuelto["componentes"],
+        "fuente_G": resuelto["fuente_G"],
+        "componentes_degradados": list(resuelto["degradados"]),
+        "componentes_obsoletos": resuelto["obsoletos"],
+        "version_config": resuelto["version_config"],
+        "fecha": resuelto["fecha"],
+        "vigencia": resuelto["vigencia"],
+    })
+
+
 # ==========================================================
 # 🔹 CÁLCULO MANUAL (DEBUG Y PRUEBAS)
 # ==========================================================
@@ -114,7 +376,7 @@ def calcular_tarifa_total(componentes: Dict[str, float], consumo_kWh: float) ->
     try:
         total_tarifa = sum(componentes.values())
         total_costo = redondear(total_tarifa * consumo_kWh, 2)
-        logger.info(f"🧮 Cálculo manual: {componentes} → total {total_tarifa}")
+        logger.debug("🧮 Cálculo manual: %s → total %s", componentes, total_tarifa)
 
         return respuesta_estandar(True, "Cálculo manual exitoso", {
             "metodo": "suma_directa",
@@ -1,16 +1,53 @@
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field, model_validator
+from datetime import date
+from typing import List, Optional
 import asyncio
-from logica import calcular_tarifa_total, calcular_tarifa_total_automatica
+from core.calculadora import ErrorConfiguracion, obtener_configuracion, recargar_configuracion
+from core.utils import respuesta_estandar
+from logica import (
+    calcular_tarifa_cliente, calcular_tarifa_lote, calcular_tarifa_total, calcular_tarifa_total_automatica,
+    obtener_matriz_tarifas,
+)
+from matriz import ErrorMatriz
+from modelo import DatosEntrada
+from core.http_condicional import max_age_entorno, respuesta_condicional
+from core.aplicacion import crear_app
+from clients import pool_http, estadisticas_cache, modo_local
+import motores_locales
+import resiliencia
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
+# max-age (s) de las lecturas con GET condicional; una recarga de la
+# configuración o un componente nuevo se ven, a más tardar, tras este plazo
+MAX_AGE_MATRIZ = max_age_entorno("matriz", 60)
+MAX_AGE_CONFIG = max_age_entorno("config", 60)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un único pool keep-alive por proceso para todo el fan-out
+    await pool_http.abrir()
+    if modo_local():
+        logger.info("🧩 Modo local: motores de componentes en proceso (sin HTTP)")
+        motores_locales.cargar_todos()
+    obtener_configuracion()
+    try:
+        yield
+    finally:
+        await pool_http.cerrar()
+        await motores_locales.cerrar()
+
+
+app = crear_app(
+    "tarifa_total",
     title="Microservicio Tarifa Total (Async)",
     description="Calcula la tarifa eléctrica total consultando microservicios en paralelo",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan
 )
 
 class TarifaRequest(BaseModel):
@@ -19,6 +56,49 @@ class TarifaRequest(BaseModel):
 
 class TarifaAutoRequest(BaseModel):
     consumo_kWh: float
+    plazo_s: Optional[float] = Field(None, gt=0, le=30, description="Plazo global del fan-out (s)")
+    fecha: Optional[date] = Field(None, description="Fecha de aplicación de la normativa (por defecto, la vigente)")
+
+class TarifaClienteRequest(DatosEntrada):
+    plazo_s: Optional[float] = Field(None, gt=0, le=30, description="Plazo global del fan-out (s)")
+    fecha: Optional[date] = Field(None, description="Fecha de aplicación de la normativa (por defecto, la vigente)")
+
+class ClienteLote(BaseModel):
+    consumo_kWh: float
+    id: Optional[str] = None
+    estrato: Optional[int] = Field(None, ge=1, le=6)
+    zona: Optional[str] = None
+    nivel_tension: Optional[str] = None
+    fecha: Optional[date] = None
+
+    @model_validator(mode="after")
+    def _celda_completa(self):
+        # Con estrato, zona y nivel la fila se valora en la matriz; a medias sería ambiguo
+        dados = [v is not None for v in (self.estrato, self.zona, self.nivel_tension)]
+        if any(dados) and not all(dados):
+            raise ValueError("'estrato', 'zona' y 'nivel_tension' van juntos (o ninguno)")
+        return self
+
+    def celda(self) -> Optional[tuple]:
+        return None if self.estrato is None else (self.estrato, self.zona, self.nivel_tension)
+
+class TarifaLoteRequest(BaseModel):
+    """Lote de consumos: columnar (`consumos_kWh`) o por filas (`clientes`)."""
+    consumos_kWh: Optional[List[float]] = None
+    fechas: Optional[List[Optional[date]]] = Field(None, description="Fecha por consumo (formato columnar)")
+    clientes: Optional[List[ClienteLote]] = None
+    fecha: Optional[date] = Field(None, description="Fecha por defecto de todo el lote")
+    plazo_s: Optional[float] = Field(None, gt=0, le=30, description="Plazo global del fan-out (s)")
+
+    @model_validator(mode="after")
+    def _un_solo_formato(self):
+        if self.consumos_kWh is None and self.clientes is None:
+            raise ValueError("Falta el lote: envíe 'consumos_kWh' (columnar) o 'clientes' (por filas)")
+        if self.consumos_kWh is not None and self.clientes is not None:
+            raise ValueError("Envíe 'consumos_kWh' (columnar) o 'clientes' (por filas), no ambos")
+        if self.fechas is not None and self.clientes is not None:
+            raise ValueError("'fechas' acompaña a 'consumos_kWh'; por filas use 'clientes[].fecha'")
+        return self
 
 
 @app.get("/")
@@ -34,6 +114,118 @@ def calcular_manual(req: TarifaRequest):
 @app.post("/tarifa/calcular/auto")
 async def calcular_automatico(req: TarifaAutoRequest):
     try:
-        return await calcular_tarifa_total_automatica(req.consumo_kWh)
+        return await calcular_tarifa_total_automatica(req.consumo_kWh, req.plazo_s, req.fecha)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/tarifa/calcular/lote")
+async def calcular_lote(req: TarifaLoteRequest):
+    """
+    Calcula la tarifa de muchos consumos con un único fan-out a los microservicios.
+    Los resultados conservan el orden de entrada: lista `costos_total_$` para el
+    formato columnar o `resultados` (con los atributos del cliente) por filas.
+    Las filas con estrato, zona y nivel de tensión se valoran en la matriz
+    (subsidio o contribución y cargo por nivel), como /tarifa/calcular/cliente.
+    """
+    celdas = None
+    if req.clientes is None:
+        consumos, fechas = req.consumos_kWh, req.fechas
+    else:
+        consumos = [c.consumo_kWh for c in req.clientes]
+        fechas = [c.fecha for c in req.clientes] if any(c.fecha for c in req.clientes) else None
+        celdas = [c.celda() for c in req.clientes]
+    try:
+        datos = await calcular_tarifa_lote(consumos, req.plazo_s, req.fecha, fechas, celdas)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.exception("Error en cálculo por lote:")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    mensaje = datos.pop("mensaje")
+    if req.clientes is not None:
+        costos = datos.pop("costos_total_$")
+        datos["resultados"] = [
+            {**c.model_dump(mode="json", exclude_none=True), "costo_total_$": costo}
+            for c, costo in zip(req.clientes, costos)
+        ]
+        if "tarifas_$por_kWh" in datos:
+            for fila, tarifa in zip(datos["resultados"], datos.pop("tarifas_$por_kWh")):
+                fila["tarifa_total_$por_kWh"] = tarifa
+        if "subsidios_contribucion_$" in datos:
+            for fila, subsidio in zip(datos["resultados"], datos.pop("subsidios_contribucion_$")):
+                if subsidio is not None:
+                    fila["subsidio_contribucion_$"] = subsidio
+    return respuesta_estandar(True, mensaje, datos)
+
+
+@app.post("/tarifa/calcular/cliente")
+async def calcular_cliente(req: TarifaClienteRequest):
+    """
+    Tarifa de un cliente por estrato, zona y nivel de tensión (con subsidio o
+    contribución): una búsqueda en la matriz materializada y una multiplicación.
+    """
+    try:
+        return await calcular_tarifa_cliente(req.consumo, req.estrato, req.zona, req.nivel_tension, req.plazo_s, req.fecha)
+    except ErrorMatriz as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.exception("Error en cálculo por cliente:")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/tarifa/matriz")
+async def matriz_tarifas(request: Request, fecha: Optional[date] = None):
+    """
+    Matriz completa estrato × zona × nivel de tensión ($/kWh hasta y sobre el
+    consumo de subsistencia) para que otros sistemas la guarden y liquiden solos.
+    Admite GET condicional (ETag / If-None-Match → 304).
+    """
+    matriz, resuelto = await obtener_matriz_tarifas(fecha=fecha)
+    datos = matriz.como_dict()
+    datos.update({
+        "fuente_G": resuelto["fuente_G"],
+        "componentes_degradados": list(resuelto["degradados"]),
+        "componentes_obsoletos": resuelto["obsoletos"],
+        "fecha": resuelto["fecha"],
+    })
+    return respuesta_condicional(request, respuesta_estandar(True, resuelto["mensaje"], datos), max_age=MAX_AGE_MATRIZ)
+
+
+@app.get("/tarifa/pool")
+def estado_pool():
+    """Estadísticas del pool HTTP compartido (conexiones en uso, ociosas y en espera)."""
+    return pool_http.estadisticas()
+
+
+@app.get("/tarifa/cache")
+def estado_cache():
+    """Aciertos, fallos y peticiones coalescidas de la caché de componentes."""
+    return estadisticas_cache()
+
+
+@app.get("/tarifa/resiliencia")
+def estado_resiliencia():
+    """Estado de los interruptores por componente, p95 de latencia y peticiones de cobertura."""
+    return resiliencia.estadisticas()
+
+
+@app.get("/config")
+def estado_config(request: Request):
+    """Versión de la configuración normativa en uso (con GET condicional)."""
+    return respuesta_condicional(request, obtener_configuracion().resumen(), max_age=MAX_AGE_CONFIG)
+
+
+@app.post("/config/reload")
+def recargar_config():
+    """
+    Relee normativa_config.json y publica la nueva versión. Las peticiones
+    en curso terminan con la versión con la que empezaron; si el archivo
+    no es válido se conserva la anterior (422).
+    """
+    try:
+        cfg = recargar_configuracion()
+    except ErrorConfiguracion as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return respuesta_estandar(True, f"Configuración normativa versión {cfg.version}", cfg.resumen())
@@ -0,0 +1,234 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from core.calculadora import ConfiguracionNormativa
+from core.utils import redondear
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Matriz de tarifas estrato × zona × nivel de tensión
+#     Con los componentes de un periodo ya resueltos, todas las
+#     combinaciones (6 estratos × zonas × niveles) se calculan
+#     de una vez; atender un cliente es buscar su celda y
+#     multiplicar por el consumo.
+#
+#     Costo unitario de (zona, nivel) = G + D + PR + R + C + cargo de
+#     transmisión de la celda (cargos_por_nivel × factor_geografico,
+#     franja neutra), que sustituye al T resuelto: es el mismo costo
+#     unitario que transmisión toma de su tabla (tabla_cargos.py) para
+#     una línea de ese nivel y región. Por estrato:
+#       - subsidio (porcentaje < 0): solo sobre el consumo hasta el
+#         de subsistencia de la zona; el excedente paga el costo unitario.
+#       - contribución (porcentaje > 0): sobre todo el consumo.
+# ==========================================================
+ESTRATOS = (1, 2, 3, 4, 5, 6)
+MAX_MATRICES = 32          # periodos / valores de componentes recientes en memoria
+
+
+class ErrorMatriz(ValueError):
+    """Estrato, zona o nivel de tensión sin celda en la matriz."""
+
+
+def _clave_nivel(valor: Any) -> str:
+    """1, "1", "NT1" y "nt1" → "NT1" (como modelo.DatosEntrada)."""
+    texto = str(valor).strip().upper()
+    return texto if texto.startswith("NT") else f"NT{texto}"
+
+
+@dataclass(frozen=True)
+class MatrizTarifas:
+    zonas: Tuple[str, ...]
+    niveles: Tuple[str, ...]                 # "NT1", "NT2", …
+    costo_unitario: np.ndarray               # (zona, nivel) $/kWh sin subsidio ni contribución
+    porcentajes: np.ndarray                  # (estrato,) subsidio < 0 < contribución
+    tarifa_subsistencia: np.ndarray          # (estrato, zona, nivel) $/kWh hasta el límite
+    tarifa_excedente: np.ndarray             # (estrato, zona, nivel) $/kWh sobre el límite
+    subsistencia_kWh: np.ndarray             # (zona,) consumo de subsistencia
+    limite_kWh: np.ndarray                   # (estrato, zona); inf si el estrato no tiene subsidio
+    origen: Dict[str, Any] = field(default_factory=dict, compare=False)   # componentes, fuente G, versión…
+
+    def indices(self, estrato: Any, zona: Any, nivel: Any) -> Tuple[int, int, int]:
+        try:
+            i_estrato = ESTRATOS.index(int(estrato))
+        except (TypeError, ValueError):
+            raise ErrorMatriz(f"estrato '{estrato}' fuera de 1–6") from None
+        clave_zona = str(zona).strip().lower()
+        if clave_zona not in self.zonas:
+            raise ErrorMatriz(f"zona '{zona}' sin tarifa (válidas: {', '.join(self.zonas)})")
+        clave_nivel = _clave_nivel(nivel)
+        if clave_nivel not in self.niveles:
+            raise ErrorMatriz(f"nivel_tension '{nivel}' sin tarifa (válidos: {', '.join(self.niveles)})")
+        return i_estrato, self.zonas.index(clave_zona), self.niveles.index(clave_nivel)
+
+    def costos(self, consumos: Any, i_estrato: Any, i_zona: Any, i_nivel: Any) -> np.ndarray:
+        """Costo de cada consumo en su celda (índices escalares o columnas), redondeado a centavos."""
+        consumos = np.asarray(consumos, dtype=np.float64)
+        limite = self.limite_kWh[i_estrato, i_zona]
+        hasta = np.minimum(consumos, limite)
+        return np.round(
+            hasta * self.tarifa_subsistencia[i_estrato, i_zona, i_nivel]
+            + (consumos - hasta) * self.tarifa_excedente[i_estrato, i_zona, i_nivel],
+            2,
+        )
+
+    def liquidar(self, consumo: float, estrato: Any, zona: Any, nivel: Any) -> Dict[str, Any]:
+        i = self.indices(estrato, zona, nivel)
+        costo = float(self.costos(consumo, *i))
+        porcentaje = float(self.porcentajes[i[0]])
+        limite = float(self.limite_kWh[i[0], i[1]])
+        costo_pleno = redondear(consumo * float(self.costo_unitario[i[1], i[2]]), 2)
+        return {
+            "costo_unitario_$por_kWh": redondear(float(self.costo_unitario[i[1], i[2]]), 4),
+            "tarifa_subsistencia_$por_kWh": redondear(float(self.tarifa_subsistencia[i]), 4),
+            "tarifa_excedente_$por_kWh": redondear(float(self.tarifa_excedente[i]), 4),
+            "porcentaje_estrato": porcentaje,
+            "consumo_subsistencia_kWh": None if np.isinf(limite) else limite,
+            "costo_total_$": costo,
+            "subsidio_contribucion_$": redondear(costo - costo_pleno, 2),
+        }
+
+    def como_dict(self) -> Dict[str, Any]:
+        """Matriz completa para sistemas que la cachean: estrato → zona → nivel."""
+        celdas = {
+            str(estrato): {
+                zona: {
+                    nivel: {
+                        "subsistencia_$por_kWh": round(float(self.tarifa_subsistencia[e, z, n]), 4),
+                        "excedente_$por_kWh": round(float(self.tarifa_excedente[e, z, n]), 4),
+                    }
+                    for n, nivel in enumerate(self.niveles)
+                }
+                for z, zona in enumerate(self.zonas)
+            }
+            for e, estrato in enumerate(ESTRATOS)
+        }
+        return {
+            **self.origen,
+            "estratos": list(ESTRATOS),
+            "zonas": list(self.zonas),
+            "niveles": list(self.niveles),
+            "porcentaje_por_estrato": dict(zip(map(str, ESTRATOS), self.porcentajes.tolist())),
+            "consumo_subsistencia_kWh": dict(zip(self.zonas, self.subsistencia_kWh.tolist())),
+            "costo_unitario_$por_kWh": {
+                zona: {nivel: round(float(v), 4) for nivel, v in zip(self.niveles, fila)}
+                for zona, fila in zip(self.zonas, self.costo_unitario.tolist())
+            },
+            "tarifas": celdas,
+        }
+
+
+    def a_json(self) -> Dict[str, Any]:
+        """Arreglos completos (sin redondear) para guardar la matriz y reconstruirla igual."""
+        return {
+            "zonas": list(self.zonas),
+            "niveles": list(self.niveles),
+            **{nombre: getattr(self, nombre).tolist() for nombre in _ARREGLOS},
+            "origen": self.origen,
+        }
+
+    @classmethod
+    def desde_json(cls, datos: Dict[str, Any]) -> "MatrizTarifas":
+        arreglos = {nombre: np.array(datos[nombre], dtype=np.float64) for nombre in _ARREGLOS}
+        for arreglo in arreglos.values():
+            arreglo.setflags(write=False)
+        return cls(zonas=tuple(datos["zonas"]), niveles=tuple(datos["niveles"]), origen=datos.get("origen") or {}, **arreglos)
+
+
+_ARREGLOS = ("costo_unitario", "porcentajes", "tarifa_subsistencia", "tarifa_excedente", "subsistencia_kWh", "limite_kWh")
+
+
+def _tabla(seccion: Any, nombre: str) -> Dict[str, float]:
+    return {str(k).strip().lower(): float(v) for k, v in (seccion.get(nombre) or {}).items()}
+
+
+def construir_matriz(
+    cfg: ConfiguracionNormativa,
+    tarifa_kWh: float,
+    origen: Optional[Dict[str, Any]] = None,
+    T_kWh: float = 0.0,
+) -> MatrizTarifas:
+    """
+    Matriz de `cfg` (ya en la fecha del periodo) para la suma de componentes
+    `tarifa_kWh`, que incluye el T resuelto `T_kWh`. Zonas y niveles salen de
+    componente_T (factor_geografico y cargos_por_nivel) y en cada celda el T
+    resuelto se cambia por el cargo de esa zona y nivel. Sin cargos_por_nivel
+    hay un solo nivel y se conserva el T resuelto.
+    """
+    seccion_t = cfg.seccion("componente_T")
+    factores = _tabla(seccion_t, "factor_geografico") or {"unica": 1.0}
+    cargos_nivel = {_clave_nivel(k): v for k, v in _tabla(seccion_t, "cargos_por_nivel").items()}
+    zonas = tuple(factores)
+    if cargos_nivel:
+        niveles = tuple(sorted(cargos_nivel))
+        fg = np.array([factores[z] for z in zonas])
+        cu = np.array([cargos_nivel[n] for n in niveles])
+        cargo_t = fg[:, None] * cu[None, :]
+    else:
+        niveles = ("NT1",)
+        cargo_t = np.full((len(zonas), 1), T_kWh)
+    costo_unitario = (tarifa_kWh - T_kWh) + cargo_t
+
+    subsidios = cfg.seccion("subsidios_contribuciones")
+    por_estrato = {str(k): float(v) for k, v in (subsidios.get("porcentaje_por_estrato") or {}).items()}
+    porcentajes = np.array([por_estrato.get(str(e), 0.0) for e in ESTRATOS])
+    subsistencia = _tabla(subsidios, "consumo_subsistencia_kWh")
+    limite_zona = np.array([subsistencia.get(z, 0.0) for z in zonas])
+
+    factor = (1.0 + porcentajes)[:, None, None]
+    con_subsidio = (porcentajes < 0)[:, None, None]
+    tarifa_subsistencia = costo_unitario[None, :, :] * factor
+    # El subsidio no cubre el excedente; la contribución sí
+    tarifa_excedente = np.where(con_subsidio, costo_unitario[None, :, :], tarifa_subsistencia)
+    limite = np.where((porcentajes < 0)[:, None], limite_zona[None, :], np.inf)
+
+    for arreglo in (costo_unitario, porcentajes, tarifa_subsistencia, tarifa_excedente, limite_zona, limite):
+        arreglo.setflags(write=False)
+    return MatrizTarifas(
+        zonas=zonas,
+        niveles=niveles,
+        costo_unitario=costo_unitario,
+        porcentajes=porcentajes,
+        tarifa_subsistencia=tarifa_subsistencia,
+        tarifa_excedente=tarifa_excedente,
+        subsistencia_kWh=limite_zona,
+        limite_kWh=limite,
+        origen=dict(origen or {}),
+    )
+
+
+# ==========================================================
+# 🔹 Matrices materializadas
+#     Clave: versión y vigencia de la configuración + valores de
+#     los componentes. Mientras no cambie ninguno (la caché de
+#     componentes los mantiene estables durante su TTL) la matriz
+#     se reutiliza; al cambiar, se construye la nueva una vez.
+# ==========================================================
+_matrices: "OrderedDict[Hashable, MatrizTarifas]" = OrderedDict()
+reconstrucciones = 0
+
+
+def matriz_para(cfg: ConfiguracionNormativa, componentes: Dict[str, Any], origen: Dict[str, Any]) -> MatrizTarifas:
+    """Matriz vigente para `cfg` y los valores de `componentes` (G, T, D, PR, R, C)."""
+    global reconstrucciones
+    valores = tuple(sorted((k, float(v)) for k, v in componentes.items() if k in ("G", "T", "D", "PR", "R", "C")))
+    clave = (cfg.version, cfg.vigencia, valores)
+    matriz = _matrices.get(clave)
+    if matriz is not None:
+        _matrices.move_to_end(clave)
+        return matriz
+    matriz = construir_matriz(cfg, sum(v for _, v in valores), origen, dict(valores).get("T", 0.0))
+    _matrices[clave] = matriz
+    if len(_matrices) > MAX_MATRICES:
+        _matrices.popitem(last=False)
+    reconstrucciones += 1
+    logger.info(
+        "🧮 Matriz de tarifas materializada: %s estratos × %s zonas × %s niveles (config v%s)",
+        len(ESTRATOS), len(matriz.zonas), len(matriz.niveles), cfg.version,
+    )
+    return matriz
+
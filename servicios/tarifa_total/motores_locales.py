@@ -0,0 +1,152 @@
+import importlib.util
+import inspect
+import logging
+import os
+import sys
+from datetime import date
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import core
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# 🧩 Modo monolito: los motores de cada componente se
+#     importan y ejecutan en este mismo proceso, sin HTTP.
+#     Cada servicio vive en servicios/<nombre>/logica.py;
+#     TARIFA_SERVICIOS_DIR permite indicar esa carpeta.
+# =====================================================
+_AQUI = os.path.dirname(os.path.abspath(__file__))
+
+
+def _directorio_servicios() -> str:
+    ruta = os.environ.get("TARIFA_SERVICIOS_DIR")
+    if ruta:
+        return ruta
+    # Imagen Docker: /app/servicios; repositorio: servicios/ (carpeta padre)
+    en_imagen = os.path.join(_AQUI, "servicios")
+    return en_imagen if os.path.isdir(en_imagen) else os.path.dirname(_AQUI)
+
+
+_CARPETAS = {
+    "G": "generacion",
+    "T": "transmision",
+    "D": "distribucion",
+    "PR": "perdidas_reconocidas",
+    "R": "restricciones",
+    "C": "comercializacion",
+}
+
+_modulos: Dict[str, ModuleType] = {}
+
+
+def _cargar_logica(nombre: str) -> ModuleType:
+    """Importa servicios/<carpeta>/logica.py con un nombre único (motor_<carpeta>)."""
+    if nombre in _modulos:
+        return _modulos[nombre]
+
+    carpeta = os.path.join(_directorio_servicios(), _CARPETAS[nombre])
+    # En la imagen de cada servicio, servicios/<x>/core se fusiona con /app/core
+    # (p. ej. core/xm_api.py de generación); aquí se replica esa fusión.
+    extra_core = os.path.join(carpeta, "core")
+    if os.path.isdir(extra_core) and extra_core not in core.__path__:
+        core.__path__.append(extra_core)
+    # Módulos hermanos de la lógica (p. ej. generacion/horario.py); al final
+    # de sys.path para no tapar logica.py / main.py de tarifa_total
+    if carpeta not in sys.path:
+        sys.path.append(carpeta)
+
+    nombre_modulo = f"motor_{_CARPETAS[nombre]}"
+    spec = importlib.util.spec_from_file_location(nombre_modulo, os.path.join(carpeta, "logica.py"))
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No se encontró la lógica del componente {nombre} en {carpeta}")
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre_modulo] = modulo
+    spec.loader.exec_module(modulo)
+    _modulos[nombre] = modulo
+    return modulo
+
+
+# =====================================================
+# 🔄 Adaptadores: payload JSON → argumentos del motor
+#     Replican la validación de los modelos Pydantic de cada
+#     main.py (conversión a float) para que ambos modos den
+#     exactamente el mismo resultado.
+# =====================================================
+def _filas(payload: List[Dict[str, Any]], campos: Tuple[str, ...]) -> List[Dict[str, float]]:
+    return [{c: float(fila[c]) for c in campos} for fila in payload]
+
+
+def _lineas_transmision(payload: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Como LineaTransmision: costo opcional; nivel, región y franja pasan tal cual a la tabla de cargos
+    lineas = []
+    for linea in payload:
+        costo = linea.get("costo_unitario_kWh")
+        if costo is None and linea.get("nivel_tension") is None:
+            raise ValueError("Cada línea requiere 'costo_unitario_kWh' o 'nivel_tension'")
+        lineas.append({
+            "energia_kWh": float(linea["energia_kWh"]),
+            "costo_unitario_kWh": None if costo is None else float(costo),
+            "nivel_tension": linea.get("nivel_tension"),
+            "region": linea.get("region"),
+            "franja_horaria": linea.get("franja_horaria"),
+        })
+    return lineas
+
+
+def _compras(payload: List[Dict[str, Any]]) -> List[Dict[str, Optional[float]]]:
+    return [
+        {
+            "energia_kWh": float(c["energia_kWh"]),
+            "precio_kWh": None if c.get("precio_kWh") is None else float(c["precio_kWh"]),
+        }
+        for c in payload
+    ]
+
+
+_LLAMADAS: Dict[str, Callable[[ModuleType, Any], Any]] = {
+    "G": lambda m, p: m.calcular_componente_G(_compras(p)),
+    "T": lambda m, p: m.calcular_componente_T(_lineas_transmision(p)),
+    "D": lambda m, p: m.calcular_componente_D(_filas(p, ("energia_kWh", "costo_unitario_kWh"))),
+    "PR": lambda m, p: m.calcular_componente_PR(
+        energia_total_kWh=float(p["energia_total_kWh"]),
+        costo_promedio_kWh=float(p["costo_promedio_kWh"]),
+        porcentaje_perdidas=float(p["porcentaje_perdidas"]),
+    ),
+    "R": lambda m, p: m.calcular_componente_R(_filas(p, ("energia_afectada_kWh", "costo_unitario_kWh"))),
+    "C": lambda m, p: m.calcular_comercializacion(p.get("consumo_kWh", 0)),
+}
+
+
+async def calcular(nombre: str, payload: Any) -> Dict[str, Any]:
+    """Ejecuta el motor del componente y devuelve su respuesta estándar (dict)."""
+    resultado = _LLAMADAS[nombre](_cargar_logica(nombre), payload)
+    if inspect.isawaitable(resultado):
+        resultado = await resultado
+    return resultado
+
+
+def _xm_api() -> ModuleType:
+    _cargar_logica("G")
+    from core import xm_api
+    return xm_api
+
+
+async def precio_xm(fecha: Optional[date] = None) -> Tuple[float, str]:
+    """Equivalente local de GET /generacion/precio-xm[?fecha=]."""
+    return await _xm_api().obtener_precio_bolsa_xm(fecha)
+
+
+def cargar_todos() -> None:
+    """Importa todos los motores (al arrancar, para no pagarlo en la primera petición)."""
+    for nombre in _CARPETAS:
+        _cargar_logica(nombre)
+
+
+async def cerrar() -> None:
+    """Libera los recursos de los motores (cliente XM y serie PBND de generación)."""
+    if "G" in _modulos:
+        xm_api = _xm_api()
+        await xm_api.pool_xm.cerrar()
+        xm_api.cerrar_almacen()
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# =====================================================
+# 🛡️ Resiliencia de las llamadas a componentes
+#     - Interruptor (circuit breaker) por componente:
+#       TARIFA_CB_FALLOS fallos seguidos lo abren durante
+#       TARIFA_CB_APERTURA_S; abierto, falla de inmediato.
+#     - Reintentos con espera exponencial aleatoria (jitter)
+#       sin salirse del plazo de la petición: TARIFA_REINTENTOS,
+#       TARIFA_REINTENTO_BASE_S, TARIFA_REINTENTO_MAX_S.
+#     - Petición de cobertura (hedging), opcional con
+#       TARIFA_COBERTURA=1: si una llamada supera el p95 de su
+#       componente se lanza una segunda y gana la primera en responder.
+# =====================================================
+FALLOS_APERTURA = int(os.environ.get("TARIFA_CB_FALLOS", 5))
+APERTURA_S = float(os.environ.get("TARIFA_CB_APERTURA_S", 30.0))
+REINTENTOS = int(os.environ.get("TARIFA_REINTENTOS", 2))
+REINTENTO_BASE_S = float(os.environ.get("TARIFA_REINTENTO_BASE_S", 0.05))
+REINTENTO_MAX_S = float(os.environ.get("TARIFA_REINTENTO_MAX_S", 0.5))
+COBERTURA = os.environ.get("TARIFA_COBERTURA", "0").strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+COBERTURA_MIN_MUESTRAS = int(os.environ.get("TARIFA_COBERTURA_MIN_MUESTRAS", 20))
+
+# Por debajo de este margen no tiene sentido otro intento
+_MARGEN_MINIMO_S = 0.02
+
+
+class CircuitoAbierto(Exception):
+    """El componente acumula fallos y su interruptor está abierto."""
+
+
+class Interruptor:
+    """
+    Circuit breaker de un componente: cerrado → abierto tras `fallos_apertura`
+    fallos seguidos; pasado `apertura_s` deja pasar una sola llamada de prueba
+    (semiabierto) que lo cierra si sale bien o lo vuelve a abrir si falla.
+    """
+
+    CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+
+    def __init__(self, nombre: str, fallos_apertura: int = FALLOS_APERTURA, apertura_s: float = APERTURA_S):
+        self.nombre = nombre
+        self.fallos_apertura = fallos_apertura
+        self.apertura_s = apertura_s
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self.rechazadas = 0
+        self.aperturas = 0
+
+    def permitir(self) -> bool:
+        if self.estado == self.CERRADO:
+            return True
+        if self.estado == self.ABIERTO and time.monotonic() >= self._abierto_hasta:
+            self.estado = self.SEMIABIERTO
+        if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+            self._prueba_en_curso = True
+            return True
+        self.rechazadas += 1
+        return False
+
+    def liberar_prueba(self) -> None:
+        """La llamada de prueba terminó sin veredicto: se permite otra."""
+        self._prueba_en_curso = False
+
+    def registrar_exito(self) -> None:
+        if self.estado != self.CERRADO:
+            logger.info("🟢 Interruptor %s cerrado", self.nombre)
+        self.estado = self.CERRADO
+        self.fallos_seguidos = 0
+        self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        self.fallos_seguidos += 1
+        self._prueba_en_curso = False
+        if self.estado == self.SEMIABIERTO or self.fallos_seguidos >= self.fallos_apertura:
+            if self.estado != self.ABIERTO:
+                self.aperturas += 1
+                logger.warning("🔴 Interruptor %s abierto durante %ss (%d fallos seguidos)",
+                               self.nombre, self.apertura_s, self.fallos_seguidos)
+            self.estado = self.ABIERTO
+            self._abierto_hasta = time.monotonic() + self.apertura_s
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "estado": self.estado,
+            "fallos_seguidos": self.fallos_seguidos,
+            "aperturas": self.aperturas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+class Latencias:
+    """Ventana de las últimas latencias correctas de un componente (para el p95)."""
+
+    def __init__(self, tamano: int = 256):
+        self._muestras: deque = deque(maxlen=tamano)
+
+    def registrar(self, segundos: float) -> None:
+        self._muestras.append(segundos)
+
+    def p95(self) -> Optional[float]:
+        if len(self._muestras) < COBERTURA_MIN_MUESTRAS:
+            return None
+        ordenadas = sorted(self._muestras)
+        return ordenadas[int(0.95 * (len(ordenadas) - 1))]
+
+
+interruptores: Dict[str, Interruptor] = {}
+latencias: Dict[str, Latencias] = {}
+coberturas_lanzadas: Dict[str, int] = {}
+
+
+def _interruptor(nombre: str) -> Interruptor:
+    if nombre not in interruptores:
+        interruptores[nombre] = Interruptor(nombre)
+    return interruptores[nombre]
+
+
+def _latencias(nombre: str) -> Latencias:
+    if nombre not in latencias:
+        latencias[nombre] = Latencias()
+    return latencias[nombre]
+
+
+def es_reintentable(error: BaseException) -> bool:
+    """Fallos transitorios: red/timeout, 5xx y 429. Un 4xx o un dato inválido no se reintenta."""
+    if isinstance(error, httpx.HTTPStatusError):
+        codigo = error.response.status_code
+        return codigo >= 500 or codigo == 429
+    return isinstance(error, httpx.TransportError)
+
+
+async def _medida(nombre: str, llamada: Callable[[], Awaitable[T]]) -> T:
+    inicio = time.monotonic()
+    resultado = await llamada()
+    _latencias(nombre).registrar(time.monotonic() - inicio)
+    return resultado
+
+
+async def _con_cobertura(nombre: str, llamada: Callable[[], Awaitable[T]]) -> T:
+    """Si la llamada supera el p95 del componente, lanza otra igual y devuelve la primera buena."""
+    p95 = _latencias(nombre).p95() if COBERTURA else None
+    if p95 is None:
+        return await _medida(nombre, llamada)
+
+    tareas = {asyncio.ensure_future(_medida(nombre, llamada))}
+    try:
+        hechas, _ = await asyncio.wait(tareas, timeout=p95)
+        if not hechas:
+            coberturas_lanzadas[nombre] = coberturas_lanzadas.get(nombre, 0) + 1
+            tareas.add(asyncio.ensure_future(_medida(nombre, llamada)))
+        error: Optional[BaseException] = None
+        pendientes = set(tareas)
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in hechas:
+                if tarea.exception() is None:
+                    return tarea.result()
+                error = tarea.exception()
+        raise error
+    finally:
+        for tarea in tareas:
+            if not tarea.done():
+                tarea.cancel()
+
+
+async def llamar(nombre: str, llamada: Callable[[], Awaitable[T]], restante: Callable[[], float]) -> T:
+    """
+    Ejecuta `llamada` con interruptor, reintentos con jitter y cobertura.
+    `restante()` da el tiempo que queda del plazo: no se programa un
+    reintento que no quepa en él.
+    """
+    interruptor = _interruptor(nombre)
+    if not interruptor.permitir():
+        raise CircuitoAbierto(f"circuito abierto ({interruptor.fallos_seguidos} fallos seguidos)")
+
+    espera = wait_random_exponential(multiplier=REINTENTO_BASE_S, max=REINTENTO_MAX_S)
+    reintentos = AsyncRetrying(
+        stop=stop_after_attempt(REINTENTOS + 1) | (lambda estado: restante() <= _MARGEN_MINIMO_S),
+        wait=lambda estado: min(espera(estado), max(0.0, restante() - _MARGEN_MINIMO_S)),
+        retry=retry_if_exception(es_reintentable),
+        reraise=True,
+    )
+    try:
+        async for intento in reintentos:
+            with intento:
+                resultado = await _con_cobertura(nombre, llamada)
+    except asyncio.CancelledError:
+        interruptor.liberar_prueba()
+        raise
+    except Exception as e:
+        # Un 4xx es un problema de la petición, no de la salud del componente
+        if isinstance(e, httpx.HTTPStatusError) and not es_reintentable(e):
+            interruptor.liberar_prueba()
+        else:
+            interruptor.registrar_fallo()
+        raise
+    interruptor.registrar_exito()
+    return resultado
+
+
+def estadisticas() -> Dict[str, Any]:
+    return {
+        "configuracion": {
+            "fallos_apertura": FALLOS_APERTURA,
+            "apertura_s": APERTURA_S,
+            "reintentos": REINTENTOS,
+            "cobertura": COBERTURA,
+        },
+        "componentes": {
+            nombre: {
+                **interruptor.estadisticas(),
+                "p95_ms": round(p95 * 1000, 2) if (p95 := _latencias(nombre).p95()) is not None else None,
+                "coberturas": coberturas_lanzadas.get(nombre, 0),
+            }
+            for nombre, interruptor in interruptores.items()
+        },
+    }
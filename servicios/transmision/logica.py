@@ -1,20 +1,28 @@
 import logging
 from typing import Dict, List, Union
+import numpy as np
 from core.calculadora import cargar_configuracion
+from core.ponderado import columnas, numero_filas, promedio_ponderado
 from core.utils import redondear, respuesta_estandar
+from tabla_cargos import ErrorCargoT, columnas_cargo, obtener_tabla
 
 logger = logging.getLogger(__name__)
 
-def calcular_componente_T(lineas: List[Union[Dict, object]]) -> Dict:
+def calcular_componente_T(lineas: Union[List[Union[Dict, object]], Dict[str, List[float]]]) -> Dict:
     """
     Calcula el componente T (Transmisión) con base en las líneas o tramos transportados.
 
     Parámetros:
     -----------
-    lineas : List[Dict|object]
+    lineas : List[Dict|object] | Dict[str, List[float]]
         Lista con los campos:
         - energia_kWh
-        - costo_unitario_kWh
+        - costo_unitario_kWh, o bien nivel_tension (+ region y
+          franja_horaria opcionales) para tomar el cargo de la tabla
+          compilada de componente_T (ver tabla_cargos.py)
+        o, en formato columnar, un dict con una lista por campo
+        ({"energia_kWh": [...], "costo_unitario_kWh": [...]}).
+        Si una línea trae costo_unitario_kWh, ese valor tiene prioridad.
 
     Retorna:
     --------
@@ -25,36 +33,45 @@ def calcular_componente_T(lineas: List[Union[Dict, object]]) -> Dict:
         componente_cfg = config.get("componente_T", {})
         metodo = componente_cfg.get("metodo", "promedio_simple")
 
-        if not lineas:
+        if numero_filas(lineas) == 0:
             logger.warning("Lista de líneas vacía, retornando 0.0")
             return respuesta_estandar(True, "Sin datos de transmisión", {"T_promedio": 0.0})
 
-        energia_total = sum(
-            l["energia_kWh"] if isinstance(l, dict) else l.energia_kWh
-            for l in lineas
-        )
+        energia, precio = columnas(lineas, "energia_kWh", "costo_unitario_kWh", precio_defecto=np.nan)
+        con_tabla = 0
+        sin_costo = np.flatnonzero(np.isnan(precio))
+        # Solo se codifican las líneas sin costo propio: el nivel de las demás no se usa
+        cargo_cols = None
+        if sin_costo.size:
+            cargo_cols = columnas_cargo(lineas, None if sin_costo.size == precio.size else sin_costo.tolist())
+        if cargo_cols is not None:
+            # Un gather sobre la tabla nivel × región × franja para esas líneas
+            cargos = obtener_tabla().cargos_lote(*cargo_cols)
+            con_tabla = int(np.count_nonzero(~np.isnan(cargos)))
+            precio[sin_costo] = cargos
 
-        costo_total = sum(
-            (l["energia_kWh"] * l["costo_unitario_kWh"]) if isinstance(l, dict)
-            else (l.energia_kWh * l.costo_unitario_kWh)
-            for l in lineas
-        )
+        resultado = promedio_ponderado(energia, precio)
+        energia_total, costo_total = resultado.energia_total, resultado.costo_total
 
-        if energia_total == 0:
+        if resultado.promedio is None:
             return respuesta_estandar(True, "Energía total nula", {"T_promedio": 0.0})
 
-        promedio = redondear(costo_total / energia_total, 2)
-        logger.info(f"Componente T calculado: {promedio} $/kWh")
+        promedio = redondear(resultado.promedio, 2)
+        logger.debug("Componente T calculado: %s $/kWh", promedio)
 
         return respuesta_estandar(True, "Cálculo exitoso", {
             "metodo": metodo,
             "energia_total_kWh": energia_total,
             "costo_total": costo_total,
-            "T_promedio": promedio
+            "T_promedio": promedio,
+            "lineas_con_tabla": con_tabla,
+            "filas_descartadas": resultado.filas_descartadas
         })
 
+    except ErrorCargoT:
+        raise
     except Exception as e:
-        logger.error(f"Error al calcular componente T: {e}")
+        logger.error("Error al calcular componente T: %s", e)
         return respuesta_estandar(False, f"Error: {str(e)}", {"T_promedio": 0.0})
 
 
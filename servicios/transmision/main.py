@@ -1,23 +1,73 @@
 import logging
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Union
 from logica import calcular_componente_T
+from tabla_cargos import ErrorCargoT, obtener_tabla
+from core.http_condicional import max_age_entorno, respuesta_condicional
+from core.aplicacion import crear_app
 
 # Configuración de logs
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
+app = crear_app(
+    "transmision",
     title="Microservicio Transmisión",
     description="Calcula el componente T (Transmisión) de la tarifa eléctrica",
     version="1.0.0"
 )
 
-# Modelo de entrada
+# max-age (s) de GET /transmision/cargos (cambia solo al recargar la configuración)
+MAX_AGE_CARGOS = max_age_entorno("cargos_t", 60)
+
+# Modelo de entrada: costo unitario explícito o cargo de la tabla por nivel/región/franja
 class LineaTransmision(BaseModel):
     energia_kWh: float
-    costo_unitario_kWh: float
+    costo_unitario_kWh: Optional[float] = None
+    nivel_tension: Optional[Union[int, str]] = None
+    region: Optional[str] = None
+    franja_horaria: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _costo_o_nivel(self):
+        if self.costo_unitario_kWh is None and self.nivel_tension is None:
+            raise ValueError("Cada línea requiere 'costo_unitario_kWh' o 'nivel_tension'")
+        return self
+
+# Formato columnar: una lista por campo (validada una sola vez)
+class ColumnasTransmision(BaseModel):
+    energia_kWh: List[float]
+    costo_unitario_kWh: Optional[List[Optional[float]]] = None
+    nivel_tension: Optional[List[Optional[Union[int, str]]]] = None
+    region: Optional[List[Optional[str]]] = None
+    franja_horaria: Optional[List[Optional[str]]] = None
+
+    @model_validator(mode="after")
+    def _misma_longitud(self):
+        if self.costo_unitario_kWh is None and self.nivel_tension is None:
+            raise ValueError("Envíe 'costo_unitario_kWh' o 'nivel_tension'")
+        for campo in ("costo_unitario_kWh", "nivel_tension", "region", "franja_horaria"):
+            valores = getattr(self, campo)
+            if valores is not None and len(valores) != len(self.energia_kWh):
+                raise ValueError(
+                    f"'energia_kWh' ({len(self.energia_kWh)}) y '{campo}' "
+                    f"({len(valores)}) deben tener la misma longitud"
+                )
+        # Como en LineaTransmision: cada fila necesita costo o nivel (si no, se descartaría en silencio)
+        if self.costo_unitario_kWh is None or self.nivel_tension is None:
+            valores = self.nivel_tension if self.costo_unitario_kWh is None else self.costo_unitario_kWh
+            sin_dato = [i for i, v in enumerate(valores) if v is None] if None in valores else []
+        else:
+            sin_dato = [
+                i for i, (costo, nivel) in enumerate(zip(self.costo_unitario_kWh, self.nivel_tension))
+                if costo is None and nivel is None
+            ]
+        if sin_dato:
+            muestra = ", ".join(str(i) for i in sin_dato[:10])
+            raise ValueError(
+                f"{len(sin_dato)} filas sin 'costo_unitario_kWh' ni 'nivel_tension'; filas: {muestra}"
+            )
+        return self
 
 
 @app.get("/")
@@ -25,15 +75,37 @@ def root():
     return {"mensaje": "Microservicio de Transmisión activo"}
 
 
+@app.get("/transmision/cargos")
+def cargos_transmision(request: Request):
+    """
+    Tabla compilada de cargos ($/kWh) por nivel × región × franja de la configuración vigente.
+    Admite GET condicional; el cuerpo se serializa una vez por versión de la tabla.
+    """
+    tabla = obtener_tabla()
+    datos = tabla.resumen()
+    datos["cargos_kWh"] = {
+        nivel: {
+            region or "sin_region": {franja or "sin_franja": float(v) for franja, v in zip(tabla.franjas, fila_franjas)}
+            for region, fila_franjas in zip(tabla.regiones, fila_regiones)
+        }
+        for nivel, fila_regiones in zip(tabla.niveles, tabla.cargos.tolist())
+    }
+    return respuesta_condicional(request, datos, max_age=MAX_AGE_CARGOS, fuente=tabla)
+
+
 @app.post("/transmision/calcular")
-def calcular_transmision(lineas: List[LineaTransmision]):
+def calcular_transmision(lineas: Union[List[LineaTransmision], ColumnasTransmision]):
     """
     Calcula el componente T con base en los datos de transmisión.
+    Acepta una lista de objetos o el formato columnar (una lista por campo).
     """
     try:
-        data = [l.dict() for l in lineas]
+        # Por filas, el motor lee los modelos; por columnas, las listas directamente
+        data = dict(lineas) if isinstance(lineas, ColumnasTransmision) else lineas
         resultado = calcular_componente_T(data)
         return resultado
+    except ErrorCargoT as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        logger.error(f"Error en cálculo de transmisión: {e}")
+        logger.error("Error en cálculo de transmisión: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
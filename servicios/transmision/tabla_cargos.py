@@ -0,0 +1,216 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from core.calculadora import ConfiguracionNormativa, obtener_configuracion
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 🔹 Tabla de cargos de transmisión nivel × región × franja
+#     CU(nivel) × FG(región) × FH(franja) se multiplica una
+#     vez por versión de la configuración (cfg.derivado) en un
+#     arreglo denso; valorar una línea es indexarlo y valorar
+#     un lote, un solo gather con tres columnas de índices.
+#     Sin región o sin franja se usa el factor neutro 1.0
+#     (índice 0 de su eje).
+# ==========================================================
+SIN_DATO = ""
+CAMPOS = ("nivel_tension", "region", "franja_horaria")
+
+
+class ErrorCargoT(ValueError):
+    """Nivel, región o franja que no existen en componente_T de la configuración."""
+
+
+def _clave_nivel(valor: Any) -> str:
+    """1, "1", "NT1" y "nt1" son el mismo nivel (claves de cargos_por_nivel)."""
+    texto = str(valor).strip().upper()
+    if texto.startswith("NT"):
+        texto = texto[2:]
+    try:
+        return str(int(float(texto)))
+    except ValueError:
+        return texto
+
+
+def _clave_texto(valor: Any) -> str:
+    return str(valor).strip().lower()
+
+
+@dataclass(frozen=True)
+class TablaCargosT:
+    niveles: Tuple[str, ...]
+    regiones: Tuple[str, ...]          # regiones[0] = SIN_DATO (factor 1.0)
+    franjas: Tuple[str, ...]           # franjas[0] = SIN_DATO (factor 1.0)
+    cargos: np.ndarray                 # float64 (niveles, regiones, franjas), $/kWh
+    version_config: int
+    _alias: Dict[str, Dict[Any, int]] = field(default_factory=dict, repr=False, compare=False)
+    _celdas: List[List[List[float]]] = field(default_factory=list, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Listas anidadas para la consulta de una sola línea (más baratas que un escalar NumPy)
+        self._celdas.extend(self.cargos.tolist())
+        # Formas habituales de cada clave ya resueltas a su índice: la mayoría
+        # de las líneas se codifican con una sola búsqueda en un dict
+        for campo, eje in zip(CAMPOS, (self.niveles, self.regiones, self.franjas)):
+            alias: Dict[Any, int] = {None: -1 if campo == "nivel_tension" else 0, SIN_DATO: -1 if campo == "nivel_tension" else 0}
+            for i, clave in enumerate(eje):
+                if clave == SIN_DATO:
+                    continue
+                formas = {clave, clave.upper(), clave.capitalize()}
+                if campo == "nivel_tension":
+                    formas |= {f"NT{clave}", f"nt{clave}"}
+                    if clave.isdigit():
+                        formas.add(int(clave))
+                for forma in formas:
+                    alias[forma] = i
+            self._alias[campo] = alias
+
+    def _normalizar(self, campo: str, valor: Any) -> int:
+        """Índice de un valor sin alias (espacios, mayúsculas mixtas, 3.0…); -1 = sin nivel."""
+        clave = _clave_nivel(valor) if campo == "nivel_tension" else _clave_texto(valor)
+        indice = self._alias[campo].get(clave)
+        if indice is None:
+            eje = {"nivel_tension": self.niveles, "region": self.regiones, "franja_horaria": self.franjas}[campo]
+            validos = ", ".join(v for v in eje if v != SIN_DATO)
+            raise ErrorCargoT(f"{campo} '{valor}' no está en componente_T (válidos: {validos})")
+        return indice
+
+    def _indice(self, campo: str, valor: Any) -> int:
+        indice = self._alias[campo].get(valor)
+        if indice is None:
+            indice = self._normalizar(campo, valor)
+        if indice < 0:
+            raise ErrorCargoT("La línea no trae 'nivel_tension' ni 'costo_unitario_kWh'")
+        return indice
+
+    def cargo(self, nivel: Any, region: Any = None, franja: Any = None) -> float:
+        """Cargo unitario de una línea ($/kWh): tres búsquedas en dicts y un acceso a la tabla."""
+        n = self._alias["nivel_tension"].get(nivel)
+        r = self._alias["region"].get(region)
+        f = self._alias["franja_horaria"].get(franja)
+        if n is None or n < 0 or r is None or f is None:
+            n = self._indice("nivel_tension", nivel)
+            r = self._indice("region", region)
+            f = self._indice("franja_horaria", franja)
+        return self._celdas[n][r][f]
+
+    def _codigos(self, campo: str, valores: Sequence[Any]) -> np.ndarray:
+        """
+        Columna de valores → índices del eje (-1 = línea sin nivel). Camino
+        rápido: map sobre el dict de alias en C; si aparece una forma no
+        prevista, se normalizan solo los valores distintos.
+        """
+        alias = self._alias[campo]
+        try:
+            return np.fromiter(map(alias.__getitem__, valores), dtype=np.intp, count=len(valores))
+        except (KeyError, TypeError):
+            pass
+        locales = dict(alias)
+        for valor in set(valores):
+            if valor not in locales:
+                locales[valor] = self._normalizar(campo, valor)
+        return np.fromiter(map(locales.__getitem__, valores), dtype=np.intp, count=len(valores))
+
+    def codificar(
+        self,
+        niveles: Sequence[Any],
+        regiones: Optional[Sequence[Any]] = None,
+        franjas: Optional[Sequence[Any]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Índices (nivel, región, franja) de cada línea; reutilizables mientras no cambie la versión."""
+        n = len(niveles)
+        i_nivel = self._codigos("nivel_tension", niveles)
+        i_region = self._codigos("region", regiones) if regiones is not None else np.zeros(n, dtype=np.intp)
+        i_franja = self._codigos("franja_horaria", franjas) if franjas is not None else np.zeros(n, dtype=np.intp)
+        for nombre, columna in (("region", i_region), ("franja_horaria", i_franja)):
+            if columna.size != n:
+                raise ErrorCargoT(f"'{nombre}' tiene {columna.size} valores y hay {n} niveles de tensión")
+        return i_nivel, i_region, i_franja
+
+    def cargos_codificados(self, i_nivel: np.ndarray, i_region: np.ndarray, i_franja: np.ndarray) -> np.ndarray:
+        """Un solo gather sobre la tabla; las líneas sin nivel (-1) quedan en NaN."""
+        cargos = self.cargos[np.maximum(i_nivel, 0), i_region, i_franja]
+        sin_nivel = i_nivel < 0
+        if sin_nivel.any():
+            cargos[sin_nivel] = np.nan
+        return cargos
+
+    def cargos_lote(
+        self,
+        niveles: Sequence[Any],
+        regiones: Optional[Sequence[Any]] = None,
+        franjas: Optional[Sequence[Any]] = None,
+    ) -> np.ndarray:
+        """
+        Cargo de cada línea de un lote: codificar() + un gather. Las filas
+        sin nivel quedan en NaN (el llamador decide si tienen costo propio o
+        se descartan).
+        """
+        return self.cargos_codificados(*self.codificar(niveles, regiones, franjas))
+
+    def resumen(self) -> Dict[str, Any]:
+        return {
+            "niveles": list(self.niveles),
+            "regiones": [r for r in self.regiones if r != SIN_DATO],
+            "franjas": [f for f in self.franjas if f != SIN_DATO],
+            "forma": list(self.cargos.shape),
+            "version_config": self.version_config,
+        }
+
+
+def _eje(tabla: Mapping[str, Any], normalizar) -> Tuple[Tuple[str, ...], np.ndarray]:
+    claves = tuple(normalizar(k) for k in tabla)
+    return claves, np.fromiter((float(v) for v in tabla.values()), dtype=np.float64, count=len(claves))
+
+
+def compilar_tabla(cfg: ConfiguracionNormativa) -> TablaCargosT:
+    """Producto exterior CU ⊗ FG ⊗ FH sobre componente_T de `cfg`."""
+    seccion = cfg.seccion("componente_T")
+    niveles, cu = _eje(seccion.get("cargos_por_nivel") or {}, _clave_nivel)
+    regiones, fg = _eje(seccion.get("factor_geografico") or {}, _clave_texto)
+    franjas, fh = _eje(seccion.get("recargo_horario") or {}, _clave_texto)
+    # Eje neutro para las líneas sin región / franja
+    regiones, fg = (SIN_DATO,) + regiones, np.concatenate(([1.0], fg))
+    franjas, fh = (SIN_DATO,) + franjas, np.concatenate(([1.0], fh))
+    cargos = cu[:, None, None] * fg[None, :, None] * fh[None, None, :]
+    cargos.setflags(write=False)
+    logger.debug("Tabla de cargos T compilada: %s niveles × %s regiones × %s franjas", len(niveles), len(regiones), len(franjas))
+    return TablaCargosT(niveles=niveles, regiones=regiones, franjas=franjas, cargos=cargos, version_config=cfg.version)
+
+
+def obtener_tabla(cfg: Optional[ConfiguracionNormativa] = None) -> TablaCargosT:
+    """Tabla de la configuración vigente (compilada una vez por versión)."""
+    return (cfg or obtener_configuracion()).derivado("transmision.tabla_cargos", compilar_tabla)
+
+
+def columnas_cargo(
+    lineas: Union[Sequence[Any], Mapping[str, Any]],
+    filas: Optional[Sequence[int]] = None,
+) -> Optional[Tuple[Sequence[Any], ...]]:
+    """
+    (niveles, regiones, franjas) de las líneas —solo las de `filas` si se
+    indican, p. ej. las que no traen costo propio—, o None si ninguna de
+    ellas trae nivel de tensión (entrada solo con costo_unitario_kWh).
+    """
+    if isinstance(lineas, Mapping):
+        if lineas.get("nivel_tension") is None:
+            return None
+        columnas = [lineas.get(c) for c in CAMPOS]
+        if filas is not None:
+            columnas = [None if col is None else [col[i] for i in filas] for col in columnas]
+    else:
+        if filas is not None:
+            lineas = [lineas[i] for i in filas]
+        if len(lineas) == 0:
+            return None
+        if isinstance(lineas[0], dict):
+            columnas = [[f.get(c) for f in lineas] for c in CAMPOS]
+        else:
+            columnas = [[getattr(f, c, None) for f in lineas] for c in CAMPOS]
+    if all(v is None for v in columnas[0]):
+        return None
+    return tuple(columnas)
@@ -0,0 +1,47 @@
+"""
+Cada microservicio se ejecuta con su carpeta como raíz (`from logica import ...`),
+igual que en su contenedor. Aquí se reproduce ese PYTHONPATH: tarifa_total por
+defecto y, con `importar_servicio`, el main.py de otro servicio sin chocar con
+sus módulos homónimos (main, logica).
+"""
+import importlib
+import os
+import sys
+from types import ModuleType
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("NORMATIVA_CONFIG_PATH", os.path.join(RAIZ, "config", "normativa_config.json"))
+
+_HOMONIMOS = ("main", "logica")
+
+
+def _carpeta(nombre: str) -> str:
+    return os.path.join(RAIZ, "servicios", nombre)
+
+
+def _fusionar_core(carpeta: str) -> None:
+    # En la imagen, servicios/<x>/core se fusiona con /app/core
+    import core
+    extra = os.path.join(carpeta, "core")
+    if os.path.isdir(extra) and extra not in core.__path__:
+        core.__path__.append(extra)
+
+
+for _ruta in (RAIZ, _carpeta("tarifa_total")):
+    if _ruta not in sys.path:
+        sys.path.insert(0, _ruta)
+
+
+def importar_servicio(nombre: str) -> ModuleType:
+    """main.py de servicios/<nombre>, importado con su carpeta primero en sys.path."""
+    carpeta = _carpeta(nombre)
+    _fusionar_core(carpeta)
+    previos = {m: sys.modules.pop(m) for m in _HOMONIMOS if m in sys.modules}
+    sys.path.insert(0, carpeta)
+    try:
+        return importlib.import_module("main")
+    finally:
+        sys.path.remove(carpeta)
+        for m in _HOMONIMOS:
+            sys.modules.pop(m, None)
+        sys.modules.update(previos)
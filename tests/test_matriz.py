@@ -0,0 +1,30 @@
+import pytest
+
+from conftest import importar_servicio
+from core.calculadora import obtener_configuracion
+from matriz import matriz_para
+
+COMPONENTES = {"G": 320.5, "T": 35.1, "D": 40.2, "PR": 10.0, "R": 3.3, "C": 1.0}
+
+
+@pytest.fixture(scope="module")
+def tabla_t():
+    return importar_servicio("transmision").obtener_tabla(obtener_configuracion())
+
+
+def test_celda_usa_cargo_de_transmision_en_lugar_del_t_resuelto(tabla_t):
+    matriz = matriz_para(obtener_configuracion(), COMPONENTES, {})
+    i_estrato, i_zona, i_nivel = matriz.indices(4, "andina", "NT3")
+
+    esperado = sum(v for k, v in COMPONENTES.items() if k != "T") + tabla_t.cargo("NT3", "andina")
+    assert matriz.costo_unitario[i_zona, i_nivel] == pytest.approx(esperado)
+    # Estrato 4: sin subsidio ni contribución, paga el costo unitario
+    assert matriz.tarifa_subsistencia[i_estrato, i_zona, i_nivel] == pytest.approx(esperado)
+
+
+def test_todas_las_celdas_coinciden_con_la_tabla_de_cargos(tabla_t):
+    matriz = matriz_para(obtener_configuracion(), COMPONENTES, {})
+    sin_t = sum(v for k, v in COMPONENTES.items() if k != "T")
+    for z, zona in enumerate(matriz.zonas):
+        for n, nivel in enumerate(matriz.niveles):
+            assert matriz.costo_unitario[z, n] == pytest.approx(sin_t + tabla_t.cargo(nivel, zona))
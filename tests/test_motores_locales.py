@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import motores_locales
+from conftest import importar_servicio
+
+
+@pytest.fixture(scope="module")
+def transmision():
+    return TestClient(importar_servicio("transmision").app)
+
+
+@pytest.mark.parametrize("lineas", [
+    [{"energia_kWh": 4000, "nivel_tension": "NT2", "region": "costa"},
+     {"energia_kWh": 6000, "costo_unitario_kWh": 35.0}],
+    [{"energia_kWh": 1000, "nivel_tension": 3, "franja_horaria": "pico"}],
+])
+def test_t_local_igual_a_http_con_lineas_por_nivel(transmision, lineas):
+    local = asyncio.run(motores_locales.calcular("T", lineas))
+    http = transmision.post("/transmision/calcular", json=lineas).json()
+
+    assert local["ok"] and http["ok"]
+    for campo in ("T_promedio", "costo_total", "energia_total_kWh", "lineas_con_tabla", "filas_descartadas"):
+        assert local["datos"][campo] == http["datos"][campo]
+    assert local["datos"]["lineas_con_tabla"] == 1
+
+
+def test_t_local_rechaza_linea_sin_costo_ni_nivel(transmision):
+    lineas = [{"energia_kWh": 100}]
+    assert transmision.post("/transmision/calcular", json=lineas).status_code == 422
+    with pytest.raises(ValueError):
+        asyncio.run(motores_locales.calcular("T", lineas))